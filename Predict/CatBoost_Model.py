@@ -1,21 +1,24 @@
+import os
+from functools import partial
+
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
-import matplotlib.ticker as ticker
-import folium
-from folium.plugins import HeatMap
-from sklearn.preprocessing import LabelEncoder
-from catboost import CatBoost, CatBoostRegressor
+from catboost import CatBoostRegressor, cv
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import mean_squared_error
-from sklearn.feature_selection import RFE
-from sklearn.linear_model import LinearRegression
 from sklearn.preprocessing import MinMaxScaler
-from sklearn.model_selection import GridSearchCV
-from sklearn.model_selection import cross_val_score
 from joblib import dump, load
 
+from Predict.fast_predictor import min_max_arrays
+from Predict.feature_selection import select_feature_subset, write_training_manifest
+from Predict.pool_cache import POOL_DIR, SPLIT, load_training_pools
+from Predict.resources import configure
+from Predict.segments import export_report, segment_report
+from preprocessing.cleaning_data import Cleaning
+from preprocessing.dtype_plan import DTYPE_PLAN, apply_plan, frame_nbytes, read_csv_planned
+from preprocessing.feature_store import Feature_Store
+from preprocessing.target_encoding import TARGET_COLUMNS, out_of_fold, target_table
+
 """
 This script defines two classes, `Data_Prep` and `Model`, to preprocess real estate data and train a predictive model 
 using CatBoostRegressor. The goal is to predict property prices based on the features provided in the dataset.
@@ -41,14 +44,27 @@ Classes:
 
     Methods:
     --------
-    __init__(Link: str):
+    __init__(Link: str, target_encoding: bool = False, dtype_plan: dict = DTYPE_PLAN):
         Initializes the class with the file path to the dataset and prepares feature and target variables.
+        The columns are read with the compact dtypes of `dtype_plan` (`preprocessing/dtype_plan.py`:
+        int8 flags and codes, int16 localities, float32 continuous features); None keeps the pandas
+        defaults. `memory` records the bytes held after every stage (read, features, normalized, split).
+        With `target_encoding`, the smoothed locality/province price encodings are appended: out-of-fold
+        on the training rows, fitted on all training rows for the test rows (see `target_encoding.py`).
+        Nothing is written: `save_target_encoding()` does, from the training path.
+
+    save_target_encoding(directory) -> Tuple[str, str]:
+        Writes the serving table `target_index` and the encoded dataset `<name>_target_encoded.csv`:
+        export the model with `--data <name>_target_encoded.csv` and `--target-index <directory>/target_index`
+        (`shared_model.py` / `registry.py publish`).
 
     read_data() -> pd.DataFrame:
-        Reads the dataset from the specified file link.
+        Reads the dataset from the specified file link, or scans it from a feature store directory
+        (`preprocessing/feature_store.py`, rows in `Id` order).
 
     Normalize_Data() -> np.ndarray:
-        Normalizes the feature data using Min-Max scaling.
+        Normalizes the feature data using Min-Max scaling. With a dtype plan, the features are copied
+        once into a float32 matrix scaled in place, with the arithmetic of `Fast_Predictor`.
 
     Spliter() -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
         Splits the normalized data into training and test sets and log-transforms the target variable.
@@ -58,15 +74,49 @@ Classes:
 
     Methods:
     --------
-    __init__(link1: str):
+    __init__(link1: str, pool_cache: str = "./model/pools", target_encoding: bool = False):
         Initializes the class with a dataset file path and prepares the training and test data using `Data_Prep`.
-
-    fit() -> CatBoostRegressor:
-        Trains the CatBoost model on the training data and saves it as a file.
+        The quantized training pool is cached on disk per data hash and border settings (see
+        `pool_cache.py`), so later experiments on the same data skip reading, scaling and quantizing.
+        `target_encoding` adds the out-of-fold target encodings as features (and to the cache key).
+        CatBoost threads and BLAS threads follow the "train" budget of `resources.py`
+        (`IMMO_CATBOOST_THREADS`, `IMMO_BLAS_THREADS`, ...; every usable CPU by default).
+
+    select_features(tolerance=0.01, max_workers=None) -> dict:
+        Selects the smallest feature subset within `tolerance` of the best validation RMSE
+        (CatBoost loss-function-change elimination, candidates scored in parallel processes,
+        scores cached per feature set and data hash; see `feature_selection.py`).
+
+    save_target_encoding(directory=None) -> Tuple[str, str]:
+        With `target_encoding`, writes the target encoder table and the encoded dataset of the export
+        (next to the dataset by default) and returns their paths.
+
+    fit(callbacks=None, directory=".") -> CatBoostRegressor:
+        Trains the CatBoost model on the training data (unselected features ignored) and saves it
+        as `directory/model_Hussain.joblib`, with its training manifest `model_Hussain.manifest.json`.
+        `callbacks` are CatBoost iteration callbacks (progress reports of background jobs, see `jobs.py`).
 
     predict():
         Evaluates the model on the test set and prints the RMSE and R² scores.
 
+    evaluate_segments(directory="./reports", min_count=5) -> pd.DataFrame:
+        Computes MAE, RMSE, R², MAPE, sMAPE and bias of the test set per locality, province, region,
+        subtype, state, price decile and crossings, and exports them to Parquet and HTML
+        (see `segments.py`).
+
+    fit_quantiles(alphas=(0.1, 0.5, 0.9), directory=".") -> CatBoostRegressor:
+        Trains one MultiQuantile model with the same hyperparameters and saves it as
+        `directory/model_Hussain_quantiles.joblib`; P10/P50/P90 come out of a single predict call.
+
+    evaluate_quantiles() -> float:
+        Prints the share of test prices falling inside the P10-P90 interval.
+
+    cv(fold_count=5) -> pd.DataFrame:
+        Cross-validates the current hyperparameters on the cached quantized pool.
+
+    tune(param_grid, fold_count=3) -> dict:
+        Grid search on the cached quantized pool; keeps the best parameters for `fit()`.
+
 Usage:
 ------
 1. Prepare the dataset and save it to a file.
@@ -97,37 +147,126 @@ Dependencies:
 
 
 class Data_Prep:
-    def __init__(self, Link) -> None:
+    def __init__(self, Link, target_encoding=False, dtype_plan=DTYPE_PLAN) -> None:
         self.Link = Link
+        self.dtype_plan = dtype_plan
+        # Bytes held after every preparation stage, see `memory_report`
+        self.memory = {}
         self.Data = self.read_data()
+        if target_encoding:
+            self.Data = self.encode_targets()
+            if dtype_plan is not None:
+                self.Data = apply_plan(self.Data, dtype_plan)
+        self.memory["read"] = frame_nbytes(self.Data)
 
         self.X = self.Data.drop(
             columns=["Price", "Id"]  # ,'sqdm_price','Locality_mean_Price'
         )  # All columns except 'Price' are features
         self.y = self.Data["Price"]  # Target variable is 'Price'
+        self.memory["features"] = frame_nbytes(self.X) + frame_nbytes(self.y)
 
         pass
 
     def read_data(self):
+        if os.path.isdir(self.Link):
+            Data = Feature_Store(self.Link).scan()
+            return Data if self.dtype_plan is None else apply_plan(Data, self.dtype_plan)
+        if self.dtype_plan is not None:
+            return read_csv_planned(self.Link, self.dtype_plan)
         Data = pd.read_csv(self.Link, index_col=0)
 
         return Data
 
+    def encode_targets(self):
+        # Encodings fitted without the row's own price: other folds for training rows, training rows for test rows
+        train_idx, test_idx = train_test_split(np.arange(len(self.Data)), **SPLIT)
+        train_rows = self.Data.iloc[train_idx]
+        # Province of every locality over all rows (a feature, not the target)
+        localities = self.Data["Locality_encoded"].to_numpy(dtype=np.int64)
+        provinces = np.full(localities.max() + 1, -1, dtype=np.int64)
+        provinces[localities] = self.Data["Prov_encoded"].to_numpy(dtype=np.int64)
+        table = target_table(train_rows, provinces=provinces)
+        encoded = pd.DataFrame(np.nan, index=self.Data.index, columns=TARGET_COLUMNS)
+        encoded.iloc[train_idx] = out_of_fold(train_rows).to_numpy()
+        encoded.iloc[test_idx] = table.take(self.Data["Locality_encoded"].iloc[test_idx].to_numpy())
+        # Serving table, written with the encoded dataset by `save_target_encoding`
+        self.target_table = table
+        return pd.concat([self.Data, encoded], axis=1)
+
+    def save_target_encoding(self, directory):
+        # Serving table and encoded reference dataset for `export_shared_model`
+        name = os.path.splitext(os.path.basename(self.Link.rstrip(os.sep)))[0]
+        data_path = os.path.join(directory, f"{name}_target_encoded.csv")
+        target_index = os.path.join(directory, "target_index")
+        self.target_table.save(target_index)
+        self.Data.to_csv(data_path)
+        return data_path, target_index
+
     def Normalize_Data(self):
-        scaler = MinMaxScaler()
-        normalized_data = scaler.fit_transform(self.X)
+        if self.dtype_plan is None:
+            scaler = MinMaxScaler()
+            normalized_data = scaler.fit_transform(self.X)
+        else:
+            # One float32 copy of the features, scaled in place
+            normalized_data = self.X.to_numpy(dtype=np.float32)
+            scale, offset = min_max_arrays(normalized_data)
+            normalized_data *= scale
+            normalized_data += offset
+        self.memory["normalized"] = normalized_data.nbytes
         return normalized_data
 
     def Spliter(self):
         X_ = self.Normalize_Data()
         y1 = self.y
 
-        X_train, X_test, y_train, y_test = train_test_split(
-            X_, y1, test_size=0.2, random_state=42
-        )
+        X_train, X_test, y_train, y_test = train_test_split(X_, y1, **SPLIT)
+        self.memory["split"] = X_train.nbytes + X_test.nbytes + frame_nbytes(y_train) + frame_nbytes(y_test)
         return X_train, X_test, y_train, y_test
 
 
+def prepare_split(link, target_encoding=False):
+    # Cache-miss path of `load_training_pools`: read, scale and split the dataset
+    Data_obj = Data_Prep(link, target_encoding)
+    return (list(Data_obj.X.columns), *Data_obj.Spliter())
+
+
+def memory_report(link, target_encoding=False):
+    """
+    Memory held after every data preparation stage, with the pandas default dtypes and with the dtype plan.
+
+    Every stage counts what is alive at that point (the raw frame stays alive until the split), and
+    "peak" is the highest traced allocation of the whole preparation.
+
+    Args:
+    - link (str): Dataset CSV or feature store directory.
+    - target_encoding (bool): Prepare with the target encodings, as `Model1` would.
+
+    Returns:
+    - pd.DataFrame: MB per stage (read, features, normalized, split, peak) for "default" and "planned",
+      and the memory saved in %.
+    """
+    import tracemalloc
+
+    report = {}
+    for name, plan in (("default", None), ("planned", DTYPE_PLAN)):
+        tracemalloc.start()
+        Data_obj = Data_Prep(link, target_encoding, dtype_plan=plan)
+        Data_obj.Spliter()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        memory = Data_obj.memory
+        report[name] = {
+            "read": memory["read"],
+            "features": memory["read"] + memory["features"],
+            "normalized": memory["read"] + memory["features"] + memory["normalized"],
+            "split": memory["read"] + memory["features"] + memory["split"],
+            "peak": peak,
+        }
+    report = pd.DataFrame(report) / 1e6
+    report["saved_%"] = (1 - report["planned"] / report["default"]) * 100
+    return report
+
+
 from catboost import CatBoostRegressor
 import numpy as np
 from joblib import dump
@@ -139,27 +278,77 @@ from sklearn.metrics import (
 
 
 class Model1:
-    def __init__(self, link1) -> None:
+    def __init__(self, link1, pool_cache=POOL_DIR, target_encoding=False) -> None:
         # Initialize CatBoostRegressor
         self.link = link1
+        self.resources = configure("train")
         self.model = CatBoostRegressor(iterations=3000,  # Number of boosting iterations
                           learning_rate=0.01,  # Learning rate
                           depth=5,  # Depth of the trees
                           random_seed=42  # Random seed for reproducibility  
                           ,eval_metric="RMSE",
                           l2_leaf_reg=10,
-                          min_data_in_leaf=10
+                          min_data_in_leaf=10,
+                          **self.resources.catboost_params()
                           )
-        Data_obj = Data_Prep(self.link)
-        self.X_train, self.X_test, self.y_train, self.y_test = Data_obj.Spliter()
-
-    def fit(self):
-        # Log-transform the target variable
-        y_train_log = np.log1p(self.y_train)
+        # Quantized training pool and split arrays, read from the cache when the data is unchanged
+        self.target_encoding = target_encoding
+        # float32 split arrays of the dtype plan: entries of earlier float64 preparations are not reused
+        split = {**SPLIT, "dtype_plan": True}
+        if target_encoding:
+            split["target_encoding"] = True
+        pools = load_training_pools(
+            self.link,
+            partial(prepare_split, target_encoding=target_encoding),
+            split=split,
+            cache_dir=pool_cache,
+        )
+        self.train_pool = pools.train
+        self.features = pools.features
+        self.X_train, self.X_test, self.y_train, self.y_test = (
+            pools.X_train,
+            pools.X_test,
+            pools.y_train,
+            pools.y_test,
+        )
+        self.selection = None
 
-        self.model.fit(self.X_train, y_train_log)
+    def select_features(self, tolerance=0.01, max_workers=None):
+        # Validation split taken from the training set: the test set stays untouched
+        X_fit, X_val, y_fit, y_val = train_test_split(
+            self.X_train, np.log1p(self.y_train), test_size=0.2, random_state=42
+        )
+        self.selection = select_feature_subset(
+            X_fit,
+            y_fit,
+            X_val,
+            y_val,
+            self.features,
+            tolerance=tolerance,
+            max_workers=max_workers or self.resources.workers,
+        )
+        print(f"Selected {len(self.selection['selected_features'])}/{len(self.features)} features")
+        print(f"  Eliminated: {', '.join(self.selection['eliminated_features']) or '-'}")
+        return self.selection
+
+    def save_target_encoding(self, directory=None):
+        # Written explicitly by the training run: a pool-cache hit never builds `Data_Prep`
+        directory = directory or os.path.dirname(self.link)
+        return Data_Prep(self.link, target_encoding=True).save_target_encoding(directory)
+
+    def fit(self, callbacks=None, directory="."):
+        # The pool label is already log-transformed
+        if self.selection is not None:
+            # Unselected columns are never quantized nor split on; the input vector keeps its layout
+            selected = set(self.selection["selected_features"])
+            ignored = [i for i, name in enumerate(self.features) if name not in selected]
+            self.model.set_params(ignored_features=ignored or None)
+
+        self.model.fit(self.train_pool, callbacks=callbacks)
         # Save the model to a file
-        dump(self.model, "model_Hussain.joblib")
+        path = os.path.join(directory, "model_Hussain.joblib")
+        dump(self.model, path)
+        write_training_manifest(path, self.features, self.selection)
         return self.model
 
     def evaluate_metrics(self, y_true, y_pred, dataset_name="Test"):
@@ -191,11 +380,63 @@ class Model1:
         self.evaluate_metrics(self.y_train, y_train_pred, dataset_name="Training")
         self.evaluate_metrics(self.y_test, y_test_pred, dataset_name="Test")
         return
-Data_link = "/home/learner/Desktop/Deplyment/Immoliza_app/preprocessing/ED.csv"
 
-Model = Model1(Data_link)
+    def evaluate_segments(self, directory="./reports", min_count=5):
+        # Test rows with their raw codes: same split of the same file as `Data_Prep.Spliter`
+        _, test_rows = train_test_split(Data_Prep(self.link, self.target_encoding).Data, **SPLIT)
+        y_test_pred = np.expm1(self.model.predict(self.X_test))
+        _, _, mappings = Cleaning().preprocess()
+        report = segment_report(
+            test_rows, self.y_test, y_test_pred, labels=mappings, min_count=min_count
+        )
+        paths = export_report(report, directory)
+        print(f"Segment report: {', '.join(paths)}")
+        return report
+
+    def fit_quantiles(self, alphas=(0.1, 0.5, 0.9), directory="."):
+        # One MultiQuantile model: every quantile comes out of a single predict call
+        params = self.model.get_params()
+        params["loss_function"] = "MultiQuantile:alpha=" + ",".join(str(a) for a in alphas)
+        params["eval_metric"] = params["loss_function"]
+        self.quantile_model = CatBoostRegressor(**params)
+
+        self.quantile_model.fit(self.train_pool)
+        # Save the model next to the point model
+        dump(self.quantile_model, os.path.join(directory, "model_Hussain_quantiles.joblib"))
+        return self.quantile_model
+
+    def cv(self, fold_count=5):
+        # Cross-validation of the current hyperparameters on the quantized pool
+        params = self.model.get_params()
+        params["loss_function"] = "RMSE"
+        return cv(self.train_pool, params, fold_count=fold_count, seed=42, logging_level="Silent")
+
+    def tune(self, param_grid, fold_count=3):
+        # Grid search on the quantized pool; the best parameters are kept for `fit`
+        result = self.model.grid_search(
+            param_grid, self.train_pool, cv=fold_count, refit=False, verbose=False
+        )
+        self.model.set_params(**result["params"])
+        return result
+
+    def evaluate_quantiles(self):
+        # Share of test prices inside [P10, P90] (should be close to 80%)
+        q = np.expm1(self.quantile_model.predict(self.X_test))
+        y = np.asarray(self.y_test)
+        coverage = np.mean((y >= q[:, 0]) & (y <= q[:, -1])) * 100
+        print(f"Interval coverage on Test: {coverage:.1f}%")
+        return coverage
+
+
+if __name__ == "__main__":
+    Data_link = "/home/learner/Desktop/Deplyment/Immoliza_app/preprocessing/ED.csv"
+    print(memory_report(Data_link).round(2))
 
+    Model = Model1(Data_link)
+    Model.select_features()
 
-Model.fit()
+    Model.fit()
+    Model.evaluate_segments()
+    Model.fit_quantiles()
 
-#Model.predict_()
+    #Model.predict_()
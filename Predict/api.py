@@ -0,0 +1,260 @@
+"""
+This module exposes the prediction service as a small JSON HTTP API (standard library only).
+
+Routes:
+-------
+- GET  /health             -> {"status": "ok"}
+- POST /predict            -> body {"records": [{...}, ...], "intervals": false}, returns prices,
+                              optional P10/P50/P90 and per-row errors
+- POST /explain            -> body {"records": [{...}, ...]}, returns per-feature contributions
+- GET  /localities?q=..&k= -> {"matches": [{"locality", "code", "score"}, ...]}, locality typeahead
+- GET  /shadow             -> rolling divergence of the shadowed candidate model (`--shadow VERSION`)
+- GET  /drift              -> PSI/KS of the served inputs against the training histograms
+- GET  /listings?id=..&id= -> prices of listings of the feature store (`--store`), looked up by `Id`
+
+Records hold the raw inputs (`Bedrooms`, `Living_Area`, `Is_Equiped_Kitchen`, `Terrace`, `Garden`,
+`State`, `Facades`, `Locality_encoded`, `SubType_encoded`); derived features are computed by the service.
+A free-text `Locality` name can be sent instead of `Locality_encoded`.
+
+Responses to /predict carry the model "version" that scored them; every request is recorded in the
+prediction log (`./logs`, see `Predict/replay.py` to load-test with it) and feeds the drift monitor,
+whose alerts go to `./logs/drift_alerts.jsonl`. The server serves the active
+version of the model registry and hot-swaps it when `python -m Predict.registry activate|rollback`
+changes it.
+
+How to Run:
+-----------
+python -m Predict.api --port 8000
+python -m Predict.api --port 8000 --shadow v0002 --shadow-rate 0.2
+python -m Predict.api --port 8000 --workers 4
+
+`--workers` forks that many server processes sharing the port (one per usable CPU by default, see
+`resources.py`; `IMMO_WORKERS` and the other `IMMO_*` variables override the budget). With more than one,
+the parent process only supervises them (`supervise`): it restarts a worker that dies and forwards
+SIGTERM/SIGINT, so stopping the parent stops every worker.
+"""
+
+import argparse
+import json
+import os
+import signal
+import sys
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from Predict.drift import Drift_Monitor
+from Predict.prediction_log import LOG_DIR, Prediction_Logger
+from Predict.registry import Model_Registry, Registry_Watcher
+from Predict.resources import configure
+from Predict.service import Prediction_Service
+from Predict.shadow import Shadow_Scorer
+from preprocessing.feature_store import STORE_DIR, Feature_Store
+
+# Signals the supervisor passes on to its workers
+FORWARDED = {signal.SIGTERM, signal.SIGINT}
+
+
+class Handler(BaseHTTPRequestHandler):
+    """
+    Routes requests to the `Prediction_Service` attached to the server.
+    """
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == "/localities":
+            query = parse_qs(url.query)
+            try:
+                k = int(query.get("k", ["10"])[0])
+            except ValueError:
+                self._send(400, {"error": "k must be an integer"})
+                return
+            matches = self.server.service.search_localities(query.get("q", [""])[0], k)
+            self._send(200, {"matches": matches})
+        elif url.path == "/listings":
+            if self.server.service.store is None:
+                self._send(404, {"error": "No feature store configured"})
+                return
+            try:
+                ids = [int(i) for i in parse_qs(url.query).get("id", [])]
+            except ValueError:
+                self._send(400, {"error": "id must be an integer"})
+                return
+            self._send(200, self.server.service.predict_listings(ids, source="api"))
+        elif url.path == "/health":
+            self._send(200, {"status": "ok"})
+        elif url.path == "/shadow":
+            shadow = self.server.service.shadow
+            if shadow is None:
+                self._send(404, {"error": "No shadow model configured"})
+            else:
+                self._send(200, shadow.stats())
+        elif url.path == "/drift":
+            drift = self.server.service.drift
+            if drift is None:
+                self._send(404, {"error": "No drift monitor configured"})
+            else:
+                self._send(200, drift.report())
+        else:
+            self._send(404, {"error": f"Unknown route {url.path}"})
+
+    def do_POST(self):
+        route = urlsplit(self.path).path
+        if route not in ("/predict", "/explain"):
+            self._send(404, {"error": f"Unknown route {route}"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length))
+            records = body["records"]
+        except (ValueError, KeyError, TypeError):
+            self._send(400, {"error": "Expected a JSON body {\"records\": [...]}"})
+            return
+        if not isinstance(records, list) or not all(isinstance(record, dict) for record in records):
+            self._send(400, {"error": "records must be a list of objects"})
+            return
+        # Bad values are per-row errors of the response; anything raised here is a server fault
+        service = self.server.service
+        try:
+            if route == "/predict":
+                response = service.predict(records, intervals=bool(body.get("intervals")), source="api")
+            else:
+                response = service.explain(records)
+        except Exception as e:
+            self._send(500, {"error": f"{type(e).__name__}: {e}"})
+            return
+        self._send(200, response)
+
+    def log_message(self, format, *args):
+        # Keep the console quiet under load
+        pass
+
+
+def serve(host="127.0.0.1", port=8000, service=None, reuse_port=False):
+    """
+    Starts a threading HTTP server around `service` (loaded with defaults when None).
+
+    With `reuse_port`, several processes can bind the same port and the kernel spreads connections over them.
+    """
+    server = ThreadingHTTPServer((host, port), Handler, bind_and_activate=False)
+    server.allow_reuse_port = reuse_port
+    try:
+        server.server_bind()
+        server.server_activate()
+    except OSError:
+        server.server_close()
+        raise
+    server.service = service or Prediction_Service.load(Model_Registry())
+    return server
+
+
+def run_worker(args, resources):
+    """
+    Loads the service described by the command-line `args` and serves until stopped.
+    """
+    registry = Model_Registry()
+    server = serve(args.host, args.port, reuse_port=resources.workers > 1)
+    if not args.no_log:
+        server.service.logger = Prediction_Logger(args.log_dir)
+    state = server.service.state
+    if not args.no_drift:
+        server.service.drift = Drift_Monitor.from_state(
+            state, path=os.path.join(args.log_dir, "drift_alerts.jsonl")
+        )
+    if os.path.exists(os.path.join(args.store, "manifest.json")):
+        server.service.store = Feature_Store(args.store)
+    if args.shadow:
+        server.service.shadow = Shadow_Scorer.from_registry(
+            registry, args.shadow, sample_rate=args.shadow_rate
+        )
+    # Started once the service is complete: a swap rebuilds the drift monitor it finds
+    Registry_Watcher(registry, server.service).start()
+    print(f"Serving on http://{args.host}:{args.port} (pid {os.getpid()}, {resources.to_dict()})")
+    server.serve_forever()
+
+
+def supervise(n_workers, start, restart_delay=1.0):
+    """
+    Runs `start` in `n_workers` forked processes until SIGTERM or SIGINT.
+
+    A worker that exits is forked again (after `restart_delay` seconds when it died right after starting,
+    so a worker failing at startup does not spin). SIGTERM and SIGINT are forwarded to the workers; the
+    function returns once they have all exited.
+
+    Args:
+    - n_workers (int): Number of worker processes.
+    - start (callable): Body of a worker; it is not expected to return.
+    - restart_delay (float): Minimum seconds between the start of a worker and its restart.
+    """
+    children = {}
+    stopping = False
+
+    def spawn():
+        # Signals wait until the child has its own handlers and the parent knows the child
+        signal.pthread_sigmask(signal.SIG_BLOCK, FORWARDED)
+        pid = os.fork()
+        if pid == 0:
+            # The worker leaves through SystemExit, also on SIGTERM, so its atexit handlers (prediction
+            # log flush) run; it never returns into this loop
+            signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+            signal.signal(signal.SIGINT, signal.default_int_handler)
+            signal.pthread_sigmask(signal.SIG_UNBLOCK, FORWARDED)
+            start()
+            sys.exit(0)
+        children[pid] = time.monotonic()
+        signal.pthread_sigmask(signal.SIG_UNBLOCK, FORWARDED)
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    for signum in FORWARDED:
+        signal.signal(signum, stop)
+    for _ in range(n_workers):
+        spawn()
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        started = children.pop(pid, None)
+        if started is None or stopping:
+            continue
+        print(f"Worker {pid} exited with status {os.waitstatus_to_exitcode(status)}, restarting")
+        time.sleep(max(started + restart_delay - time.monotonic(), 0))
+        if not stopping:
+            spawn()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ImmoEliza prediction API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--shadow", help="Registry version scored in the shadow of the served one")
+    parser.add_argument("--shadow-rate", type=float, default=1.0)
+    parser.add_argument("--log-dir", default=LOG_DIR, help="Prediction log directory")
+    parser.add_argument("--no-log", action="store_true", help="Do not record predictions")
+    parser.add_argument("--no-drift", action="store_true", help="Do not monitor input drift")
+    parser.add_argument("--workers", type=int, help="Server processes (one per usable CPU by default)")
+    parser.add_argument("--store", default=STORE_DIR, help="Feature store behind /listings")
+    args = parser.parse_args()
+
+    resources = configure("serve", workers=args.workers)
+    if resources.workers > 1:
+        # Workers are forked before anything is loaded: each one starts its own threads
+        supervise(resources.workers, lambda: run_worker(args, resources))
+    else:
+        run_worker(args, resources)
@@ -0,0 +1,384 @@
+"""
+This module watches whether the served inputs still look like the `ED.csv` data the model was trained on.
+
+At export time (`export_shared_model`) the training distribution of the monitored features is stored in
+the manifest as fixed histograms: quantile bins for the living area, one bin per value for the bedrooms,
+quantile bins of the locality frequency (the number of training listings in the requested locality, so
+a shift towards rare or unseen localities shows up with a handful of bins instead of ~800 sparse ones)
+and one bin per code for the subtype mix. `Drift_Monitor` keeps live histograms with exactly the same
+bins:
+
+- `observe(X)` is called by `Prediction_Service.predict` with the valid raw rows and only appends the
+  array to a bounded deque (a few hundred nanoseconds, no lock, no copy);
+- a background thread folds the pending rows into the live counts every `fold_interval` seconds with one
+  `np.bincount` per feature, and every `check_interval` seconds compares the live histograms with the
+  training ones (PSI for every feature, binned KS for the numeric ones);
+- features beyond `psi_alert` / `ks_alert` are appended as one JSON line to the alert file, then the live
+  counts are multiplied by `decay` so the next check weighs recent traffic most.
+
+A monitor belongs to one model version: the column positions and training histograms are those of its
+`Model_State`. `Prediction_Service.swap` replaces it with `for_state(new_state)` (same settings, fresh
+live counts) and only rows scored by the monitor's version are observed.
+
+Memory is constant whatever the traffic: the histograms have a fixed number of bins and at most
+`max_pending` requests wait to be folded (beyond that they are dropped and counted).
+
+Key Components:
+---------------
+1. Feature_Histogram:
+   - Fixed bins of one feature (`from_values`), vectorized `add(values)`, JSON round trip.
+
+2. reference_histograms(reference_data):
+   - The training histograms of `MONITORED_FEATURES`, stored in the export manifest.
+
+3. psi(expected, actual) / ks(expected, actual):
+   - Population stability index and binned Kolmogorov-Smirnov distance of two count vectors.
+
+4. Drift_Monitor:
+   - `from_state(state)`, `for_state(state)`, `observe(X)`, `check()`, `report()`; alerts in
+     `./logs/drift_alerts.jsonl` by default.
+
+Usage:
+------
+service.drift = Drift_Monitor.from_state(state)
+...
+service.drift.check()
+"""
+
+import json
+import os
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from Predict.prediction_log import LOG_DIR
+
+MONITORED_FEATURES = {
+    "Living_Area": "numeric",
+    "Bedrooms": "discrete",
+    "Locality_encoded": "frequency",
+    "SubType_encoded": "categorical",
+}
+
+# Usual PSI reading: < 0.1 stable, 0.1 - 0.2 moderate shift, > 0.2 significant shift
+PSI_ALERT = 0.2
+KS_ALERT = 0.1
+
+
+class Feature_Histogram:
+    """
+    Histogram of one feature over fixed bins.
+
+    Numeric features use `edges` (bin i holds edges[i - 1] <= v < edges[i], the first and last bins are
+    open-ended); frequency features first replace every code by its training count (`lookup`, 0 for
+    unseen codes), then use edges; discrete and categorical features use one bin per integer value
+    0 .. n_values - 1 plus a last bin for everything else (unseen codes, NaN).
+
+    Attributes:
+    - name (str): Feature name.
+    - kind (str): "numeric", "frequency", "discrete" or "categorical".
+    - edges (ndarray or None): Inner bin edges of a numeric or frequency feature.
+    - counts (ndarray[float64]): Count per bin.
+    - lookup (ndarray or None): Training count per code of a frequency feature.
+    """
+
+    def __init__(self, name, kind, counts, edges=None, lookup=None):
+        self.name = name
+        self.kind = kind
+        self.edges = None if edges is None else np.asarray(edges, dtype=np.float64)
+        self.counts = np.asarray(counts, dtype=np.float64)
+        self.lookup = None if lookup is None else np.asarray(lookup, dtype=np.float64)
+
+    @classmethod
+    def from_values(cls, name, kind, values, bins=20):
+        """
+        Builds the bins from training values and counts them.
+
+        Args:
+        - name (str): Feature name.
+        - kind (str): "numeric" (quantile bins), "frequency" (quantile bins of the training count of
+          the code), "discrete" or "categorical" (one bin per value).
+        - values (array-like): Training values.
+        - bins (int): Number of quantile bins of a numeric feature.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        known = values[~np.isnan(values)]
+        lookup = None
+        if kind == "frequency":
+            lookup = np.bincount(known.astype(np.int64)).astype(np.float64)
+            known = lookup[known.astype(np.int64)]
+        if kind in ("numeric", "frequency"):
+            edges = np.unique(np.quantile(known, np.linspace(0, 1, bins + 1)[1:-1]))
+            histogram = cls(name, kind, np.zeros(len(edges) + 1), edges, lookup)
+        else:
+            histogram = cls(name, kind, np.zeros(int(known.max()) + 2))
+        histogram.add(values)
+        return histogram
+
+    def empty(self):
+        """
+        Returns a histogram with the same bins and no counts.
+        """
+        return Feature_Histogram(
+            self.name, self.kind, np.zeros_like(self.counts), self.edges, self.lookup
+        )
+
+    def bins(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        if self.lookup is not None:
+            codes = np.nan_to_num(values, nan=-1).astype(np.int64)
+            known = (codes >= 0) & (codes < len(self.lookup))
+            values = np.where(known, self.lookup[np.where(known, codes, 0)], 0.0)
+        if self.edges is not None:
+            return np.searchsorted(self.edges, values, side="right")
+        other = len(self.counts) - 1
+        codes = np.where(np.isnan(values), other, values)
+        codes = codes.astype(np.int64)
+        codes[(codes < 0) | (codes > other)] = other
+        return codes
+
+    def add(self, values):
+        self.counts += np.bincount(self.bins(values), minlength=len(self.counts))
+
+    def to_dict(self):
+        histogram = {"kind": self.kind, "counts": self.counts.tolist()}
+        if self.edges is not None:
+            histogram["edges"] = self.edges.tolist()
+        if self.lookup is not None:
+            histogram["lookup"] = self.lookup.tolist()
+        return histogram
+
+    @classmethod
+    def from_dict(cls, name, histogram):
+        return cls(
+            name, histogram["kind"], histogram["counts"], histogram.get("edges"), histogram.get("lookup")
+        )
+
+
+def reference_histograms(reference_data, features=MONITORED_FEATURES):
+    """
+    Returns the training histograms stored in the export manifest ({feature: histogram dict}).
+    """
+    return {
+        name: Feature_Histogram.from_values(name, kind, reference_data[name]).to_dict()
+        for name, kind in features.items()
+        if name in reference_data
+    }
+
+
+def psi(expected, actual, eps=1e-4):
+    """
+    Population stability index of two count vectors over the same bins.
+    """
+    p = np.maximum(expected / max(expected.sum(), 1.0), eps)
+    q = np.maximum(actual / max(actual.sum(), 1.0), eps)
+    return float(np.sum((q - p) * np.log(q / p)))
+
+
+def ks(expected, actual):
+    """
+    Kolmogorov-Smirnov distance of two binned distributions (largest gap between the cumulative shares).
+    """
+    p = np.cumsum(expected) / max(expected.sum(), 1.0)
+    q = np.cumsum(actual) / max(actual.sum(), 1.0)
+    return float(np.max(np.abs(p - q)))
+
+
+class Drift_Monitor:
+    """
+    Streaming comparison of the served inputs with the training histograms.
+    """
+
+    def __init__(
+        self,
+        reference,
+        features,
+        path=os.path.join(LOG_DIR, "drift_alerts.jsonl"),
+        check_interval=60.0,
+        fold_interval=1.0,
+        min_count=500,
+        psi_alert=PSI_ALERT,
+        ks_alert=KS_ALERT,
+        decay=0.5,
+        max_pending=10_000,
+        version=None,
+    ):
+        """
+        Args:
+        - reference (dict): Training histograms ({feature: histogram dict}, `reference_histograms`).
+        - features (list[str]): Column names of the rows passed to `observe`.
+        - version (str or None): Model version whose rows are observed.
+        - path (str or None): JSONL alert file; None keeps the alerts in memory only.
+        - check_interval (float or None): Seconds between two background checks; None disables the thread.
+        - fold_interval (float): Seconds between two folds of the pending rows.
+        - min_count (float): Live rows needed before a feature is compared.
+        - psi_alert (float): PSI beyond which a feature is reported.
+        - ks_alert (float): Binned KS distance beyond which a numeric feature is reported.
+        - decay (float): Factor applied to the live counts after every check.
+        - max_pending (int): Pending requests beyond which new ones are dropped.
+        """
+        self.reference = {
+            name: Feature_Histogram.from_dict(name, histogram) for name, histogram in reference.items()
+        }
+        self.live = {name: histogram.empty() for name, histogram in self.reference.items()}
+        position = {name: i for i, name in enumerate(features)}
+        self.columns = [(position[name], self.live[name]) for name in self.live if name in position]
+        self.version = version
+        self.path = path
+        self.check_interval = check_interval
+        self.fold_interval = fold_interval
+        self.min_count = min_count
+        self.psi_alert = psi_alert
+        self.ks_alert = ks_alert
+        self.decay = decay
+        self.max_pending = max_pending
+        self.observed = 0
+        self.dropped = 0
+        self.last_report = None
+        self._pending = deque()
+        self._lock = threading.Lock()
+        self._halt = threading.Event()
+        if check_interval is not None:
+            self._thread = threading.Thread(target=self._run, name="drift-monitor", daemon=True)
+            self._thread.start()
+
+    @classmethod
+    def from_state(cls, state, **kwargs):
+        """
+        Monitors the inputs of a `Model_State` against its training histograms (none for older exports).
+        """
+        return cls(state.drift_reference or {}, state.predictor.features, version=state.version, **kwargs)
+
+    def for_state(self, state):
+        """
+        A monitor with the same settings for another model version, with empty live histograms.
+        """
+        return Drift_Monitor.from_state(
+            state,
+            path=self.path,
+            check_interval=self.check_interval,
+            fold_interval=self.fold_interval,
+            min_count=self.min_count,
+            psi_alert=self.psi_alert,
+            ks_alert=self.ks_alert,
+            decay=self.decay,
+            max_pending=self.max_pending,
+        )
+
+    def observe(self, X):
+        """
+        Hands served rows over to the monitor without processing them.
+
+        Args:
+        - X (ndarray, shape (n, F)): Raw feature rows in `features` order; must not be modified afterwards.
+        """
+        if len(self._pending) >= self.max_pending:
+            self.dropped += 1
+        else:
+            self._pending.append(X)
+
+    def fold(self):
+        """
+        Adds every pending row to the live histograms.
+        """
+        with self._lock:
+            batch = []
+            while True:
+                try:
+                    batch.append(self._pending.popleft())
+                except IndexError:
+                    break
+            if not batch:
+                return
+            X = np.concatenate(batch) if len(batch) > 1 else batch[0]
+            for column, histogram in self.columns:
+                histogram.add(X[:, column])
+            self.observed += len(X)
+
+    def report(self):
+        """
+        Compares the live histograms with the training ones.
+
+        Returns:
+        - dict: {feature: {"psi", "ks" (None for categorical features), "count", "alert"}} for the
+          features with at least `min_count` live rows.
+        """
+        self.fold()
+        report = {}
+        with self._lock:
+            for name, live in self.live.items():
+                count = float(live.counts.sum())
+                if count < self.min_count:
+                    continue
+                expected = self.reference[name].counts
+                value_psi = psi(expected, live.counts)
+                value_ks = ks(expected, live.counts) if live.kind != "categorical" else None
+                report[name] = {
+                    "psi": value_psi,
+                    "ks": value_ks,
+                    "count": count,
+                    "alert": value_psi > self.psi_alert
+                    or (value_ks is not None and value_ks > self.ks_alert),
+                }
+        return report
+
+    def check(self):
+        """
+        Runs one comparison, appends an alert line when a feature drifted and decays the live counts.
+
+        Returns:
+        - dict: The report of `report()`.
+        """
+        report = self.report()
+        self.last_report = report
+        drifted = {name: values for name, values in report.items() if values["alert"]}
+        if drifted and self.path:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a") as f:
+                f.write(json.dumps({"ts": time.time(), "features": drifted}) + "\n")
+        if report:
+            with self._lock:
+                for histogram in self.live.values():
+                    histogram.counts *= self.decay
+        return report
+
+    def _run(self):
+        next_check = time.monotonic() + self.check_interval
+        while not self._halt.wait(self.fold_interval):
+            try:
+                self.fold()
+                if time.monotonic() >= next_check:
+                    next_check += self.check_interval
+                    self.check()
+            except Exception as error:
+                # Monitoring never takes the server down
+                print(f"Drift check failed: {error}")
+
+    def close(self):
+        self._halt.set()
+
+
+if __name__ == "__main__":
+    import pandas as pd
+
+    # Overhead of `observe` on the request path and fold throughput, with shifted synthetic traffic
+    reference_data = pd.read_csv("./preprocessing/ED.csv", index_col=0).drop(columns=["Price", "Id"])
+    features = list(reference_data.columns)
+    monitor = Drift_Monitor(
+        reference_histograms(reference_data), features, path=None, check_interval=None, max_pending=10**6
+    )
+    rows = reference_data.sample(100_000, replace=True, random_state=0).to_numpy(dtype=np.float32)
+    rows[:, features.index("Living_Area")] *= 1.3
+    requests = [rows[i : i + 1] for i in range(len(rows))]
+    start = time.perf_counter()
+    for X in requests:
+        monitor.observe(X)
+    observe_us = (time.perf_counter() - start) / len(requests) * 1e6
+    start = time.perf_counter()
+    monitor.fold()
+    fold_us = (time.perf_counter() - start) / len(requests) * 1e6
+    print(f"observe: {observe_us:.2f} us/request, fold: {fold_us:.2f} us/request")
+    for name, values in monitor.report().items():
+        print(name, values)
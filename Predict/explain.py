@@ -0,0 +1,108 @@
+"""
+This module explains predictions with per-feature contributions computed by CatBoost's native `ShapValues`.
+
+Agents want to know why the model priced a property the way it did. `Explainer` scores whole batches of
+rows with one `get_feature_importance(type="ShapValues")` call using all cores, and caches every row's
+contributions under a hash of its feature vector, so repeated explanations (the same form submitted again,
+the same listing in several batches) cost a dictionary lookup. A background sample of the training data is
+explained once at start-up to give the average contribution of every feature, against which a single
+property's contributions can be compared.
+
+Contributions are in log-price space (the model predicts `log1p(price)`): they sum, together with the
+expected value, to the raw prediction.
+
+Key Components:
+---------------
+1. Explainer:
+   - `explain(X)`: Contributions (n, F) and expected value for raw float32 feature rows in canonical order.
+   - `background`: Mean absolute contribution per feature over the background sample.
+
+Usage:
+------
+explainer = Explainer(model, predictor, reference_data)
+contributions, expected_value = explainer.explain(X)
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+from catboost import Pool
+
+from Predict.resources import current
+
+
+class Explainer:
+    """
+    Batched, cached SHAP explanations for a CatBoost model.
+    """
+
+    def __init__(self, model, predictor, reference_data, background_size=500, cache_size=100_000):
+        """
+        Args:
+        - model (CatBoost): The fitted model.
+        - predictor (Fast_Predictor): Provides the canonical feature order and the scaling arrays.
+        - reference_data (pd.DataFrame): Training features, sampled for the background contributions.
+        - background_size (int): Number of background rows explained once at start-up.
+        - cache_size (int): Maximum number of cached feature vectors.
+        """
+        self.model = model
+        self.features = predictor.features
+        self.scale = np.asarray(predictor.scale)
+        self.offset = np.asarray(predictor.offset)
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+        sample = reference_data[self.features].sample(
+            min(background_size, len(reference_data)), random_state=42
+        )
+        contributions, self.expected_value = self._shap(sample.to_numpy(dtype=np.float32))
+        self.background = pd.Series(np.abs(contributions).mean(axis=0), index=self.features)
+
+    def _shap(self, X):
+        # Scale a copy with the serving arrays, then one ShapValues call on the process's thread budget
+        scaled = X * self.scale + self.offset
+        values = self.model.get_feature_importance(
+            Pool(scaled), type="ShapValues", thread_count=current().catboost_threads
+        )
+        return values[:, :-1], float(values[0, -1])
+
+    @staticmethod
+    def _key(row):
+        return hashlib.blake2b(row.tobytes(), digest_size=16).digest()
+
+    def explain(self, X):
+        """
+        Explains raw feature rows, computing only the rows missing from the cache.
+
+        Args:
+        - X (ndarray[float32], shape (n, F)): Raw features in canonical order (derived columns filled).
+
+        Returns:
+        - tuple(pd.DataFrame, float): Contributions (n, F) in log-price space and the expected value.
+        """
+        X = np.ascontiguousarray(np.atleast_2d(X), dtype=np.float32)
+        keys = [self._key(row) for row in X]
+        result = np.empty((len(X), len(self.features)))
+        missing = []
+        with self._lock:
+            for i, key in enumerate(keys):
+                values = self._cache.get(key)
+                if values is None:
+                    missing.append(i)
+                else:
+                    result[i] = values
+                    self._cache.move_to_end(key)
+
+        if missing:
+            contributions, _ = self._shap(X[missing])
+            result[missing] = contributions
+            with self._lock:
+                for i, values in zip(missing, contributions):
+                    self._cache[keys[i]] = values
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return pd.DataFrame(result, columns=self.features), self.expected_value
@@ -0,0 +1,405 @@
+"""
+This module provides a low-overhead prediction path for the pre-trained CatBoost model.
+
+The Streamlit path builds a one-row `pd.DataFrame`, refits a `MinMaxScaler` on the reference data,
+lets sklearn re-validate the feature names and then calls `model.predict`, which wraps the row into a
+CatBoost `Pool`. For a single row that bookkeeping costs far more than scoring the trees.
+
+Key Components:
+---------------
+1. Tree_Arrays:
+   - Flattens the oblivious trees of a fitted CatBoost model into dense NumPy arrays
+     (split feature, split border, leaf values) and scores rows with a few vectorized operations:
+     every distinct border is compared once per row, and a sparse split matrix turns those bits
+     into the leaf index of every tree.
+
+2. Fast_Predictor:
+   - Holds the canonical feature order and the precomputed Min-Max `scale`/`offset` arrays
+     (`min_max_arrays()`, shared with the in-place scaling of `Data_Prep.Normalize_Data`).
+   - `predict_vector()` takes a preallocated float32 vector in canonical order, scales it in place
+     and calls the raw tree predictor.
+   - `predict_frame()` keeps DataFrame input as a convenience wrapper for batches.
+
+3. benchmark():
+   - Micro-benchmark comparing the historical DataFrame path with the vector fast path.
+   - `benchmark_intervals()` compares the point predictor with the MultiQuantile predictor: both
+     are one vectorized pass over the trees, the quantile one gathers K leaf values instead of one.
+
+A multi-output model (`Model1.fit_quantiles`) loads the same way; its predictions have one column
+per quantile.
+
+Usage:
+------
+predictor = Fast_Predictor.from_reference(model, reference_data)
+x = predictor.empty_vector()
+x[:] = ...  # features in `predictor.features` order
+price = predictor.predict_vector(x)
+
+Run `python -m Predict.fast_predictor` from the repository root to print the benchmark.
+"""
+
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+
+class Tree_Arrays:
+    """
+    Dense array representation of a CatBoost oblivious-tree ensemble.
+
+    Attributes:
+    - split_feature (ndarray[int32], shape (T, D)): Feature index tested at each depth of each tree.
+    - split_border (ndarray[float32], shape (T, D)): Border compared against (`x > border` sets the bit).
+    - leaf_values (ndarray[float64], shape (T, 2**D, K)): Leaf values for the K output dimensions.
+    - bias (ndarray[float64], shape (K,)): Bias added to the raw sum.
+    - scale (float): Scale applied to the raw sum before the bias.
+    - nan_as_max (ndarray[bool]): Features whose NaNs CatBoost routes as larger than every border.
+    """
+
+    # Number of rows scored at once, bounds the (trees, rows) temporaries
+    chunk_size = 1024
+    # Array attributes persisted by save()/load()
+    array_names = ("split_feature", "split_border", "leaf_values", "bias", "nan_as_max")
+
+    def __init__(self, split_feature, split_border, leaf_values, bias, scale=1.0, nan_as_max=None):
+        self.split_feature = split_feature
+        self.split_border = split_border
+        self.leaf_values = leaf_values
+        self.bias = bias
+        self.scale = scale
+        self.nan_as_max = nan_as_max
+        self.depth = split_feature.shape[1]
+        n_trees = split_feature.shape[0]
+
+        # Each distinct (feature, border) pair is compared once per row; a sparse matrix then adds
+        # 2**d for every split a tree uses at depth d, which yields the leaf index of every tree.
+        keys = (split_feature.astype(np.int64) << 32) | np.asarray(split_border).view(np.uint32)
+        unique, inverse = np.unique(keys.ravel(), return_inverse=True)
+        self.border_feature = (unique >> 32).astype(np.intp)
+        self.border_value = (unique & 0xFFFFFFFF).astype(np.uint32).view(np.float32)
+        self.split_matrix = sparse.csr_matrix(
+            (
+                np.tile((1 << np.arange(self.depth)).astype(np.float32), n_trees),
+                (np.repeat(np.arange(n_trees), self.depth), inverse.ravel()),
+            ),
+            shape=(n_trees, len(unique)),
+        )
+        n_leaves = leaf_values.shape[1]
+        self.leaf_offset = (np.arange(n_trees) * n_leaves)[:, None]
+        # One contiguous (trees * leaves) table per output dimension
+        self.flat_leaf_values = np.ascontiguousarray(
+            np.asarray(leaf_values).reshape(n_trees * n_leaves, -1).T
+        )
+
+    @classmethod
+    def from_catboost(cls, model):
+        """
+        Builds the arrays from a fitted CatBoost model through its JSON export.
+
+        Args:
+        - model (CatBoost): A fitted model with symmetric (oblivious) trees and float features only.
+
+        Returns:
+        - Tree_Arrays: The flattened ensemble.
+        """
+        fd, path = tempfile.mkstemp(suffix=".json")
+        os.close(fd)
+        try:
+            model.save_model(path, format="json")
+            with open(path) as f:
+                dump = json.load(f)
+        finally:
+            os.remove(path)
+
+        trees = dump["oblivious_trees"]
+        depth = max(len(tree["splits"]) for tree in trees)
+        n_leaves = 1 << depth
+        dimension = len(trees[0]["leaf_values"]) // (1 << len(trees[0]["splits"]))
+
+        split_feature = np.zeros((len(trees), depth), dtype=np.int32)
+        # Padding splits never fire, so shallower trees reuse leaves 0..2**d - 1
+        split_border = np.full((len(trees), depth), np.inf, dtype=np.float32)
+        leaf_values = np.zeros((len(trees), n_leaves, dimension), dtype=np.float64)
+        for t, tree in enumerate(trees):
+            for d, split in enumerate(tree["splits"]):
+                split_feature[t, d] = split["float_feature_index"]
+                split_border[t, d] = split["border"]
+            values = np.asarray(tree["leaf_values"], dtype=np.float64).reshape(-1, dimension)
+            leaf_values[t, : len(values)] = values
+
+        float_features = dump["features_info"]["float_features"]
+        nan_as_max = np.array(
+            [feature.get("nan_value_treatment") == "AsTrue" for feature in float_features]
+        )
+        scale, bias = dump.get("scale_and_bias", [1.0, [0.0]])
+        bias = np.asarray(bias if isinstance(bias, list) else [bias], dtype=np.float64)
+        return cls(split_feature, split_border, leaf_values, bias, scale, nan_as_max)
+
+    def save(self, directory):
+        """
+        Writes each array as a `.npy` file so worker processes can memory-map them.
+
+        Args:
+        - directory (str): Target directory, created if missing.
+        """
+        os.makedirs(directory, exist_ok=True)
+        for name in self.array_names:
+            np.save(os.path.join(directory, f"{name}.npy"), getattr(self, name))
+        with open(os.path.join(directory, "trees.json"), "w") as f:
+            json.dump({"scale": float(self.scale)}, f)
+
+    @classmethod
+    def load(cls, directory, mmap_mode="r"):
+        """
+        Loads arrays written by `save()`.
+
+        Args:
+        - directory (str): Directory holding the `.npy` files.
+        - mmap_mode (str or None): "r" maps the files read-only so every process on the host shares
+          one physical copy through the page cache; None reads private copies.
+
+        Returns:
+        - Tree_Arrays: The ensemble.
+        """
+        arrays = {
+            name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mmap_mode)
+            for name in cls.array_names
+        }
+        with open(os.path.join(directory, "trees.json")) as f:
+            scale = json.load(f)["scale"]
+        return cls(scale=scale, **arrays)
+
+    def predict_raw(self, X):
+        """
+        Scores rows on the raw (log-price) scale.
+
+        Args:
+        - X (ndarray[float32], shape (n, F) or (F,)): Scaled features in canonical order.
+
+        Returns:
+        - ndarray: Shape (n,) for single-output models, (n, K) otherwise.
+        """
+        X = np.atleast_2d(X)
+        if self.nan_as_max is not None and self.nan_as_max.any():
+            X = X.copy()
+            columns = np.flatnonzero(self.nan_as_max)
+            block = X[:, columns]
+            block[np.isnan(block)] = np.inf
+            X[:, columns] = block
+
+        out = np.empty((X.shape[0], self.leaf_values.shape[2]), dtype=np.float64)
+        for start in range(0, X.shape[0], self.chunk_size):
+            chunk = X[start : start + self.chunk_size]
+            bins = (chunk[:, self.border_feature] > self.border_value).astype(np.float32)
+            # (trees, rows) leaf indices into the flattened leaf table
+            leaves = (self.split_matrix @ bins.T).astype(np.intp) + self.leaf_offset
+            for k, values in enumerate(self.flat_leaf_values):
+                out[start : start + self.chunk_size, k] = values[leaves].sum(axis=0)
+        out = out * self.scale + self.bias
+        return out[:, 0] if out.shape[1] == 1 else out
+
+
+def min_max_arrays(values):
+    """
+    Computes the float32 Min-Max scaling arrays of a matrix: scaled = values * scale + offset.
+
+    Args:
+    - values (ndarray, shape (n, F)): Raw features; NaN is ignored.
+
+    Returns:
+    - tuple(ndarray[float32], ndarray[float32]): scale and offset, one value per column.
+    """
+    data_min = np.nanmin(values, axis=0).astype(np.float64)
+    data_range = np.nanmax(values, axis=0) - data_min
+    # Same convention as MinMaxScaler for constant columns
+    data_range[data_range == 0.0] = 1.0
+    scale = 1.0 / data_range
+    offset = -data_min * scale
+    return scale.astype(np.float32), offset.astype(np.float32)
+
+
+class Fast_Predictor:
+    """
+    Single-row and batch predictor working on float32 vectors in canonical feature order.
+    """
+
+    def __init__(self, trees, features, scale, offset):
+        self.trees = trees
+        self.features = list(features)
+        self.scale = scale
+        self.offset = offset
+
+    @classmethod
+    def from_reference(cls, model, reference_data):
+        """
+        Precomputes the Min-Max scaling arrays from the reference data the model was trained on.
+
+        Args:
+        - model (CatBoost): The fitted model.
+        - reference_data (pd.DataFrame): Training features, columns in model order.
+
+        Returns:
+        - Fast_Predictor: The predictor.
+        """
+        scale, offset = min_max_arrays(reference_data.to_numpy(dtype=np.float64))
+        return cls(Tree_Arrays.from_catboost(model), reference_data.columns, scale, offset)
+
+    def save(self, directory):
+        """
+        Persists the trees, the feature order and the scaling arrays to `directory`.
+        """
+        self.trees.save(directory)
+        np.save(os.path.join(directory, "scale.npy"), self.scale)
+        np.save(os.path.join(directory, "offset.npy"), self.offset)
+        with open(os.path.join(directory, "features.json"), "w") as f:
+            json.dump(self.features, f)
+
+    @classmethod
+    def load(cls, directory, mmap_mode="r"):
+        """
+        Loads a predictor written by `save()`, memory-mapping the arrays by default.
+        """
+        with open(os.path.join(directory, "features.json")) as f:
+            features = json.load(f)
+        return cls(
+            Tree_Arrays.load(directory, mmap_mode),
+            features,
+            np.load(os.path.join(directory, "scale.npy"), mmap_mode=mmap_mode),
+            np.load(os.path.join(directory, "offset.npy"), mmap_mode=mmap_mode),
+        )
+
+    def empty_vector(self):
+        """
+        Returns a preallocated float32 vector to fill in `self.features` order.
+        """
+        return np.zeros(len(self.features), dtype=np.float32)
+
+    def predict_vector(self, x):
+        """
+        Predicts the price of one property.
+
+        The vector is scaled in place, so it must not be reused as raw input afterwards.
+
+        Args:
+        - x (ndarray[float32], shape (F,)): Raw features in `self.features` order.
+
+        Returns:
+        - float: The predicted price on the original scale.
+        """
+        np.multiply(x, self.scale, out=x)
+        np.add(x, self.offset, out=x)
+        return float(np.expm1(self.trees.predict_raw(x)[0]))
+
+    def predict_batch(self, X):
+        """
+        Predicts prices for a float32 matrix in canonical order, scaling it in place.
+
+        Args:
+        - X (ndarray[float32], shape (n, F)): Raw features.
+
+        Returns:
+        - ndarray: Predicted prices on the original scale.
+        """
+        np.multiply(X, self.scale, out=X)
+        np.add(X, self.offset, out=X)
+        return np.expm1(self.trees.predict_raw(X))
+
+    def predict_frame(self, data):
+        """
+        Convenience wrapper accepting a DataFrame (or a dict for a single row).
+
+        Args:
+        - data (pd.DataFrame or dict): Raw features; extra columns are ignored.
+
+        Returns:
+        - ndarray: Predicted prices on the original scale.
+        """
+        if isinstance(data, dict):
+            data = pd.DataFrame([data])
+        X = data[self.features].to_numpy(dtype=np.float32, copy=True)
+        return self.predict_batch(X)
+
+
+def benchmark(model_path="./model/model_Hussain.joblib", data_path="./preprocessing/ED.csv", n=500):
+    """
+    Compares the per-call overhead of the DataFrame path with the float32 vector path.
+
+    Args:
+    - model_path (str): Path of the joblib model.
+    - data_path (str): Path of the reference dataset.
+    - n (int): Number of timed calls per path.
+
+    Returns:
+    - dict: Mean microseconds per call for each path and the speedup.
+    """
+    from joblib import load
+    from sklearn.preprocessing import MinMaxScaler
+
+    model = load(model_path)
+    reference_data = pd.read_csv(data_path, index_col=0).drop(columns=["Price", "Id"])
+    predictor = Fast_Predictor.from_reference(model, reference_data)
+    row = reference_data.iloc[0].to_dict()
+    raw = reference_data.iloc[0].to_numpy(dtype=np.float32)
+    x = predictor.empty_vector()
+
+    def dataframe_path():
+        scaler = MinMaxScaler().fit(reference_data)
+        return np.expm1(model.predict(scaler.transform(pd.DataFrame([row])))[0])
+
+    def vector_path():
+        x[:] = raw
+        return predictor.predict_vector(x)
+
+    timings = {}
+    for name, func in (("dataframe_us", dataframe_path), ("vector_us", vector_path)):
+        func()
+        start = time.perf_counter()
+        for _ in range(n):
+            func()
+        timings[name] = (time.perf_counter() - start) / n * 1e6
+    timings["speedup"] = timings["dataframe_us"] / timings["vector_us"]
+    return timings
+
+
+def benchmark_intervals(
+    model_path="./model/model_Hussain.joblib",
+    quantile_model_path="./model/model_Hussain_quantiles.joblib",
+    data_path="./preprocessing/ED.csv",
+    n=500,
+):
+    """
+    Measures the overhead of P10/P50/P90 prediction over the point prediction.
+
+    Returns:
+    - dict: Mean microseconds per single-row call and per 1000-row batch for each predictor.
+    """
+    from joblib import load
+
+    reference_data = pd.read_csv(data_path, index_col=0).drop(columns=["Price", "Id"])
+    raw = reference_data.to_numpy(dtype=np.float32)
+    timings = {}
+    for name, path in (("point", model_path), ("quantiles", quantile_model_path)):
+        predictor = Fast_Predictor.from_reference(load(path), reference_data)
+        for label, rows, repeat in (("row_us", 1, n), ("batch_1000_us", 1000, max(n // 50, 1))):
+            X = raw[:rows].copy()
+            start = time.perf_counter()
+            for _ in range(repeat):
+                X[:] = raw[:rows]
+                predictor.predict_batch(X)
+            timings[f"{name}_{label}"] = (time.perf_counter() - start) / repeat * 1e6
+    timings["row_overhead"] = timings["quantiles_row_us"] / timings["point_row_us"] - 1
+    timings["batch_overhead"] = timings["quantiles_batch_1000_us"] / timings["point_batch_1000_us"] - 1
+    return timings
+
+
+if __name__ == "__main__":
+    for key, value in benchmark().items():
+        print(f"{key}: {value:.1f}")
+    if os.path.exists("./model/model_Hussain_quantiles.joblib"):
+        for key, value in benchmark_intervals().items():
+            print(f"{key}: {value:.2f}")
@@ -0,0 +1,258 @@
+"""
+This module selects the model features automatically instead of by hand.
+
+`Data_cleaning.encoding` used to decide which columns to drop from experience, and `RFE` with a linear
+model was imported but never run. The selection here works with the model actually trained:
+
+1. CatBoost's `select_features` eliminates the features by loss-function change (the increase of the
+   validation loss when a feature is removed), which gives an elimination order;
+2. every candidate subset (the k most useful features, for every k) is scored by training a short
+   CatBoost model on it, the candidates running in parallel worker processes;
+3. the smallest subset scoring within `tolerance` of the best one is selected.
+
+Scores are cached in a JSON file keyed by the feature set, the data hash and the evaluation parameters,
+so rerunning the selection on unchanged data only trains the subsets never scored before.
+
+The selected list is written to the training manifest (`<model>.manifest.json`, next to the joblib
+model). `Model1.fit` trains with the other columns as `ignored_features`: training no longer quantizes
+or evaluates them, and the model still takes the full canonical feature vector, so serving does not
+change.
+
+Key Components:
+---------------
+1. data_hash(X, y):
+   - Content hash of the training data.
+
+2. Score_Cache:
+   - JSON file of validation scores per (feature set, data hash, parameters).
+
+3. select_feature_subset(X, y, X_val, y_val, features, ...):
+   - Elimination order, parallel scoring of the candidates, selected subset and report.
+
+4. write_training_manifest(model_path, ...) / read_training_manifest(model_path):
+   - The training manifest next to the model.
+
+Usage:
+------
+report = select_feature_subset(X_train, y_train, X_val, y_val, features)
+report["selected_features"]
+"""
+
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from catboost import CatBoostRegressor, EFeaturesSelectionAlgorithm, EShapCalcType
+
+CACHE_PATH = "./model/feature_selection_cache.json"
+
+# Short models: subsets are compared with each other, not with the final model
+SELECTION_PARAMS = {
+    "iterations": 300,
+    "learning_rate": 0.1,
+    "depth": 5,
+    "l2_leaf_reg": 10,
+    "min_data_in_leaf": 10,
+    "random_seed": 42,
+    "thread_count": 1,
+}
+
+
+def data_hash(*arrays):
+    """
+    Returns a short content hash of the given arrays (features and target).
+    """
+    digest = hashlib.sha1()
+    for array in arrays:
+        array = np.ascontiguousarray(np.asarray(array, dtype=np.float64))
+        digest.update(str(array.shape).encode())
+        digest.update(array.tobytes())
+    return digest.hexdigest()[:16]
+
+
+class Score_Cache:
+    """
+    Validation scores of feature subsets, persisted as JSON.
+
+    Attributes:
+    - path (str): JSON file, created on the first `save()`.
+    - scores (dict[str, float]): Cache key -> validation RMSE.
+    """
+
+    def __init__(self, path=CACHE_PATH):
+        self.path = path
+        self.scores = {}
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self.scores = json.load(f)
+
+    @staticmethod
+    def key(features, digest, params):
+        return json.dumps([sorted(features), digest, params], sort_keys=True)
+
+    def get(self, features, digest, params):
+        return self.scores.get(self.key(features, digest, params))
+
+    def put(self, features, digest, params, score):
+        self.scores[self.key(features, digest, params)] = score
+
+    def save(self):
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.scores, f)
+        os.replace(tmp, self.path)
+
+
+def _score_subset(task):
+    # Worker process: validation RMSE (log price) of a short model trained on one subset
+    columns, X, y, X_val, y_val, params = task
+    model = CatBoostRegressor(**params, logging_level="Silent")
+    model.fit(X[:, columns], y)
+    residuals = model.predict(X_val[:, columns]) - y_val
+    return float(np.sqrt(np.mean(residuals**2)))
+
+
+def elimination_order(X, y, X_val, y_val, features, params=SELECTION_PARAMS, steps=4):
+    """
+    Orders the features from the least to the most useful with CatBoost's `select_features`.
+
+    Args:
+    - X, y: Training features and log-price target.
+    - X_val, y_val: Validation features and log-price target.
+    - features (list[str]): Column names of `X`.
+    - params (dict): CatBoost parameters of the elimination model.
+    - steps (int): Elimination rounds; the features removed within a round are still ordered by loss
+      change. One feature per round makes CatBoost 1.2 abort (SIGFPE) on this data.
+
+    Returns:
+    - list[str]: Every feature, first eliminated first.
+    """
+    model = CatBoostRegressor(**params)
+    summary = model.select_features(
+        X,
+        y,
+        eval_set=(X_val, y_val),
+        features_for_select=list(range(len(features))),
+        num_features_to_select=1,
+        steps=min(steps, len(features) - 1),
+        algorithm=EFeaturesSelectionAlgorithm.RecursiveByLossFunctionChange,
+        shap_calc_type=EShapCalcType.Regular,
+        train_final_model=False,
+        logging_level="Silent",
+    )
+    eliminated = [int(i) for i in summary["eliminated_features"]]
+    kept = [int(i) for i in summary["selected_features"]]
+    return [features[i] for i in dict.fromkeys(eliminated + kept)]
+
+
+def select_feature_subset(
+    X,
+    y,
+    X_val,
+    y_val,
+    features,
+    tolerance=0.01,
+    min_features=3,
+    max_workers=None,
+    cache=None,
+    params=SELECTION_PARAMS,
+):
+    """
+    Selects the smallest feature subset whose validation RMSE is within `tolerance` of the best subset.
+
+    Args:
+    - X, y: Training features (ndarray) and log-price target.
+    - X_val, y_val: Validation features and log-price target, never the test set.
+    - features (list[str]): Column names of `X`.
+    - tolerance (float): Accepted relative RMSE increase over the best subset.
+    - min_features (int): Smallest subset considered.
+    - max_workers (int or None): Worker processes, one per CPU by default.
+    - cache (Score_Cache or None): Score cache, `CACHE_PATH` by default.
+    - params (dict): CatBoost parameters of the scoring models.
+
+    Returns:
+    - dict: "selected_features" (canonical order), "eliminated_features", "elimination_order",
+      "scores" ({number of features: RMSE}), "data_hash" and "cached" (subsets read from the cache).
+    """
+    X, X_val = np.asarray(X, dtype=np.float64), np.asarray(X_val, dtype=np.float64)
+    y, y_val = np.asarray(y, dtype=np.float64), np.asarray(y_val, dtype=np.float64)
+    cache = cache or Score_Cache()
+    digest = data_hash(X, y, X_val, y_val)
+
+    order = elimination_order(X, y, X_val, y_val, features, params)
+    position = {name: i for i, name in enumerate(features)}
+    # Candidate k: the k features eliminated last
+    candidates = {k: order[len(order) - k :] for k in range(min_features, len(order) + 1)}
+
+    scores, missing = {}, []
+    for k, subset in candidates.items():
+        score = cache.get(subset, digest, params)
+        if score is None:
+            missing.append(k)
+        else:
+            scores[k] = score
+    cached = len(scores)
+    if missing:
+        tasks = [
+            (sorted(position[name] for name in candidates[k]), X, y, X_val, y_val, params)
+            for k in missing
+        ]
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            for k, score in zip(missing, pool.map(_score_subset, tasks)):
+                scores[k] = score
+                cache.put(candidates[k], digest, params, score)
+        cache.save()
+
+    best = min(scores.values())
+    k = min(k for k, score in scores.items() if score <= best * (1 + tolerance))
+    selected = set(candidates[k])
+    return {
+        "selected_features": [name for name in features if name in selected],
+        "eliminated_features": [name for name in order if name not in selected],
+        "elimination_order": order,
+        "scores": {str(k): scores[k] for k in sorted(scores)},
+        "data_hash": digest,
+        "cached": cached,
+    }
+
+
+def manifest_path(model_path):
+    """
+    Returns the training manifest path of a joblib model (`model.joblib` -> `model.manifest.json`).
+    """
+    return os.path.splitext(model_path)[0] + ".manifest.json"
+
+
+def write_training_manifest(model_path, features, selection=None, **extra):
+    """
+    Writes the training manifest next to the model.
+
+    Args:
+    - model_path (str): Path of the joblib model.
+    - features (list[str]): Input columns of the model, in order.
+    - selection (dict or None): Report of `select_feature_subset`.
+    - **extra: Other training facts (e.g. the data hash).
+    """
+    manifest = {"model": os.path.basename(model_path), "features": list(features), **extra}
+    if selection is not None:
+        manifest["selected_features"] = selection["selected_features"]
+        manifest["feature_selection"] = selection
+    with open(manifest_path(model_path), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def read_training_manifest(model_path):
+    """
+    Returns the training manifest of a model, or None when it was trained without one.
+    """
+    path = manifest_path(model_path)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
@@ -0,0 +1,582 @@
+"""
+This module runs long batch-scoring and training jobs in the background, outside the interactive processes.
+
+A 3000-iteration `Model1.fit` or the scoring of a whole portfolio used to run in the calling process: in
+Streamlit the session froze until it returned, and a restart lost the work. Jobs are now rows of a SQLite
+database (`./jobs/jobs.sqlite`) executed by a pool of worker processes:
+
+- `Job_Queue.submit(kind, params)` inserts a "queued" row and returns at once;
+- a worker claims the oldest queued job with one `UPDATE ... RETURNING` statement (atomic across processes,
+  so several pools on one host never run a job twice), runs its handler and marks it "done" or "failed";
+- handlers report progress and write their results as numbered Parquet parts in `./jobs/outputs/<id>/`,
+  so the UI can show partial results of a running job (`read_output`);
+- workers update a heartbeat while a job runs. A job whose heartbeat is older than `stale_after` (its
+  worker was killed, the app restarted) goes back to "queued" and runs again, up to `max_attempts` times;
+- a cancelled job stops at its next progress report.
+
+Workers are separate processes with the "train" thread budget of `resources.py`, so a running job never
+holds the GIL or the cores of the serving processes.
+
+Job kinds:
+----------
+- "score": {"input": CSV or Parquet of raw records, "chunk_size": 10000, "intervals": false}
+  -> the input rows with "price" (and "p10"/"p50"/"p90") and "errors", one part per chunk.
+- "train": {"data": dataset path, "target_encoding": false, "select_features": false, "quantiles": false,
+  "activate": false}
+  -> trains `Model1` in `./jobs/outputs/<id>/model/` and publishes it as a new model registry version
+  (activated on request, so the serving processes hot-swap it); the test-set segment report is the
+  output. A cancelled training job deletes its model directory and publishes nothing.
+
+Key Components:
+---------------
+1. Job_Queue:
+   - `submit`, `get`, `list`, `cancel`, `claim`, `progress`, `complete`, `fail`, `requeue_stale`.
+
+2. Job_Context:
+   - Handed to the handler: `progress(fraction, message)`, `write_part(frame)`.
+
+3. Job_Pool:
+   - Worker processes polling the queue; `start()`, `stop()`. `start(exclusive=True)` only starts them
+     when no other exclusive pool runs on the queue directory (one pool per host for the Streamlit
+     processes, whatever their number of sessions).
+
+4. read_output(job_id):
+   - Concatenates the Parquet parts written so far.
+
+Usage:
+------
+queue = Job_Queue()
+job_id = queue.submit("score", {"input": "portfolio.csv"})
+Job_Pool(queue, workers=1).start()
+queue.get(job_id)["progress"]
+
+python -m Predict.jobs worker --workers 2
+python -m Predict.jobs submit score --input portfolio.csv
+python -m Predict.jobs list
+"""
+
+import argparse
+import fcntl
+import glob
+import json
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import traceback
+
+import numpy as np
+import pandas as pd
+
+JOB_DIR = "./jobs"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    params TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    progress REAL NOT NULL DEFAULT 0,
+    message TEXT,
+    result TEXT,
+    error TEXT,
+    worker TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    created REAL NOT NULL,
+    started REAL,
+    finished REAL,
+    heartbeat REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, id);
+"""
+
+
+class Job_Cancelled(Exception):
+    """
+    Raised inside a handler when its job was cancelled.
+    """
+
+
+class Job_Queue:
+    """
+    SQLite-backed job table shared by every process of the host.
+
+    Every call opens its own connection, so one queue object can be used from any thread, and the
+    database is in WAL mode so the UI reads progress while a worker writes it.
+    """
+
+    def __init__(self, directory=JOB_DIR, stale_after=60.0, max_attempts=3):
+        """
+        Args:
+        - directory (str): Directory of `jobs.sqlite` and of the job outputs.
+        - stale_after (float): Seconds without heartbeat after which a running job is re-queued.
+        - max_attempts (int): Runs of a job before it is marked failed instead of re-queued.
+        """
+        self.directory = directory
+        self.path = os.path.join(directory, "jobs.sqlite")
+        self.stale_after = stale_after
+        self.max_attempts = max_attempts
+        os.makedirs(directory, exist_ok=True)
+        db = self._connect()
+        try:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.executescript(SCHEMA)
+        finally:
+            db.close()
+
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=30.0)
+        db.row_factory = sqlite3.Row
+        return db
+
+    def _execute(self, query, args=()):
+        db = self._connect()
+        try:
+            with db:
+                return [dict(row) for row in db.execute(query, args).fetchall()]
+        finally:
+            db.close()
+
+    def output_dir(self, job_id):
+        return os.path.join(self.directory, "outputs", str(job_id))
+
+    def submit(self, kind, params=None):
+        """
+        Queues a job and returns its id.
+        """
+        if kind not in HANDLERS:
+            raise ValueError(f"Unknown job kind {kind!r}, expected one of {sorted(HANDLERS)}")
+        rows = self._execute(
+            "INSERT INTO jobs (kind, params, created) VALUES (?, ?, ?) RETURNING id",
+            (kind, json.dumps(params or {}), time.time()),
+        )
+        return rows[0]["id"]
+
+    def get(self, job_id):
+        """
+        Returns the job as a dict (params and result decoded), or None.
+        """
+        rows = self._execute("SELECT * FROM jobs WHERE id = ?", (job_id,))
+        return _decode(rows[0]) if rows else None
+
+    def list(self, limit=50, status=None):
+        """
+        Returns the most recent jobs, newest first.
+        """
+        if status is None:
+            rows = self._execute("SELECT * FROM jobs ORDER BY id DESC LIMIT ?", (limit,))
+        else:
+            rows = self._execute(
+                "SELECT * FROM jobs WHERE status = ? ORDER BY id DESC LIMIT ?", (status, limit)
+            )
+        return [_decode(row) for row in rows]
+
+    def cancel(self, job_id):
+        """
+        Cancels a queued job at once, or asks a running job to stop at its next progress report.
+        """
+        self._execute(
+            "UPDATE jobs SET status = 'cancelled', finished = ? WHERE id = ? AND status = 'queued'",
+            (time.time(), job_id),
+        )
+        self._execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = 'running'", (job_id,))
+
+    def claim(self, worker):
+        """
+        Marks the oldest queued job as running for `worker` and returns it, or None when the queue is empty.
+        """
+        now = time.time()
+        rows = self._execute(
+            """
+            UPDATE jobs SET status = 'running', worker = ?, attempts = attempts + 1,
+                started = ?, heartbeat = ?, progress = 0, message = NULL
+            WHERE id = (SELECT id FROM jobs WHERE status = 'queued' ORDER BY id LIMIT 1)
+            RETURNING *
+            """,
+            (worker, now, now),
+        )
+        return _decode(rows[0]) if rows else None
+
+    def progress(self, job_id, fraction=None, message=None):
+        """
+        Records progress and a heartbeat; returns True when the job was asked to stop.
+        """
+        rows = self._execute(
+            """
+            UPDATE jobs SET heartbeat = ?, progress = COALESCE(?, progress), message = COALESCE(?, message)
+            WHERE id = ? RETURNING cancel_requested
+            """,
+            (time.time(), fraction, message, job_id),
+        )
+        return bool(rows and rows[0]["cancel_requested"])
+
+    def complete(self, job_id, result=None):
+        self._execute(
+            "UPDATE jobs SET status = 'done', progress = 1, result = ?, finished = ? WHERE id = ?",
+            (json.dumps(result), time.time(), job_id),
+        )
+
+    def fail(self, job_id, error, status="failed"):
+        self._execute(
+            "UPDATE jobs SET status = ?, error = ?, finished = ? WHERE id = ?",
+            (status, error, time.time(), job_id),
+        )
+
+    def requeue_stale(self):
+        """
+        Re-queues running jobs whose worker stopped sending heartbeats (fails them after `max_attempts`).
+
+        Returns:
+        - int: Number of jobs re-queued or failed.
+        """
+        limit = time.time() - self.stale_after
+        failed = self._execute(
+            """
+            UPDATE jobs SET status = 'failed', error = 'Worker lost too many times', finished = ?
+            WHERE status = 'running' AND heartbeat < ? AND attempts >= ? RETURNING id
+            """,
+            (time.time(), limit, self.max_attempts),
+        )
+        requeued = self._execute(
+            "UPDATE jobs SET status = 'queued', worker = NULL WHERE status = 'running' AND heartbeat < ? "
+            "RETURNING id",
+            (limit,),
+        )
+        return len(failed) + len(requeued)
+
+
+def _decode(row):
+    row["params"] = json.loads(row["params"])
+    row["result"] = json.loads(row["result"]) if row["result"] else None
+    return row
+
+
+class Job_Context:
+    """
+    What a handler sees of its job.
+    """
+
+    def __init__(self, queue, job):
+        self.queue = queue
+        self.job = job
+        self.id = job["id"]
+        self.params = job["params"]
+        self.output_dir = queue.output_dir(self.id)
+        # A re-run starts from an empty output directory
+        for path in glob.glob(os.path.join(self.output_dir, "part-*.parquet")):
+            os.remove(path)
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.parts = 0
+        # Set by handlers that stop early on a cancellation instead of raising
+        self.cancelled = False
+
+    def progress(self, fraction=None, message=None):
+        """
+        Reports progress (0 - 1); raises `Job_Cancelled` when the job was cancelled.
+        """
+        if self.queue.progress(self.id, fraction, message):
+            raise Job_Cancelled()
+
+    def write_part(self, frame):
+        """
+        Writes the next Parquet part of the output, visible to `read_output` once complete.
+        """
+        path = os.path.join(self.output_dir, f"part-{self.parts:05d}.parquet")
+        # Written aside, then renamed: a reader never sees half a part
+        frame.to_parquet(path + ".tmp", index=False)
+        os.replace(path + ".tmp", path)
+        self.parts += 1
+        return path
+
+
+def read_output(job_id, directory=JOB_DIR):
+    """
+    Returns the output rows written so far by a job (an empty frame when none).
+    """
+    parts = sorted(glob.glob(os.path.join(directory, "outputs", str(job_id), "part-*.parquet")))
+    if not parts:
+        return pd.DataFrame()
+    return pd.concat([pd.read_parquet(path) for path in parts], ignore_index=True)
+
+
+def _read_records(path):
+    if path.endswith(".parquet"):
+        return pd.read_parquet(path)
+    return pd.read_csv(path)
+
+
+def score_job(context):
+    """
+    Scores a file of raw records chunk by chunk with the served model.
+    """
+    from Predict.registry import Model_Registry
+    from Predict.service import Prediction_Service
+
+    params = context.params
+    records = _read_records(params["input"])
+    chunk_size = int(params.get("chunk_size", 10_000))
+    intervals = bool(params.get("intervals", False))
+    service = Prediction_Service.load(Model_Registry())
+    scored = 0
+    for start in range(0, len(records), chunk_size):
+        chunk = records.iloc[start : start + chunk_size].reset_index(drop=True)
+        response = service.predict(chunk, intervals=intervals, source="job")
+        output = chunk.assign(price=response["prices"])
+        if intervals and "p10" in response:
+            output = output.assign(p10=response["p10"], p50=response["p50"], p90=response["p90"])
+        errors = {int(row): ", ".join(checks) for row, checks in response["errors"].items()}
+        output["errors"] = [errors.get(i) for i in range(len(chunk))]
+        context.write_part(output)
+        scored += len(chunk)
+        context.progress(scored / len(records), f"{scored:,}/{len(records):,} rows scored")
+    return {"rows": scored, "version": service.state.version, "output": context.output_dir}
+
+
+def train_job(context):
+    """
+    Trains `Model1`, writes its test-set segment report and publishes it to the model registry.
+
+    The model files are written to the job's own `model/` directory (never the working directory,
+    which concurrent jobs share) and deleted when the job is cancelled.
+    """
+    model_dir = os.path.join(context.output_dir, "model")
+    os.makedirs(model_dir, exist_ok=True)
+    try:
+        return _train(context, context.params, model_dir)
+    except Job_Cancelled:
+        shutil.rmtree(model_dir, ignore_errors=True)
+        raise
+
+
+def _train(context, params, model_dir):
+    from Predict.CatBoost_Model import Model1
+    from Predict.registry import Model_Registry
+    from Predict.segments import group_metrics
+
+    context.progress(0.0, "Preparing the training data")
+    model = Model1(params["data"], target_encoding=bool(params.get("target_encoding", False)))
+    if params.get("select_features"):
+        context.progress(0.0, "Selecting features")
+        model.select_features()
+    iterations = model.model.get_params()["iterations"]
+    # Training and export are 90% of the job, reported every 1% of the iterations
+    model.fit(callbacks=[_Training_Progress(context, iterations, 0.9)], directory=model_dir)
+    # The callback stops the fit early on a cancellation: the partial model is never published
+    if context.cancelled:
+        raise Job_Cancelled()
+    model_path = os.path.join(model_dir, "model_Hussain.joblib")
+    quantile_model_path = None
+    if params.get("quantiles"):
+        context.progress(0.9, "Training the quantile model")
+        model.fit_quantiles(directory=model_dir)
+        quantile_model_path = os.path.join(model_dir, "model_Hussain_quantiles.joblib")
+    context.progress(0.9, "Evaluating and publishing")
+    report = model.evaluate_segments(directory=context.output_dir, min_count=5)
+    context.write_part(report)
+    y_pred = np.expm1(model.model.predict(model.X_test))
+    metrics = {
+        name: float(values[0])
+        for name, values in group_metrics(model.y_test, y_pred, np.zeros(len(y_pred), dtype=np.int64)).items()
+    }
+    # A target-encoded model is exported with its encoded reference dataset and target encoder
+    data_path, target_index = model.link, None
+    if model.target_encoding:
+        data_path, target_index = model.save_target_encoding(model_dir)
+    version = Model_Registry().publish(
+        model_path,
+        data_path,
+        quantile_model_path,
+        metrics={"job": context.id, **metrics},
+        activate=bool(params.get("activate", False)),
+        target_index=target_index,
+    )
+    return {"version": version, "metrics": metrics, "output": context.output_dir}
+
+
+class _Training_Progress:
+    # CatBoost callback: progress reports during `fit`, stops the fit when the job is cancelled
+    def __init__(self, context, iterations, share):
+        self.context = context
+        self.iterations = iterations
+        self.share = share
+        self.every = max(iterations // 100, 1)
+
+    def after_iteration(self, info):
+        if info.iteration % self.every:
+            return True
+        try:
+            self.context.progress(
+                self.share * info.iteration / self.iterations,
+                f"Iteration {info.iteration:,}/{self.iterations:,}",
+            )
+        except Job_Cancelled:
+            self.context.cancelled = True
+            return False
+        return True
+
+
+HANDLERS = {"score": score_job, "train": train_job}
+
+
+def run_job(queue, job):
+    """
+    Runs one claimed job to completion, failure or cancellation.
+    """
+    context = Job_Context(queue, job)
+    # Heartbeats while the handler is busy between two progress reports
+    halt = threading.Event()
+
+    def beat():
+        while not halt.wait(queue.stale_after / 4):
+            queue.progress(job["id"])
+
+    heart = threading.Thread(target=beat, name=f"job-{job['id']}-heartbeat", daemon=True)
+    heart.start()
+    try:
+        result = HANDLERS[job["kind"]](context)
+        if context.cancelled:
+            raise Job_Cancelled()
+        queue.complete(job["id"], result)
+    except Job_Cancelled:
+        queue.fail(job["id"], "Cancelled", status="cancelled")
+    except Exception:
+        queue.fail(job["id"], traceback.format_exc())
+    finally:
+        halt.set()
+
+
+def _worker(directory, stale_after, max_attempts, poll_interval, stop):
+    from Predict.resources import configure
+
+    configure("train")
+    queue = Job_Queue(directory, stale_after, max_attempts)
+    name = f"{os.uname().nodename}:{os.getpid()}"
+    while not stop.is_set():
+        try:
+            queue.requeue_stale()
+            job = queue.claim(name)
+        except sqlite3.Error as error:
+            print(f"Job queue unavailable: {error}")
+            job = None
+        if job is None:
+            stop.wait(poll_interval)
+            continue
+        run_job(queue, job)
+
+
+class Job_Pool:
+    """
+    Worker processes executing the queued jobs.
+    """
+
+    def __init__(self, queue, workers=1, poll_interval=1.0):
+        """
+        Args:
+        - queue (Job_Queue): The queue to serve.
+        - workers (int): Worker processes (every job runs in one of them).
+        - poll_interval (float): Seconds between two looks at an empty queue.
+        """
+        self.queue = queue
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self._context = multiprocessing.get_context("spawn")
+        self._stop = self._context.Event()
+        self._starting = threading.Lock()
+        self._lock_file = None
+        self.processes = []
+
+    def start(self, exclusive=False):
+        """
+        Starts the worker processes (once).
+
+        Args:
+        - exclusive (bool): Only start them while holding `pool.lock` in the queue directory, for the life
+          of this process; without the lock (another process runs the pool) no worker is started and
+          `start` can be called again later to take over.
+        """
+        with self._starting:
+            if self.processes or (exclusive and not self._acquire()):
+                return self
+            self._spawn()
+        return self
+
+    def _acquire(self):
+        # flock is released by the kernel when the holding process dies, so a stale lock never blocks
+        lock_file = open(os.path.join(self.queue.directory, "pool.lock"), "w")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+    def _spawn(self):
+        # Jobs left running by a previous pool go back to the queue once their heartbeat is stale
+        self.queue.requeue_stale()
+        for _ in range(self.workers):
+            process = self._context.Process(
+                target=_worker,
+                args=(
+                    self.queue.directory,
+                    self.queue.stale_after,
+                    self.queue.max_attempts,
+                    self.poll_interval,
+                    self._stop,
+                ),
+                name="job-worker",
+                daemon=True,
+            )
+            process.start()
+            self.processes.append(process)
+
+    def stop(self, timeout=None):
+        """
+        Stops claiming new jobs and waits for the running ones.
+        """
+        self._stop.set()
+        for process in self.processes:
+            process.join(timeout)
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Background job queue")
+    commands = parser.add_subparsers(dest="command", required=True)
+    worker = commands.add_parser("worker", help="Run worker processes until interrupted")
+    worker.add_argument("--workers", type=int, default=1)
+    submit = commands.add_parser("submit", help="Queue a job")
+    submit.add_argument("kind", choices=sorted(HANDLERS))
+    submit.add_argument("--input", help="Records to score (CSV or Parquet)")
+    submit.add_argument("--data", default="./preprocessing/ED.csv", help="Training dataset")
+    submit.add_argument("--intervals", action="store_true")
+    commands.add_parser("list", help="Show the recent jobs")
+    cancel = commands.add_parser("cancel", help="Cancel a job")
+    cancel.add_argument("job_id", type=int)
+    args = parser.parse_args()
+
+    queue = Job_Queue()
+    if args.command == "worker":
+        pool = Job_Pool(queue, args.workers).start()
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pool.stop()
+    elif args.command == "submit":
+        params = (
+            {"input": args.input, "intervals": args.intervals}
+            if args.kind == "score"
+            else {"data": args.data}
+        )
+        print(f"Queued job {queue.submit(args.kind, params)}")
+    elif args.command == "list":
+        for job in queue.list():
+            print(f"{job['id']:>5} {job['kind']:<6} {job['status']:<9} {job['progress']:>6.1%} {job['message'] or ''}")
+    else:
+        queue.cancel(args.job_id)
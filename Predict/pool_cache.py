@@ -0,0 +1,206 @@
+"""
+This module caches the quantized CatBoost training pool on disk so experiments on the same data start at once.
+
+Every `Model1` construction re-read `ED.csv`, re-scaled it in `Data_Prep.Normalize_Data`, re-split it,
+and every `fit` let CatBoost quantize the features again (compute the borders, bin every value). With
+many experiments on one dataset that work is identical each time.
+
+`load_training_pools` does it once: the training split is turned into a `Pool` with the log-price label,
+quantized with the given border settings and saved in CatBoost's binary quantized format, next to the
+scaled split arrays (kept for evaluation and feature selection). The cache entry is keyed by the content
+hash of the CSV, the split and border settings and the CatBoost version, so a changed dataset or border
+setting builds a new entry and a stale one is never read. Training, `catboost.cv` and `grid_search`
+then all start from the already quantized pool.
+
+Key Components:
+---------------
+1. BORDERS:
+   - Default quantization settings (border count, border type, NaN mode).
+
+2. Training_Pools:
+   - The quantized training pool, the scaled split arrays and the feature names.
+
+3. load_training_pools(link, prepare, ...):
+   - Loads the cache entry of the dataset, or builds and saves it.
+
+4. benchmark_startup(link, prepare, repeats):
+   - Per-experiment startup (data preparation to first tree) without and with the cache.
+
+Usage:
+------
+pools = load_training_pools("./preprocessing/ED.csv", prepare)
+CatBoostRegressor(...).fit(pools.train)
+
+Run `python -m Predict.pool_cache` from the repository root to print the startup benchmark.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import catboost
+import numpy as np
+from catboost import CatBoostRegressor, Pool
+
+POOL_DIR = "./model/pools"
+
+# Quantization settings; part of the cache key
+BORDERS = {"border_count": 254, "feature_border_type": "GreedyLogSum", "nan_mode": "Min"}
+
+# Split settings of `Data_Prep.Spliter`; part of the cache key
+SPLIT = {"test_size": 0.2, "random_state": 42}
+
+
+def file_hash(path, chunk_size=1 << 20):
+    """
+    Returns the SHA-1 of a file's content (of the manifest for a feature store directory).
+    """
+    if os.path.isdir(path):
+        path = os.path.join(path, "manifest.json")
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cache_key(link, borders=BORDERS, split=SPLIT):
+    """
+    Returns the cache key of a dataset: content hash, border and split settings, CatBoost version.
+    """
+    settings = json.dumps(
+        {"data": file_hash(link), "borders": borders, "split": split, "catboost": catboost.__version__},
+        sort_keys=True,
+    )
+    return hashlib.sha1(settings.encode()).hexdigest()[:16]
+
+
+class Training_Pools:
+    """
+    A cached training set.
+
+    Attributes:
+    - train (Pool): Quantized training pool, label `log1p(Price)`.
+    - features (list[str]): Feature names, in column order.
+    - X_train, X_test (ndarray): Scaled split features.
+    - y_train, y_test (ndarray): Prices (original scale).
+    - key (str): Cache key of the entry.
+    """
+
+    def __init__(self, train, features, X_train, X_test, y_train, y_test, key):
+        self.train = train
+        self.features = list(features)
+        self.X_train = X_train
+        self.X_test = X_test
+        self.y_train = y_train
+        self.y_test = y_test
+        self.key = key
+
+    @classmethod
+    def build(cls, features, X_train, X_test, y_train, y_test, borders=BORDERS, key=None):
+        """
+        Quantizes the training split.
+        """
+        y_train, y_test = np.asarray(y_train, dtype=np.float64), np.asarray(y_test, dtype=np.float64)
+        train = Pool(X_train, np.log1p(y_train), feature_names=list(features))
+        train.quantize(**borders)
+        return cls(train, features, np.asarray(X_train), np.asarray(X_test), y_train, y_test, key)
+
+    def save(self, directory):
+        """
+        Writes the entry to `directory` (quantized pool, split arrays, feature names).
+        """
+        self.train.save(os.path.join(directory, "train.quantized"))
+        np.savez(
+            os.path.join(directory, "split.npz"),
+            X_train=self.X_train,
+            X_test=self.X_test,
+            y_train=self.y_train,
+            y_test=self.y_test,
+        )
+        with open(os.path.join(directory, "meta.json"), "w") as f:
+            json.dump({"features": self.features, "key": self.key}, f)
+
+    @classmethod
+    def load(cls, directory):
+        """
+        Reads an entry written by `save()`.
+        """
+        with open(os.path.join(directory, "meta.json")) as f:
+            meta = json.load(f)
+        train = Pool("quantized://" + os.path.join(directory, "train.quantized"))
+        with np.load(os.path.join(directory, "split.npz")) as split:
+            arrays = [split[name] for name in ("X_train", "X_test", "y_train", "y_test")]
+        return cls(train, meta["features"], *arrays, meta["key"])
+
+
+def load_training_pools(link, prepare, borders=BORDERS, split=SPLIT, cache_dir=POOL_DIR):
+    """
+    Returns the quantized training pool of a dataset, from the cache when present.
+
+    Args:
+    - link (str): Path of the dataset (`ED.csv`).
+    - prepare (callable): `prepare(link)` -> (features, X_train, X_test, y_train, y_test), only called
+      on a cache miss.
+    - borders (dict): Quantization settings passed to `Pool.quantize`.
+    - split (dict): Split settings used by `prepare`, recorded in the key.
+    - cache_dir (str or None): Cache directory; None disables the cache.
+
+    Returns:
+    - Training_Pools: The pools.
+    """
+    key = cache_key(link, borders, split)
+    directory = os.path.join(cache_dir, key) if cache_dir else None
+    if directory and os.path.exists(os.path.join(directory, "meta.json")):
+        return Training_Pools.load(directory)
+
+    pools = Training_Pools.build(*prepare(link), borders=borders, key=key)
+    if directory:
+        # Written aside, then renamed: a concurrent experiment never reads half an entry
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp = tempfile.mkdtemp(dir=cache_dir, prefix=".build.")
+        try:
+            pools.save(tmp)
+            os.rename(tmp, directory)
+        except OSError:
+            # Another experiment saved the same entry first
+            shutil.rmtree(tmp, ignore_errors=True)
+    return pools
+
+
+def benchmark_startup(link, prepare, repeats=5, cache_dir=POOL_DIR):
+    """
+    Times the startup of one experiment: data preparation up to the first tree.
+
+    "before" prepares the split from the CSV and fits on the raw arrays (CatBoost quantizes them);
+    "after" loads the cache entry and fits on the quantized pool.
+
+    Returns:
+    - dict: Median seconds of "before" and "after", and the speedup.
+    """
+    load_training_pools(link, prepare, cache_dir=cache_dir)
+    params = {"iterations": 1, "depth": 5, "thread_count": 1, "logging_level": "Silent", **BORDERS}
+    before, after = [], []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        features, X_train, X_test, y_train, y_test = prepare(link)
+        CatBoostRegressor(**params).fit(X_train, np.log1p(y_train))
+        before.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        pools = load_training_pools(link, prepare, cache_dir=cache_dir)
+        CatBoostRegressor(**params).fit(pools.train)
+        after.append(time.perf_counter() - start)
+    before, after = float(np.median(before)), float(np.median(after))
+    return {"before_s": before, "after_s": after, "speedup": before / after}
+
+
+if __name__ == "__main__":
+    from Predict.CatBoost_Model import prepare_split
+
+    link = "./preprocessing/ED.csv"
+    for name, value in benchmark_startup(link, prepare_split).items():
+        print(f"{name}: {value:.4f}")
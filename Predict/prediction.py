@@ -3,23 +3,29 @@ This script is a Streamlit application for predicting property prices using a pr
 
 Features:
 - Accepts user input for various property attributes.
-- Normalizes the input data based on reference data.
-- Uses a pre-trained model to predict property prices.
+- Predicts through the shared `Prediction_Service` (`service.py`), the same path as the HTTP API:
+  schema validation, derived features, the active model of the registry, drift monitor and prediction log.
 - Displays the predicted price in the Streamlit app.
+- Splits the page into a submit-once form and fragments that rerun independently (locality
+  typeahead, result panel, what-if chart), so editing an input does not re-execute the rest of the page.
+- Shows a market map of the precomputed price aggregates (`price_map.npz`).
+- Queues portfolio scoring and retraining as background jobs (`jobs.py`), polls their progress and shows
+  the results of finished jobs, so the session never waits on them. One job pool runs per host, however
+  many Streamlit processes and sessions there are.
 
 Modules:
 - pandas: For data manipulation.
 - numpy: For numerical operations.
-- joblib: For loading the pre-trained model.
-- pathlib: For handling file paths.
-- cleaning_data: For preprocessing and normalization.
+- service: For validating the inputs and predicting (`Prediction_Service`).
 
 Classes:
 - Prediction: Handles property price prediction workflow.
 
 Functions:
-- preprocess: Initializes preprocessing by cleaning and encoding data.
-- normalize_data: Normalizes the input data to match the reference data.
+- load_service: Loads the prediction service once per process.
+- input_panel: Collects the inputs and predicts through the service.
+- result_panel / what_if_panel: Price, range, explanation, comparables and what-if chart of the submission.
+- market_map / jobs_panel: Market map and background jobs.
 
 How to Use:
 1. Run this script using `streamlit run <script_name>.py`.
@@ -28,12 +34,12 @@ How to Use:
 """
 
 import streamlit as st
+import pydeck as pdk
 import pandas as pd
 import numpy as np
-from joblib import load
-from sklearn.preprocessing import MinMaxScaler
 import sys
 import os
+import time
 
 
 sys.path.append("/workspaces/Immo_app/preprocessing")
@@ -43,50 +49,152 @@ preprocessing_path = os.path.join(
     "preprocessing",  # Preprocessing folder name
 )
 
-from preprocessing.cleaning_data import Cleaning
+from Predict.drift import Drift_Monitor
+from Predict.jobs import JOB_DIR, Job_Pool, Job_Queue, read_output
+from Predict.prediction_log import Prediction_Logger
+from Predict.registry import Model_Registry, Registry_Watcher
+from Predict.resources import configure
+from Predict.service import Prediction_Service
+from preprocessing.schema import INPUT_FEATURES
+from preprocessing.features import DERIVED_FEATURES
+from preprocessing.target_encoding import TARGET_COLUMNS
+from preprocessing.comparables import Comparables_Index
+from preprocessing.price_map import Price_Map
 
 
-class Prediction:
+@st.cache_resource
+def load_service():
     """
-    Initializes the Prediction class.
+    Loads the prediction service once per process and starts watching the model registry.
+
+    Serves the active registry version, then the arrays exported by `python -m Predict.shared_model export`
+    (memory-mapped, so all workers on the host share them), and falls back to the joblib model. Every
+    rerun reads `service.state` once, so a version activated in the registry is picked up by the next
+    interaction without restarting the app.
+
+    Predictions are recorded in the prediction log under `./logs`, and their inputs feed the drift
+    monitor (alerts in `./logs/drift_alerts.jsonl`). BLAS and CatBoost threads follow the "serve" budget of
+    `resources.py`, so several app processes on one host do not oversubscribe it.
+
+    Returns:
+        Prediction_Service: The service shared by all sessions.
     """
+    configure("serve")
+    registry = Model_Registry()
+    service = Prediction_Service.load(registry)
+    service.logger = Prediction_Logger()
+    # Always attached: a version exported without training histograms has nothing to compare, the next
+    # swap may bring some
+    service.drift = Drift_Monitor.from_state(service.state)
+    Registry_Watcher(registry, service).start()
+    return service
 
-    def __init__(self):
-        pass
 
-    def predict(self, reverse_mappings, reference_data, mappings):
-        """
-        Collects user input for property features, preprocesses the data, and predicts the property price.
+@st.cache_resource
+def load_job_pool(workers=1):
+    """
+    Opens the background job queue once per process, shared by all its sessions.
 
-        Args:
-            reverse_mappings (dict): A dictionary mapping encoded categorical values back to their original form.
-            reference_data (pd.DataFrame): A reference DataFrame used for normalizing input data.
-            mappings (dict): A dictionary mapping categorical features to their encoded values.
+    Jobs live in `./jobs/jobs.sqlite`: queued or interrupted jobs are picked up again after a restart.
+    The worker processes only start in the Streamlit process holding the pool lock (`Job_Pool.start`);
+    the others submit to the same queue, and take the pool over if that process exits. A separate
+    `python -m Predict.jobs worker` may serve the queue as well. The pool is cached, not only the
+    queue: its stop event must outlive the worker processes.
+    """
+    return Job_Pool(Job_Queue(), workers).start(exclusive=True)
 
-        Returns:
-            None: Displays the predicted price directly in the Streamlit app.
-        """
 
-        # Manual input for single prediction
-        st.title("House Price Prediction App")
-        st.write(
-            """
-        This application predicts house prices using a pre-trained CatBoost model. 
-        Enter the required features to get a prediction.
-        """
-        )
+@st.cache_resource
+def load_comparables(path="./preprocessing/comparables_index.joblib"):
+    """
+    Loads the spatial comparables index once per process, or returns None when it was not built.
+    """
+    if not os.path.exists(path):
+        return None
+    return Comparables_Index.load(path)
 
-        st.subheader("Enter Features for Prediction")
-        manual_input = {}
-        model = load("./model/model_Hussain.joblib")
 
-        c = Cleaning()
+@st.cache_resource
+def load_price_map(path="./preprocessing/price_map.npz"):
+    """
+    Loads the precomputed market map aggregates once per process, or returns None when not built.
+    """
+    if not os.path.exists(path):
+        return None
+    return Price_Map.load(path)
+
+
+@st.cache_resource
+def map_layer(level, metric):
+    """
+    Builds the colored map points of one zoom level and price metric once per process.
+    """
+    price_map = load_price_map()
+    cells = price_map.cells(level).dropna(subset=[metric])
+    # Blue (cheap) to red (expensive) on the log scale, clipped to the 5th - 95th percentiles
+    log_price = np.log(cells[metric].to_numpy())
+    low, high = np.percentile(log_price, [5, 95])
+    t = np.clip((log_price - low) / max(high - low, 1e-9), 0, 1)
+    cells["color"] = [[int(255 * v), 60, int(255 * (1 - v)), 160] for v in t]
+    cells["label"] = [f"€{int(p):,} ({n} listings)" for p, n in zip(cells[metric], cells["count"])]
+    return cells
+
+
+# Values scanned by the what-if chart for each input it can vary
+WHAT_IF_GRIDS = {
+    "Living_Area": np.arange(20, 401, 10),
+    "Bedrooms": np.arange(0, 9),
+    "Facades": np.arange(1, 5),
+}
+
+
+@st.cache_resource
+def load_input_options(_mappings):
+    """
+    Sorts the labels of every categorical input once per process (about 800 localities).
+    """
+    return {column: sorted(labels.values()) for column, labels in _mappings.items()}
+
+
+@st.fragment
+def locality_picker(reverse_mappings, mappings):
+    """
+    Locality typeahead: searching reruns only this fragment.
+
+    Matches come from the locality search index (accents folded, Dutch/French names, typos); without a
+    query the full sorted list is offered. The chosen code is kept in `st.session_state["locality"]`.
+    """
+    query = st.text_input("Search the locality (e.g. Selange, Anvers, Bruxelles):")
+    names = load_input_options(mappings)["Locality_encoded"]
+    if query:
+        names = [match["locality"] for match in load_service().search_localities(query, k=20)]
+        if not names:
+            st.warning(f"No locality matches '{query}'.")
+            st.session_state["locality"] = None
+            return
+    name = st.selectbox("Select Locality of the property:", names)
+    st.session_state["locality"] = reverse_mappings["Locality_encoded"][name]
+
+
+@st.fragment
+def input_panel(reverse_mappings, columns, mappings):
+    """
+    Input form: editing a field reruns nothing, submitting reruns only this fragment.
+
+    On a valid submission the prediction is stored in `st.session_state["prediction"]` together with
+    the model state that produced it, and the page is refreshed once so the result panel and the
+    what-if chart pick it up.
+    """
+    options = load_input_options(mappings)
+    manual_input = {}
+    with st.form("features"):
         # Handle input for features
-        for column in reference_data.columns:
-            if column in mappings:  # Categorical column
-                options = sorted(list(mappings[column].values()))
+        for column in columns:
+            if column == "Locality_encoded":  # Chosen with the typeahead above the form
+                continue
+            elif column in mappings:  # Categorical column
                 user_input = st.selectbox(
-                    f"Select {column.split('_encoded')[0]} of the property:", options
+                    f"Select {column.split('_encoded')[0]} of the property:", options[column]
                 )
                 manual_input[column] = reverse_mappings[column][user_input]
             elif column == "Bedrooms":  # Integer input for Bedrooms
@@ -114,41 +222,230 @@ class Prediction:
             elif column == "Garden":  # Boolean input
                 manual_input[column] = st.checkbox("Does it have a garden?")
 
-            elif column in [
-                "GDP",
-                "Type_encoded",
-                "Avg_rent",
-                "Avg price",
-                "Bedrooms_per_area",
-                "Is_On_Coast",
-                "Prov_encoded",
-                "Region_encoded",
-            ]:
-                manual_input[column] = 0
+            elif column in DERIVED_FEATURES or column in TARGET_COLUMNS:  # Derived from the inputs below
                 continue
 
             else:  # Numerical columns
                 manual_input[column] = st.number_input(f"Enter {column}:", value=0.0)
 
-        # Calculate Bedrooms per Area (Living_Area / Bedrooms), ensuring Bedrooms is greater than zero
-        if manual_input["Bedrooms"] > 0:
-            manual_input["Bedrooms_per_area"] = (
-                manual_input["Living_Area"] / manual_input["Bedrooms"]
+        submitted = st.form_submit_button("Predict")
+
+    if not submitted:
+        return
+    manual_input["Locality_encoded"] = st.session_state.get("locality")
+    if manual_input["Locality_encoded"] is None:
+        st.error("Select a locality first.")
+        return
+    # One snapshot per submission: a model swap never mixes two versions within one prediction
+    service = load_service()
+    state = service.state
+    records = [{column: manual_input[column] for column in INPUT_FEATURES}]
+    response = service.predict(records, source="streamlit", state=state)
+    if response["errors"]:
+        st.error(f"Invalid input: {', '.join(response['errors'][0])}")
+        return
+    # Model-ready row of the submission, for the range, the explanation and the what-if chart
+    X, _ = service.prepare(records, state)
+    st.session_state["prediction"] = {
+        "inputs": manual_input,
+        "raw": X[0],
+        "price": response["prices"][0],
+        "state": state,
+    }
+    st.rerun()
+
+
+@st.fragment
+def result_panel():
+    """
+    Price, optional P10 - P90 range, explanation and comparables of the last submission.
+
+    Toggling the range reruns only this fragment.
+    """
+    prediction = st.session_state.get("prediction")
+    if prediction is None:
+        return
+    state, raw, manual_input = prediction["state"], prediction["raw"], prediction["inputs"]
+
+    # Display the prediction
+    st.write(f"Predicted Price: €{int(prediction['price']):,}")
+    if state.interval_predictor is not None and st.checkbox(
+        "Show the likely price range (P10 - P90)"
+    ):
+        p10, p50, p90 = state.interval_predictor.predict_batch(raw[None, :].copy())[0]
+        st.write(f"Likely range: €{int(p10):,} - €{int(p90):,} (median €{int(p50):,})")
+
+    # Per-feature contributions, as multiplicative effects on the price
+    with st.expander("Why this price?"):
+        explainer = state.explainer
+        contributions, _ = explainer.explain(raw)
+        effect = (np.expm1(contributions.iloc[0]) * 100).round(1)
+        effect = effect[effect.abs().sort_values(ascending=False).index]
+        st.bar_chart(effect.rename("Effect on price (%)"))
+        st.caption(
+            "Typical absolute contribution over the training data: "
+            + ", ".join(
+                f"{name} {value:.3f}"
+                for name, value in explainer.background.nlargest(5).items()
             )
-        else:
-            manual_input["Bedrooms_per_area"] = 0
-
-        # Prediction button for manual input
-        if st.button("Predict"):
-            # Create a DataFrame from manual input
-            manual_data = pd.DataFrame([manual_input])
-            # Normalize the input data (excluding 'Price' and 'Id' columns)
-            normalized_manual_data = c.normalize_data(manual_data, reference_data)
-            # Predict using the model
-            prediction = np.expm1(model.predict(normalized_manual_data)[0])
-
-            # Display the prediction
-            st.write(f"Predicted Price: €{int(prediction):,}")
+        )
+
+    # Comparable sales around the locality centroid, same subtype
+    comparables = load_comparables()
+    if comparables is not None:
+        rows, distances = comparables.query_locality(
+            [manual_input["Locality_encoded"]], [manual_input["SubType_encoded"]], k=5
+        )
+        st.subheader("Comparable sales nearby")
+        st.dataframe(comparables.comparables(rows[0], distances[0]))
+
+
+@st.fragment
+def what_if_panel():
+    """
+    Price of the submitted property while one input varies; changing the input reruns only this fragment.
+
+    The curve comes from the distilled surrogate when the export has one (a preview, `surrogate.py`);
+    the quoted price above it always comes from the full model.
+    """
+    prediction = st.session_state.get("prediction")
+    if prediction is None:
+        return
+    state, raw = prediction["state"], prediction["raw"]
+    predictor = state.predictor
+
+    st.subheader("What if?")
+    feature = st.selectbox("Vary", list(WHAT_IF_GRIDS))
+    grid = WHAT_IF_GRIDS[feature]
+    # One batch: the submitted row repeated over the grid, derived features recomputed per row
+    X = np.repeat(raw[None, :], len(grid), axis=0)
+    X[:, predictor.features.index(feature)] = grid
+    state.deriver.derive_matrix(X, predictor.features)
+    prices = (state.surrogate or predictor).predict_batch(X)
+    st.line_chart(pd.DataFrame({"Predicted price (€)": prices}, index=pd.Index(grid, name=feature)))
+
+
+@st.fragment(run_every=2)
+def jobs_panel():
+    """
+    Batch scoring and retraining in the background; the fragment polls the queue every 2 seconds.
+    """
+    pool = load_job_pool()
+    # No-op while this process runs the pool; takes it over once the process holding it exited
+    pool.start(exclusive=True)
+    queue = pool.queue
+    with st.expander("Background jobs"):
+        upload = st.file_uploader("Score a portfolio (CSV or Parquet of raw inputs)", type=["csv", "parquet"])
+        left, right = st.columns(2)
+        if upload is not None and left.button("Queue scoring"):
+            inputs = os.path.join(JOB_DIR, "inputs")
+            os.makedirs(inputs, exist_ok=True)
+            path = os.path.join(inputs, f"{time.time():.0f}_{os.path.basename(upload.name)}")
+            with open(path, "wb") as f:
+                f.write(upload.getbuffer())
+            queue.submit("score", {"input": path, "intervals": True})
+        activate = right.checkbox("Serve the retrained model")
+        if right.button("Retrain the model"):
+            queue.submit("train", {"data": "./preprocessing/ED.csv", "activate": activate})
+
+        jobs = queue.list(limit=10)
+        if not jobs:
+            return
+        for job in jobs:
+            label = f"#{job['id']} {job['kind']}: {job['status']}"
+            if job["message"]:
+                label += f" ({job['message']})"
+            if job["status"] == "running":
+                st.progress(job["progress"], text=label)
+                if st.button("Cancel", key=f"cancel-{job['id']}"):
+                    queue.cancel(job["id"])
+            else:
+                st.write(label)
+        finished = [job["id"] for job in jobs if job["status"] in ("done", "failed", "cancelled")]
+        if finished:
+            job_id = st.selectbox("Results of job", finished)
+            output = read_output(job_id)
+            st.caption(f"{len(output):,} rows in {queue.output_dir(job_id)}")
+            st.dataframe(output.head(100))
+
+
+@st.fragment
+def market_map():
+    """
+    Market map drawn from the precomputed aggregates; changing the view reruns only this fragment.
+    """
+    price_map = load_price_map()
+    if price_map is None:
+        return
+    st.subheader("Market map")
+    level = st.select_slider(
+        "Detail",
+        options=list(range(price_map.levels)),
+        format_func=lambda z: f"{price_map.cell_km[z]:g} km cells",
+    )
+    metrics = {"median_price": "Observed median price"}
+    if not np.isnan(price_map.arrays["z0_predicted_price"]).all():
+        metrics["predicted_price"] = "Mean predicted price"
+    metric = st.radio("Price", list(metrics), format_func=metrics.get, horizontal=True)
+    cells = map_layer(level, metric)
+    layer = pdk.Layer(
+        "ScatterplotLayer",
+        data=cells,
+        get_position=["lon", "lat"],
+        get_fill_color="color",
+        get_radius=price_map.cell_km[level] * 500,
+        pickable=True,
+    )
+    st.pydeck_chart(
+        pdk.Deck(
+            layers=[layer],
+            initial_view_state=pdk.ViewState(latitude=50.6, longitude=4.6, zoom=7),
+            tooltip={"text": "{label}"},
+        )
+    )
+
+
+class Prediction:
+    """
+    Initializes the Prediction class.
+    """
+
+    def __init__(self):
+        pass
+
+    def predict(self, reverse_mappings, reference_data, mappings):
+        """
+        Collects user input for property features, preprocesses the data, and predicts the property price.
+
+        The page is made of fragments (locality typeahead, input form, result panel, what-if chart,
+        market map, background jobs) that rerun independently, so interacting with one of them does not re-execute
+        the others.
+
+        Args:
+            reverse_mappings (dict): A dictionary mapping encoded categorical values back to their original form.
+            reference_data (pd.DataFrame): A reference DataFrame whose columns define the input form.
+            mappings (dict): A dictionary mapping categorical features to their encoded values.
+
+        Returns:
+            None: Displays the predicted price directly in the Streamlit app.
+        """
+
+        # Manual input for single prediction
+        st.title("House Price Prediction App")
+        st.write(
+            """
+        This application predicts house prices using a pre-trained CatBoost model. 
+        Enter the required features to get a prediction.
+        """
+        )
+
+        st.subheader("Enter Features for Prediction")
+        locality_picker(reverse_mappings, mappings)
+        input_panel(reverse_mappings, list(reference_data.columns), mappings)
+        result_panel()
+        what_if_panel()
+        market_map()
+        jobs_panel()
 
 
 # reverse_mappings,reference_data,mappings=preprocess()
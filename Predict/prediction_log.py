@@ -0,0 +1,244 @@
+"""
+This module records every served prediction to rotating JSONL files without slowing down the request.
+
+`Prediction_Logger.log()` only appends the request's objects to an in-memory deque. A background thread
+wakes up every `flush_interval` seconds, serializes everything pending and writes it with a single
+`write()` call, rotating `predictions-<pid>.jsonl` to `predictions-<pid>.1.jsonl`,
+`predictions-<pid>.2.jsonl`, ... once it exceeds `max_bytes`. When the writer falls behind by more than
+`max_buffer` entries, new entries are dropped and counted instead of growing memory or blocking the caller.
+
+Every process writes and rotates its own files (the process id is in their name): the forked workers of
+`Predict.api --workers N` and the Streamlit processes never append to, or rename, a file another one writes.
+Restarted processes get new ids, so retention is global: when a logger starts and after every rotation,
+the oldest files of any process are deleted until all of them fit in `max_total_bytes`.
+
+Each line holds one request:
+{"ts": 1729350000.123, "source": "api", "version": "v0002", "intervals": false,
+ "records": [{...}, ...], "prices": [...], "latency_ms": 1.9, "score_ms": 0.2}
+
+The files are the input of the replay load tester (`Predict/replay.py`), which merges the processes' files
+by timestamp.
+
+Key Components:
+---------------
+1. Prediction_Logger:
+   - `log(records, response, ...)`: Non-blocking hand-off of one served request.
+   - `flush()`: Writes everything pending (also called by the background thread and at exit).
+   - `files()`: Log files of every process, each from the oldest rotation to the current one
+     (`log_files()` without a logger).
+
+Usage:
+------
+service.logger = Prediction_Logger("./logs")
+"""
+
+import atexit
+import json
+import os
+import re
+import threading
+import time
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+LOG_DIR = "./logs"
+
+
+def _json_default(value):
+    # NumPy scalars and arrays coming from the request path
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def log_files(directory=LOG_DIR, name="predictions", backup_count=None):
+    """
+    Returns the existing log files of `name` in `directory`: per writing process, oldest first.
+
+    Files of logs written before the process id was part of the name (`name.jsonl`) are included;
+    rotations beyond `backup_count` are ignored (None: every rotation).
+    """
+    pattern = re.compile(rf"^{re.escape(name)}(-\d+)?(?:\.(\d+))?\.jsonl$")
+    streams = {}
+    for file_name in os.listdir(directory) if os.path.isdir(directory) else []:
+        match = pattern.match(file_name)
+        if match and (backup_count is None or int(match.group(2) or 0) <= backup_count):
+            streams.setdefault(match.group(1) or "", []).append((int(match.group(2) or 0), file_name))
+    # Highest rotation first, the current file (0) last
+    return [
+        os.path.join(directory, file_name)
+        for stream in sorted(streams)
+        for _, file_name in sorted(streams[stream], reverse=True)
+    ]
+
+
+class Prediction_Logger:
+    """
+    Buffered, append-only JSONL log of served predictions.
+    """
+
+    def __init__(
+        self,
+        directory=LOG_DIR,
+        name="predictions",
+        max_bytes=50 * 1024 * 1024,
+        backup_count=10,
+        max_total_bytes=None,
+        flush_interval=1.0,
+        max_buffer=100_000,
+    ):
+        """
+        Args:
+        - directory (str): Directory of the log files (created when missing).
+        - name (str): Base name of the files, followed by the process id.
+        - max_bytes (int): Size beyond which the current file is rotated.
+        - backup_count (int): Number of rotated files kept per process.
+        - max_total_bytes (int or None): Size of all the files of `name` (every process) beyond which the
+          oldest are deleted; `max_bytes * (backup_count + 1)` by default, the footprint of one process.
+        - flush_interval (float): Seconds between two background flushes.
+        - max_buffer (int): Pending entries beyond which new ones are dropped.
+        """
+        self.directory = directory
+        self.name = name
+        self.pid = os.getpid()
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.max_total_bytes = max_total_bytes or max_bytes * (backup_count + 1)
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.written = 0
+        self.dropped = 0
+        self._pending = deque()
+        self._flush_lock = threading.Lock()
+        self._halt = threading.Event()
+        os.makedirs(directory, exist_ok=True)
+        # Files left by processes that exited (restarts, respawned API workers)
+        self._prune()
+        self._thread = threading.Thread(target=self._run, name="prediction-log", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    @property
+    def path(self):
+        return os.path.join(self.directory, f"{self.name}-{self.pid}.jsonl")
+
+    def files(self):
+        """
+        Returns the existing log files of every process, each oldest first.
+        """
+        return log_files(self.directory, self.name, self.backup_count)
+
+    def log(
+        self,
+        records,
+        response,
+        version=None,
+        intervals=False,
+        latency_ms=None,
+        score_ms=None,
+        source=None,
+    ):
+        """
+        Queues one served request; serialization happens on the background thread.
+
+        Args:
+        - records (list[dict] or pd.DataFrame): Raw inputs as received.
+        - response (dict): Service response, its "prices" (and "p10"/"p50"/"p90") are logged.
+        - version (str or None): Model version that served the request.
+        - intervals (bool): Whether P10/P50/P90 were requested.
+        - latency_ms (float or None): End-to-end service time.
+        - score_ms (float or None): Time spent in the tree predictor.
+        - source (str or None): Caller ("api", "streamlit", ...).
+        """
+        if len(self._pending) >= self.max_buffer:
+            self.dropped += 1
+            return
+        self._pending.append(
+            (time.time(), source, version, intervals, records, response, latency_ms, score_ms)
+        )
+
+    def _serialize(self, entry):
+        ts, source, version, intervals, records, response, latency_ms, score_ms = entry
+        if isinstance(records, pd.DataFrame):
+            records = records.to_dict("records")
+        line = {
+            "ts": ts,
+            "source": source,
+            "version": version,
+            "intervals": intervals,
+            "records": records,
+            **{key: response[key] for key in ("prices", "p10", "p50", "p90") if key in response},
+            "latency_ms": latency_ms,
+            "score_ms": score_ms,
+        }
+        return json.dumps(line, default=_json_default)
+
+    def _rotate(self):
+        # Same scheme as logging.handlers.RotatingFileHandler: .1 is the most recent backup
+        stem = os.path.join(self.directory, f"{self.name}-{self.pid}")
+        for i in range(self.backup_count - 1, 0, -1):
+            if os.path.exists(f"{stem}.{i}.jsonl"):
+                os.replace(f"{stem}.{i}.jsonl", f"{stem}.{i + 1}.jsonl")
+        os.replace(self.path, f"{stem}.1.jsonl")
+
+    def _prune(self):
+        # One budget for the files of every process, past and present: the oldest go first. Other
+        # processes prune too, so a file may vanish between listing and removal
+        files = []
+        for path in log_files(self.directory, self.name):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_total_bytes:
+                break
+            # The file this process is writing is its newest entry, never the oldest to drop
+            if path == self.path:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def flush(self):
+        """
+        Writes every pending entry in one append.
+        """
+        with self._flush_lock:
+            lines = []
+            while True:
+                try:
+                    lines.append(self._serialize(self._pending.popleft()))
+                except IndexError:
+                    break
+            if not lines:
+                return
+            with open(self.path, "a") as f:
+                f.write("\n".join(lines) + "\n")
+            self.written += len(lines)
+            if os.path.getsize(self.path) > self.max_bytes:
+                self._rotate()
+                self._prune()
+
+    def _run(self):
+        while not self._halt.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as error:
+                # Never let logging take the server down: this batch is lost, later ones are still written
+                print(f"Prediction log flush failed: {error}")
+
+    def close(self):
+        """
+        Stops the background thread and writes what is left.
+        """
+        self._halt.set()
+        self.flush()
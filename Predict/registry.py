@@ -0,0 +1,253 @@
+"""
+This module keeps versioned model exports on disk and switches the serving model without a restart.
+
+Replacing `model_Hussain.joblib` used to mean restarting every Streamlit and API worker, and going back to
+the previous model meant finding the old file again. `Model_Registry` stores every published model as an
+immutable version directory (the memory-mappable export of `export_shared_model()`, the joblib model and
+its evaluation metrics) and points at the active one with a `CURRENT` file. A `Registry_Watcher` thread in
+each worker notices when `CURRENT` changes, loads and warms up the new version next to the old one and
+swaps it into the `Prediction_Service` with one attribute assignment, so requests never wait on a load.
+
+Layout:
+-------
+model/registry/
+    v0001/          manifest.json, tree arrays, lookup index, joblib model, metrics.json
+    v0002/
+    CURRENT         active version name
+    HISTORY         one activated version per line, used by `rollback()`
+
+Key Components:
+---------------
+1. Model_Registry:
+   - `publish(model_path, metrics)`: Exports a model to a new version directory (built in a temporary
+     directory and renamed into place, so a half-written version is never visible).
+   - `activate(version)`: Atomically rewrites `CURRENT` and records the activation.
+   - `rollback()`: Reactivates the version that was active before the current one.
+
+2. Registry_Watcher:
+   - Background thread polling `CURRENT` and hot-swapping the service state.
+
+Usage:
+------
+python -m Predict.registry publish --model ./model/model_Hussain.joblib --activate
+python -m Predict.registry list
+python -m Predict.registry rollback
+"""
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from Predict.service import DATA_PATH, MODEL_PATH, Model_State
+from Predict.shared_model import QUANTILE_MODEL_PATH, export_shared_model
+
+REGISTRY_DIR = "./model/registry"
+
+
+class Model_Registry:
+    """
+    Versioned model exports with an atomically switched active version.
+    """
+
+    def __init__(self, root=REGISTRY_DIR):
+        self.root = root
+
+    def path(self, version):
+        return os.path.join(self.root, version)
+
+    def versions(self):
+        """
+        Returns the published version names, oldest first.
+        """
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(
+            name
+            for name in os.listdir(self.root)
+            if name.startswith("v") and os.path.isdir(self.path(name))
+        )
+
+    def metrics(self, version):
+        """
+        Returns the metrics stored with `version`, together with the source model path.
+        """
+        with open(os.path.join(self.path(version), "metrics.json")) as f:
+            return json.load(f)
+
+    def current(self):
+        """
+        Returns the active version name, or None when nothing was activated.
+        """
+        try:
+            with open(os.path.join(self.root, "CURRENT")) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def _history(self):
+        try:
+            with open(os.path.join(self.root, "HISTORY")) as f:
+                return [line.strip() for line in f if line.strip()]
+        except FileNotFoundError:
+            return []
+
+    def _write(self, name, text):
+        # Write next to the target and rename over it: readers see the old or the new file, never half
+        fd, tmp = tempfile.mkstemp(dir=self.root, prefix=f".{name}.")
+        with os.fdopen(fd, "w") as f:
+            f.write(text)
+        os.replace(tmp, os.path.join(self.root, name))
+
+    def publish(
+        self,
+        model_path=MODEL_PATH,
+        data_path=DATA_PATH,
+        quantile_model_path=QUANTILE_MODEL_PATH,
+        metrics=None,
+        activate=False,
+        target_index=None,
+    ):
+        """
+        Exports a model as the next version.
+
+        Args:
+        - model_path (str): Path of the joblib model.
+        - data_path (str): Path of the training dataset (`ED.csv`) the model was fitted on.
+        - quantile_model_path (str or None): Optional MultiQuantile model published with it.
+        - metrics (dict or None): Evaluation results stored in `metrics.json`.
+        - activate (bool): Make the new version the active one.
+        - target_index (str or None): Target encoder table of a target-encoded model.
+
+        Returns:
+        - str: The new version name.
+        """
+        os.makedirs(self.root, exist_ok=True)
+        tmp = tempfile.mkdtemp(dir=self.root, prefix=".publish.")
+        try:
+            export_shared_model(model_path, data_path, tmp, quantile_model_path, target_index=target_index)
+            # The manifest names the model file; keep the version self-contained
+            shutil.copy2(model_path, os.path.join(tmp, os.path.basename(model_path)))
+            with open(os.path.join(tmp, "metrics.json"), "w") as f:
+                json.dump({"source": os.path.abspath(model_path), **(metrics or {})}, f, indent=2)
+
+            versions = self.versions()
+            number = int(versions[-1][1:]) + 1 if versions else 1
+            version = f"v{number:04d}"
+            os.rename(tmp, self.path(version))
+        except BaseException:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+
+        if activate:
+            self.activate(version)
+        return version
+
+    def activate(self, version):
+        """
+        Makes `version` the active one.
+        """
+        if version not in self.versions():
+            raise ValueError(f"Unknown model version {version!r}, published: {self.versions()}")
+        history = self._history() + [version]
+        self._write("HISTORY", "\n".join(history) + "\n")
+        self._write("CURRENT", version + "\n")
+
+    def rollback(self):
+        """
+        Reactivates the previously active version.
+
+        Returns:
+        - str: The version now active.
+        """
+        history = self._history()
+        if len(history) < 2:
+            raise ValueError("No previous version to roll back to")
+        history.pop()
+        self._write("HISTORY", "\n".join(history) + "\n")
+        self._write("CURRENT", history[-1] + "\n")
+        return history[-1]
+
+
+class Registry_Watcher(threading.Thread):
+    """
+    Polls the registry and hot-swaps the service state when the active version changes.
+    """
+
+    def __init__(self, registry, service, interval=1.0):
+        super().__init__(name="registry-watcher", daemon=True)
+        self.registry = registry
+        self.service = service
+        self.interval = interval
+        # Version whose swap was rejected: not retried until another one is activated
+        self._rejected = None
+        self._halt = threading.Event()
+
+    def check(self):
+        """
+        Loads and swaps in the active version if it differs from the served one.
+
+        Returns:
+        - bool: True when a swap happened.
+        """
+        version = self.registry.current()
+        if version is None or version in (self.service.state.version, self._rejected):
+            return False
+        state = Model_State.from_directory(self.registry.path(version), version)
+        if state is None:
+            return False
+        try:
+            self.service.swap(state)
+        except ValueError:
+            self._rejected = version
+            raise
+        return True
+
+    def run(self):
+        while not self._halt.wait(self.interval):
+            try:
+                self.check()
+            except Exception as error:
+                # Keep serving the current version; the next poll retries
+                print(f"Model swap failed: {error}")
+
+    def stop(self):
+        self._halt.set()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ImmoEliza model registry")
+    parser.add_argument("--root", default=REGISTRY_DIR)
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list")
+    publish = commands.add_parser("publish")
+    publish.add_argument("--model", default=MODEL_PATH)
+    publish.add_argument("--data", default=DATA_PATH)
+    publish.add_argument("--quantiles", default=QUANTILE_MODEL_PATH)
+    publish.add_argument("--target-index", help="Target encoder table of a target-encoded model")
+    publish.add_argument("--activate", action="store_true")
+    activate = commands.add_parser("activate")
+    activate.add_argument("version")
+    commands.add_parser("rollback")
+    args = parser.parse_args()
+
+    registry = Model_Registry(args.root)
+    if args.command == "list":
+        current = registry.current()
+        for version in registry.versions():
+            marker = "*" if version == current else " "
+            print(f"{marker} {version} {json.dumps(registry.metrics(version))}")
+    elif args.command == "publish":
+        start = time.perf_counter()
+        version = registry.publish(
+            args.model, args.data, args.quantiles, activate=args.activate, target_index=args.target_index
+        )
+        print(f"Published {version} in {time.perf_counter() - start:.1f} s")
+    elif args.command == "activate":
+        registry.activate(args.version)
+        print(f"Active: {args.version}")
+    else:
+        print(f"Rolled back to {registry.rollback()}")
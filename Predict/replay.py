@@ -0,0 +1,152 @@
+"""
+This module replays recorded predictions against the prediction service to load-test a build.
+
+The prediction log (`Predict/prediction_log.py`) holds the inputs of every served request. `replay()` fires
+them again, in their recorded order, either at a running HTTP API (`--url`) or at an in-process
+`Prediction_Service`, from `concurrency` worker threads. With `rate` set, request i is released at
+`start + i / rate` (open-loop: a slow server does not slow the arrivals down, so queueing shows up in the
+latencies); without it, workers fire back to back.
+
+The report gives the achieved throughput, the latency percentiles measured on the client side and the
+number of failed requests.
+
+Usage:
+------
+python -m Predict.replay --logs ./logs --url http://127.0.0.1:8000 --concurrency 8 --rate 200
+python -m Predict.replay --logs ./logs --limit 5000          # in-process service
+"""
+
+import argparse
+import heapq
+import json
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from Predict.prediction_log import LOG_DIR, log_files
+
+
+def read_log(directory=LOG_DIR, name="predictions", limit=None):
+    """
+    Reads the recorded requests of every serving process, merged by timestamp, oldest first.
+
+    Returns:
+    - list[dict]: Logged entries holding at least "records" and "intervals".
+    """
+    files = [open(path) for path in log_files(directory, name)]
+    try:
+        streams = [map(json.loads, f) for f in files]
+        entries = []
+        for entry in heapq.merge(*streams, key=lambda entry: entry["ts"]):
+            entries.append(entry)
+            if limit is not None and len(entries) >= limit:
+                break
+        return entries
+    finally:
+        for f in files:
+            f.close()
+
+
+def http_target(url, timeout=30.0):
+    """
+    Returns a function posting one logged request to the `/predict` route of `url`.
+    """
+
+    def send(entry):
+        body = json.dumps({"records": entry["records"], "intervals": entry.get("intervals", False)})
+        request = urllib.request.Request(
+            url.rstrip("/") + "/predict",
+            data=body.encode(),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+
+    return send
+
+
+def service_target(service):
+    """
+    Returns a function scoring one logged request with an in-process `Prediction_Service`.
+    """
+
+    def send(entry):
+        service.predict(entry["records"], intervals=entry.get("intervals", False), source="replay")
+
+    return send
+
+
+def replay(entries, send, concurrency=4, rate=None):
+    """
+    Fires `entries` through `send` and measures the client-side latencies.
+
+    Args:
+    - entries (list[dict]): Logged requests.
+    - send (callable): Sends one entry, raising on failure (`http_target` or `service_target`).
+    - concurrency (int): Number of worker threads.
+    - rate (float or None): Requests per second released (open loop); None fires as fast as possible.
+
+    Returns:
+    - dict: Requests sent and failed, duration, throughput and p50/p90/p99/max latency in ms.
+    """
+    latencies = np.full(len(entries), np.nan)
+    failures = []
+    lock = threading.Lock()
+    start = time.perf_counter()
+
+    def fire(i):
+        if rate:
+            time.sleep(max(start + i / rate - time.perf_counter(), 0))
+        begin = time.perf_counter()
+        try:
+            send(entries[i])
+        except Exception as error:
+            with lock:
+                failures.append(repr(error))
+            return
+        latencies[i] = time.perf_counter() - begin
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(fire, range(len(entries))))
+    duration = time.perf_counter() - start
+
+    done = latencies[~np.isnan(latencies)] * 1e3
+    report = {
+        "requests": len(entries),
+        "failed": len(failures),
+        "duration_s": duration,
+        "throughput_rps": len(done) / duration if duration else 0.0,
+    }
+    if len(done):
+        for q in (50, 90, 99):
+            report[f"p{q}_ms"] = float(np.percentile(done, q))
+        report["max_ms"] = float(done.max())
+    if failures:
+        report["first_error"] = failures[0]
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay the prediction log against the service")
+    parser.add_argument("--logs", default=LOG_DIR, help="Directory of the prediction log")
+    parser.add_argument("--url", help="Base URL of a running API; in-process service when omitted")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--rate", type=float, help="Requests per second (as fast as possible when omitted)")
+    parser.add_argument("--limit", type=int, help="Replay only the first N requests")
+    args = parser.parse_args()
+
+    entries = read_log(args.logs, limit=args.limit)
+    if not entries:
+        raise SystemExit(f"No logged predictions in {args.logs}")
+    if args.url:
+        send = http_target(args.url)
+    else:
+        from Predict.service import Prediction_Service
+
+        send = service_target(Prediction_Service.load())
+    for key, value in replay(entries, send, args.concurrency, args.rate).items():
+        print(f"{key}: {value:.2f}" if isinstance(value, float) else f"{key}: {value}")
@@ -0,0 +1,342 @@
+"""
+This module decides how many cores each part of the app may use, from one place.
+
+Left alone, every library sizes itself for the whole machine: CatBoost trains and explains on all cores,
+and NumPy's BLAS (the matrix product in `Fast_Predictor.predict_raw`) starts one thread per core in every
+process. Several API or Streamlit workers on one host then run `workers x cores` threads on `cores` CPUs,
+and inside a container the "machine" is the host, not the CPU quota the container actually gets.
+
+`Resource_Config` holds the whole budget: the CPUs available, the number of worker processes, the CatBoost
+`thread_count` and the BLAS thread count per process. It is resolved in this order:
+
+1. defaults derived from the usable CPUs (`available_cpus()`: cgroup v2 `cpu.max` or v1 CFS quota,
+   capped by the CPU affinity mask), per role:
+   - "train": one process using every CPU (CatBoost and BLAS), feature selection with one process per CPU;
+   - "serve": one worker process per CPU, one CatBoost/BLAS thread each;
+2. the JSON file named by `IMMO_RESOURCES` (flat keys, or one section per role);
+3. the environment variables `IMMO_CPUS`, `IMMO_WORKERS`, `IMMO_CATBOOST_THREADS`, `IMMO_BLAS_THREADS`.
+
+When only the worker count is overridden, the per-process threads become `cpus // workers`, so the budget
+stays within the quota. `apply()` caps the BLAS/OpenMP pools of the running process with `threadpoolctl`
+and exports `OMP_NUM_THREADS` & co. for the processes it starts.
+
+Key Components:
+---------------
+1. available_cpus():
+   - CPUs usable by this process (cgroup quota and affinity).
+
+2. Resource_Config:
+   - `load(role)`, `apply()`, `catboost_params()`.
+
+3. configure(role, **overrides):
+   - Loads and applies the configuration of this process; `current()` returns it.
+
+4. benchmark_serving(settings) / benchmark_training(thread_counts):
+   - Scoring throughput per (workers, threads) setting and training time per `thread_count`, to size
+     containers.
+
+Usage:
+------
+resources = configure("serve")
+CatBoostRegressor(**resources.catboost_params())
+
+IMMO_WORKERS=4 python -m Predict.api
+Run `python -m Predict.resources` from the repository root to print the resolved budget and the benchmarks.
+"""
+
+import json
+import math
+import multiprocessing
+import os
+import time
+
+import numpy as np
+from threadpoolctl import threadpool_limits
+
+ROLES = ("train", "serve")
+
+CONFIG_ENV = "IMMO_RESOURCES"
+
+# Setting -> environment variable overriding it
+ENV_VARS = {
+    "cpus": "IMMO_CPUS",
+    "workers": "IMMO_WORKERS",
+    "catboost_threads": "IMMO_CATBOOST_THREADS",
+    "blas_threads": "IMMO_BLAS_THREADS",
+}
+
+# Read by BLAS/OpenMP libraries when a child process loads them
+BLAS_ENV_VARS = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS")
+
+_active = None
+_limits = None
+
+
+def cgroup_cpu_limit(root="/sys/fs/cgroup"):
+    """
+    Returns the CPU quota of the container in CPUs (e.g. 1.5), or None when unlimited or unknown.
+    """
+    try:
+        # cgroup v2: "<quota> <period>" or "max <period>"
+        with open(os.path.join(root, "cpu.max")) as f:
+            quota, period = f.read().split()
+        return None if quota == "max" else int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+    try:
+        # cgroup v1: a quota of -1 means unlimited
+        with open(os.path.join(root, "cpu", "cpu.cfs_quota_us")) as f:
+            quota = int(f.read())
+        with open(os.path.join(root, "cpu", "cpu.cfs_period_us")) as f:
+            period = int(f.read())
+        return None if quota <= 0 else quota / period
+    except (OSError, ValueError):
+        return None
+
+
+def available_cpus():
+    """
+    Returns the number of CPUs this process can use: the affinity mask capped by the cgroup quota.
+    """
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    limit = cgroup_cpu_limit()
+    if limit is not None:
+        cpus = min(cpus, math.ceil(limit))
+    return max(cpus, 1)
+
+
+class Resource_Config:
+    """
+    The CPU budget of one process role.
+
+    Attributes:
+    - role (str): "train" or "serve".
+    - cpus (int): CPUs the budget is shared over.
+    - workers (int): Worker processes (serving workers, or feature-selection processes for training).
+    - catboost_threads (int): CatBoost `thread_count` per process.
+    - blas_threads (int): BLAS/OpenMP threads per process.
+    """
+
+    def __init__(self, role, cpus, workers, catboost_threads, blas_threads):
+        self.role = role
+        self.cpus = cpus
+        self.workers = workers
+        self.catboost_threads = catboost_threads
+        self.blas_threads = blas_threads
+
+    @classmethod
+    def default(cls, role="serve", cpus=None):
+        """
+        Returns the default budget of a role over `cpus` (the usable CPUs by default).
+        """
+        if role not in ROLES:
+            raise ValueError(f"Unknown role {role!r}, expected one of {ROLES}")
+        cpus = cpus or available_cpus()
+        if role == "train":
+            return cls(role, cpus, cpus, cpus, cpus)
+        return cls(role, cpus, cpus, 1, 1)
+
+    @classmethod
+    def load(cls, role="serve", path=None, environ=None, **overrides):
+        """
+        Resolves the budget of a role: defaults, then the JSON file, then the environment, then `overrides`.
+
+        Args:
+        - role (str): "train" or "serve".
+        - path (str or None): JSON configuration file; `$IMMO_RESOURCES` by default.
+        - environ (dict or None): Environment to read, `os.environ` by default.
+        - overrides: Settings passed explicitly (None values are ignored), e.g. a `--workers` flag.
+
+        Returns:
+        - Resource_Config: The resolved budget.
+        """
+        environ = os.environ if environ is None else environ
+        settings = {}
+        path = path or environ.get(CONFIG_ENV)
+        if path:
+            with open(path) as f:
+                config = json.load(f)
+            settings.update({key: value for key, value in config.items() if key in ENV_VARS})
+            settings.update(config.get(role, {}))
+        for key, name in ENV_VARS.items():
+            if environ.get(name):
+                settings[key] = environ[name]
+        settings.update({key: value for key, value in overrides.items() if value is not None})
+        unknown = set(settings) - set(ENV_VARS)
+        if unknown:
+            raise ValueError(f"Unknown resource settings: {', '.join(sorted(unknown))}")
+        settings = {key: int(value) for key, value in settings.items()}
+        if any(value < 1 for value in settings.values()):
+            raise ValueError(f"Resource settings must be positive: {settings}")
+
+        config = cls.default(role, settings.get("cpus"))
+        config.workers = settings.get("workers", config.workers)
+        # Threads not set explicitly share the CPUs between the worker processes
+        per_worker = max(1, config.cpus // config.workers) if role == "serve" else config.cpus
+        config.catboost_threads = settings.get("catboost_threads", per_worker)
+        config.blas_threads = settings.get("blas_threads", per_worker)
+        return config
+
+    def apply(self):
+        """
+        Caps the BLAS/OpenMP thread pools of this process and exports the limits to child processes.
+
+        Returns:
+        - Resource_Config: self, for chaining.
+        """
+        global _active, _limits
+        for name in BLAS_ENV_VARS:
+            os.environ[name] = str(self.blas_threads)
+        if _limits is not None:
+            _limits.restore_original_limits()
+        _limits = threadpool_limits(limits=self.blas_threads)
+        _active = self
+        return self
+
+    def catboost_params(self):
+        """
+        Returns the CatBoost parameters of the budget.
+        """
+        return {"thread_count": self.catboost_threads}
+
+    def to_dict(self):
+        return {
+            "role": self.role,
+            "cpus": self.cpus,
+            "workers": self.workers,
+            "catboost_threads": self.catboost_threads,
+            "blas_threads": self.blas_threads,
+        }
+
+
+def configure(role="serve", **overrides):
+    """
+    Loads the budget of `role` and applies it to this process.
+
+    Returns:
+    - Resource_Config: The applied budget.
+    """
+    return Resource_Config.load(role, **overrides).apply()
+
+
+def current():
+    """
+    Returns the budget applied in this process, or the serving defaults when none was applied.
+    """
+    return _active if _active is not None else Resource_Config.load("serve")
+
+
+def _serving_worker(directory, threads, batch_size, seconds, start, results):
+    Resource_Config("serve", threads, 1, threads, threads).apply()
+    from Predict.shared_model import load_shared_predictor
+
+    predictor = load_shared_predictor(directory)
+    rng = np.random.default_rng(os.getpid())
+    X = rng.random((batch_size, len(predictor.features)), dtype=np.float32)
+    predictor.predict_batch(X.copy())
+    start.wait()
+    rows = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        # `predict_batch` scales its input in place: every call gets a fresh request matrix
+        predictor.predict_batch(X.copy())
+        rows += batch_size
+    results.put(rows)
+
+
+def benchmark_serving(settings=((1, 1), (2, 1), (1, 2)), batch_size=64, seconds=3.0, directory=None):
+    """
+    Measures the scoring throughput of the exported model per (workers, threads per worker) setting.
+
+    Every worker is a separate process scoring `batch_size` rows per call, as an API worker would under
+    load; the workers start together and run for `seconds`.
+
+    Args:
+    - settings (iterable of (int, int)): (worker processes, BLAS threads per worker) pairs.
+    - batch_size (int): Rows per predict call.
+    - seconds (float): Duration of each run.
+    - directory (str or None): Export of `export_shared_model()`, `./model/shared` by default.
+
+    Returns:
+    - list[dict]: workers, threads, rows/s in total and rows/s per worker for every setting.
+    """
+    from Predict.shared_model import SHARED_DIR
+
+    directory = directory or SHARED_DIR
+    context = multiprocessing.get_context("spawn")
+    report = []
+    for workers, threads in settings:
+        start = context.Barrier(workers + 1)
+        results = context.Queue()
+        processes = [
+            context.Process(
+                target=_serving_worker,
+                args=(directory, threads, batch_size, seconds, start, results),
+            )
+            for _ in range(workers)
+        ]
+        for process in processes:
+            process.start()
+        start.wait()
+        rows = sum(results.get() for _ in processes)
+        for process in processes:
+            process.join()
+        report.append(
+            {
+                "workers": workers,
+                "threads": threads,
+                "rows_per_s": rows / seconds,
+                "rows_per_s_per_worker": rows / seconds / workers,
+            }
+        )
+    return report
+
+
+def benchmark_training(thread_counts=(1, 2, 4), link="./preprocessing/ED.csv", iterations=300):
+    """
+    Times CatBoost training on the cached quantized pool for every `thread_count`.
+
+    Returns:
+    - list[dict]: thread_count, seconds and iterations/s for every setting.
+    """
+    from catboost import CatBoostRegressor
+
+    from Predict.CatBoost_Model import prepare_split
+    from Predict.pool_cache import load_training_pools
+
+    pools = load_training_pools(link, prepare_split)
+    report = []
+    for threads in thread_counts:
+        model = CatBoostRegressor(
+            iterations=iterations,
+            depth=5,
+            random_seed=42,
+            thread_count=threads,
+            logging_level="Silent",
+            allow_writing_files=False,
+        )
+        start = time.perf_counter()
+        model.fit(pools.train)
+        seconds = time.perf_counter() - start
+        report.append({"thread_count": threads, "seconds": seconds, "iterations_per_s": iterations / seconds})
+    return report
+
+
+if __name__ == "__main__":
+    print(f"Usable CPUs: {available_cpus()} (cgroup quota: {cgroup_cpu_limit()})")
+    for role in ROLES:
+        print(role, Resource_Config.load(role).to_dict())
+    cpus = available_cpus()
+    counts = sorted({1, 2, cpus, 2 * cpus})
+    print("\nServing throughput (batches of 64 rows):")
+    for row in benchmark_serving([(w, 1) for w in counts] + [(1, t) for t in counts if t > 1]):
+        print(
+            f"  workers={row['workers']} threads={row['threads']}: {row['rows_per_s']:,.0f} rows/s "
+            f"({row['rows_per_s_per_worker']:,.0f} per worker)"
+        )
+    print("\nTraining time (300 iterations):")
+    for row in benchmark_training(counts):
+        print(f"  thread_count={row['thread_count']}: {row['seconds']:.2f} s ({row['iterations_per_s']:.0f} it/s)")
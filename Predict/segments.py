@@ -0,0 +1,210 @@
+"""
+This module breaks the evaluation metrics down by market segment.
+
+`Model1.evaluate_metrics` prints one global MAE/RMSE/R²/MAPE/sMAPE, which hides where the model is bad:
+a fine global MAPE can still mean a 30% error on coastal villas or Brussels apartments. The segment
+report computes every metric per group of each segment: locality, province, region, subtype, state,
+price decile, and a few crossings (region x type, coast x subtype).
+
+Every metric is a sum over the rows of a group, so one segment is a handful of `np.bincount` reductions
+over its group ids (count, sum of errors, absolute errors, squared errors, relative errors, target sum
+and squared target sum for R²), with no Python loop over groups or rows. Millions of holdout rows take
+well under a second per segment.
+
+The report is one long table (segment, group, label, count and the metrics) exported to Parquet for
+later analysis and to HTML (one table per segment, worst MAPE first) for reading.
+
+Key Components:
+---------------
+1. SEGMENTS:
+   - Segment name -> column or tuple of columns (crossings).
+
+2. group_metrics(y_true, y_pred, groups):
+   - All metrics per group id with bincount reductions.
+
+3. segment_report(data, y_true, y_pred, segments, labels):
+   - The long report over every segment.
+
+4. export_report(report, directory):
+   - `segment_report.parquet` and `segment_report.html`.
+
+Usage:
+------
+report = segment_report(test_rows, y_test, y_pred, labels=mappings)
+export_report(report, "./reports")
+
+Run `python -m Predict.segments` from the repository root to time the report on synthetic rows.
+"""
+
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+SEGMENTS = {
+    "locality": "Locality_encoded",
+    "province": "Prov_encoded",
+    "region": "Region_encoded",
+    "subtype": "SubType_encoded",
+    "state": "State",
+    "price_decile": "Price_decile",
+    "region_x_type": ("Region_encoded", "Type_encoded"),
+    "coast_x_subtype": ("Is_On_Coast", "SubType_encoded"),
+}
+
+METRICS = ("count", "bias", "mae", "rmse", "r2", "mape", "smape")
+
+
+def group_metrics(y_true, y_pred, groups, n_groups=None):
+    """
+    Computes every metric per group.
+
+    Args:
+    - y_true (ndarray): True prices.
+    - y_pred (ndarray): Predicted prices.
+    - groups (ndarray[int64]): Dense group id of every row.
+    - n_groups (int or None): Number of groups, `groups.max() + 1` by default.
+
+    Returns:
+    - dict[str, ndarray]: `METRICS` arrays indexed by group id ("bias" is the mean signed error;
+      "mape" and "smape" are percentages).
+    """
+    y_true = np.asarray(y_true, dtype=np.float64)
+    y_pred = np.asarray(y_pred, dtype=np.float64)
+    n_groups = int(groups.max()) + 1 if n_groups is None else n_groups
+
+    def total(weights=None):
+        return np.bincount(groups, weights=weights, minlength=n_groups)
+
+    error = y_pred - y_true
+    absolute = np.abs(error)
+    count = total()
+    with np.errstate(invalid="ignore", divide="ignore"):
+        sse = total(error * error)
+        # Within-group total sum of squares from the first two moments of the target
+        sum_y = total(y_true)
+        sst = total(y_true * y_true) - sum_y * sum_y / count
+        return {
+            "count": count.astype(np.int64),
+            "bias": total(error) / count,
+            "mae": total(absolute) / count,
+            "rmse": np.sqrt(sse / count),
+            "r2": np.where(sst > 0, 1 - sse / sst, np.nan),
+            "mape": total(absolute / np.abs(y_true)) / count * 100,
+            "smape": total(2 * absolute / (np.abs(y_true) + np.abs(y_pred))) / count * 100,
+        }
+
+
+def price_deciles(y_true):
+    """
+    Returns the price decile (0 - 9) of every row and the decile upper bounds.
+    """
+    edges = np.quantile(y_true, np.linspace(0.1, 0.9, 9))
+    return np.searchsorted(edges, y_true, side="right"), edges
+
+
+def _label(values, labels):
+    # Display label of one group: mapped names joined with " / ", raw codes when unmapped
+    names = []
+    for column, value in values.items():
+        mapping = labels.get(column, {})
+        names.append(str(mapping.get(value, value)))
+    return " / ".join(names)
+
+
+def segment_report(data, y_true, y_pred, segments=SEGMENTS, labels=None, min_count=1):
+    """
+    Computes the metrics of every group of every segment.
+
+    Args:
+    - data (pd.DataFrame): Holdout rows holding the segment columns (raw codes, not scaled).
+    - y_true (array-like): True prices of the rows.
+    - y_pred (array-like): Predicted prices of the rows.
+    - segments (dict): Segment name -> column or tuple of columns; "Price_decile" is computed.
+    - labels (dict or None): {column: {code: label}}, e.g. the mappings of `Cleaning().preprocess()`.
+    - min_count (int): Smallest group reported.
+
+    Returns:
+    - pd.DataFrame: One row per (segment, group): segment, group (codes), label and `METRICS`.
+    """
+    y_true = np.asarray(y_true, dtype=np.float64)
+    y_pred = np.asarray(y_pred, dtype=np.float64)
+    deciles, edges = price_deciles(y_true)
+    columns = {"Price_decile": deciles}
+    labels = {
+        **(labels or {}),
+        "Price_decile": {d: f"D{d + 1} (≤ €{bound:,.0f})" for d, bound in enumerate(edges)}
+        | {9: f"D10 (> €{edges[-1]:,.0f})"},
+    }
+
+    frames = []
+    for name, spec in segments.items():
+        keys = (spec,) if isinstance(spec, str) else tuple(spec)
+        if not all(key in columns or key in data for key in keys):
+            continue
+        values = [columns[key] if key in columns else data[key].to_numpy() for key in keys]
+        # Dense ids of the groups present: hashed codes per column, combined, hashed again
+        combined = np.zeros(len(y_true), dtype=np.int64)
+        for column in values:
+            codes, uniques = pd.factorize(column, use_na_sentinel=False)
+            combined = combined * len(uniques) + codes
+        groups, _ = pd.factorize(combined)
+        n_groups = int(groups.max()) + 1
+        # First row of every group gives its column values
+        first = np.empty(n_groups, dtype=np.int64)
+        first[groups[::-1]] = np.arange(len(groups))[::-1]
+        frame = pd.DataFrame(group_metrics(y_true, y_pred, groups, n_groups))
+        rows = [dict(zip(keys, row)) for row in zip(*(column[first].tolist() for column in values))]
+        frame.insert(0, "segment", name)
+        frame.insert(1, "group", [" / ".join(str(value) for value in row.values()) for row in rows])
+        frame.insert(2, "label", [_label(row, labels) for row in rows])
+        order = np.lexsort([column[first] for column in reversed(values)])
+        frame = frame.iloc[order]
+        frames.append(frame[frame["count"] >= min_count])
+    return pd.concat(frames, ignore_index=True)
+
+
+def export_report(report, directory="./reports", name="segment_report"):
+    """
+    Writes the report to `<name>.parquet` and `<name>.html` in `directory`.
+
+    Returns:
+    - tuple(str, str): Paths of the Parquet and HTML files.
+    """
+    os.makedirs(directory, exist_ok=True)
+    parquet_path = os.path.join(directory, f"{name}.parquet")
+    html_path = os.path.join(directory, f"{name}.html")
+    report.to_parquet(parquet_path, index=False)
+
+    sections = ["<html><head><meta charset='utf-8'><title>Segment report</title></head><body>"]
+    for segment, frame in report.groupby("segment", sort=False):
+        table = frame.drop(columns="segment").sort_values("mape", ascending=False)
+        sections.append(f"<h2>{segment}</h2>")
+        sections.append(table.to_html(index=False, float_format=lambda v: f"{v:,.3f}"))
+    sections.append("</body></html>")
+    with open(html_path, "w", encoding="utf-8") as f:
+        f.write("\n".join(sections))
+    return parquet_path, html_path
+
+
+if __name__ == "__main__":
+    # Report time over synthetic holdouts of growing size
+    rng = np.random.default_rng(0)
+    for n in (100_000, 1_000_000, 3_000_000):
+        data = pd.DataFrame(
+            {
+                "Locality_encoded": rng.integers(0, 800, n),
+                "Prov_encoded": rng.integers(0, 11, n),
+                "Region_encoded": rng.integers(0, 3, n),
+                "SubType_encoded": rng.integers(0, 20, n),
+                "State": rng.integers(1, 8, n),
+                "Type_encoded": rng.integers(0, 2, n),
+                "Is_On_Coast": rng.integers(0, 2, n),
+            }
+        )
+        y_true = rng.lognormal(12.5, 0.5, n)
+        y_pred = y_true * rng.lognormal(0, 0.2, n)
+        start = time.perf_counter()
+        report = segment_report(data, y_true, y_pred)
+        print(f"{n} rows: {time.perf_counter() - start:.2f} s, {len(report)} groups")
@@ -0,0 +1,429 @@
+"""
+This module gathers the serving state behind one object shared by the Streamlit app and the HTTP API.
+
+`Prediction_Service` turns raw property records into model-ready float32 rows (validation with the
+feature schema, derived features with the lookup index), scores them with the fast predictor and explains
+them with the cached SHAP explainer. The CatBoost model itself is only loaded when an explanation is
+first requested, so pure prediction workers keep relying on the memory-mapped arrays.
+
+Everything one model version needs is bundled in an immutable `Model_State`. Every request reads
+`service.state` once and uses that snapshot throughout, so `swap()` can replace the model with a single
+attribute assignment while in-flight requests finish on the version they started with.
+
+Key Components:
+---------------
+1. Model_State:
+   - `from_directory(directory)`: Memory-maps a shared export or a model registry version.
+   - `from_reference(model_path)`: Builds the state from the joblib model and `ED.csv`.
+   - `explainer`: SHAP explainer of that version, built on first use.
+
+2. Prediction_Service:
+   - `load()`: Uses the active registry version, then the shared export, then the joblib model.
+   - `swap(state)`: Warms the new state up on its reference rows, then makes it current; a version
+     pricing them as NaN or infinite is rejected. The drift monitor is rebuilt for the new version.
+   - `prepare(records)`: Raw float32 matrix in canonical order plus the validation result; free-text
+     `Locality` names are resolved with the locality search index.
+   - `predict(records, intervals)`: Prices (None for invalid rows), optional P10/P50/P90 from the
+     MultiQuantile model in the same vectorized pass, and per-row errors.
+   - `explain(records)`: Per-feature contributions for the valid rows.
+   - `search_localities(query, k)`: Ranked locality matches for a typed name.
+   - `shadow`: Optional `Shadow_Scorer` (see `shadow.py`) also scoring the valid rows with a
+     candidate model, off the response path.
+   - `logger`: Optional `Prediction_Logger` (see `prediction_log.py`) recording inputs, version,
+     outputs and timings of every request.
+   - `drift`: Optional `Drift_Monitor` (see `drift.py`) comparing the served inputs with the training
+     histograms of the manifest.
+   - `store`: Optional `Feature_Store` (see `preprocessing/feature_store.py`); `predict_listings(ids)`
+     scores stored listings by `Id` with point lookups.
+
+Usage:
+------
+service = Prediction_Service.load()
+service.predict([{"Bedrooms": 2, "Living_Area": 90, ...}])
+"""
+
+import json
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+from joblib import load
+
+from Predict.drift import reference_histograms
+from Predict.explain import Explainer
+from Predict.fast_predictor import Fast_Predictor
+from Predict.shared_model import (
+    QUANTILE_MODEL_PATH,
+    REFERENCE_ROWS,
+    SHARED_DIR,
+    load_drift_reference,
+    load_locality_index,
+    load_reference_rows,
+    load_schema,
+    load_shared_deriver,
+    load_shared_interval_predictor,
+    load_shared_surrogate,
+    load_shared_predictor,
+)
+from preprocessing.cleaning_data import Cleaning
+from preprocessing.features import Feature_Deriver, Lookup_Table
+from preprocessing.localities import Locality_Index
+from preprocessing.schema import INPUT_FEATURES, Feature_Schema
+from preprocessing.target_encoding import TARGET_COLUMNS
+
+MODEL_PATH = "./model/model_Hussain.joblib"
+DATA_PATH = "./preprocessing/ED.csv"
+
+
+def _model_reference(model, reference_data, deriver, data_path):
+    # Training features of `model` in its order; target encodings (not in `ED.csv`) come from the target
+    # encoder saved next to the data (`target_index`). Models fitted on bare arrays have no names: the
+    # frame is used as is
+    features = list(model.feature_names_)
+    if not set(TARGET_COLUMNS) & set(features):
+        return reference_data
+    if len(deriver.lookups) < 3:
+        deriver.lookups.append(Lookup_Table.load(os.path.join(os.path.dirname(data_path), "target_index")))
+    return deriver.derive_frame(reference_data)[features]
+
+
+def _to_list(values):
+    # JSON-friendly floats, None for missing values
+    return [None if np.isnan(v) else float(v) for v in values]
+
+
+class Model_State:
+    """
+    Immutable bundle of one model version: predictor, lookup index, schema, locality search index,
+    optional quantiles, optional preview surrogate and a few reference rows.
+    """
+
+    def __init__(
+        self,
+        predictor,
+        deriver,
+        schema,
+        interval_predictor=None,
+        model_path=MODEL_PATH,
+        data_path=DATA_PATH,
+        version=None,
+        localities=None,
+        drift_reference=None,
+        surrogate=None,
+        reference_rows=None,
+    ):
+        self.predictor = predictor
+        self.deriver = deriver
+        self.schema = schema
+        self.interval_predictor = interval_predictor
+        self.model_path = model_path
+        self.data_path = data_path
+        self.version = version
+        self.localities = localities
+        self.drift_reference = drift_reference
+        # Distilled preview model, None when not exported (previews then use `predictor`)
+        self.surrogate = surrogate
+        # Training rows in the predictor's feature order (warm-up of `swap`), None for older exports
+        self.reference_rows = reference_rows
+        self._explainer = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_directory(cls, directory, version=None, data_path=DATA_PATH):
+        """
+        Memory-maps a directory written by `export_shared_model()`, or returns None when incomplete.
+        """
+        predictor = load_shared_predictor(directory)
+        deriver = load_shared_deriver(directory)
+        schema = load_schema(directory)
+        if predictor is None or deriver is None or schema is None:
+            return None
+        with open(os.path.join(directory, "manifest.json")) as f:
+            model_name = json.load(f)["model"]
+        model_path = os.path.join(directory, model_name)
+        if not os.path.exists(model_path):
+            model_path = os.path.join(os.path.dirname(MODEL_PATH), model_name)
+        return cls(
+            predictor,
+            deriver,
+            schema,
+            load_shared_interval_predictor(directory),
+            model_path,
+            data_path,
+            version,
+            load_locality_index(directory),
+            load_drift_reference(directory),
+            load_shared_surrogate(directory),
+            load_reference_rows(directory),
+        )
+
+    @classmethod
+    def from_reference(cls, model_path=MODEL_PATH, data_path=DATA_PATH):
+        """
+        Builds the state from the joblib model and the reference data.
+        """
+        reverse_mappings, reference_data, mappings = Cleaning().preprocess()
+        deriver = Feature_Deriver.load(os.path.dirname(data_path))
+        if deriver is None:
+            deriver = Feature_Deriver.from_reference(reference_data)
+        model = load(model_path)
+        model_reference = _model_reference(model, reference_data, deriver, data_path)
+        interval_predictor = None
+        if os.path.exists(QUANTILE_MODEL_PATH):
+            interval_predictor = Fast_Predictor.from_reference(load(QUANTILE_MODEL_PATH), model_reference)
+        counts = np.bincount(reference_data["Locality_encoded"].to_numpy(dtype=np.int64))
+        return cls(
+            Fast_Predictor.from_reference(model, model_reference),
+            deriver,
+            Feature_Schema.from_reference(reference_data, mappings),
+            interval_predictor,
+            model_path,
+            data_path,
+            localities=Locality_Index.from_mappings(mappings, counts),
+            drift_reference=reference_histograms(reference_data),
+            reference_rows=model_reference.sample(
+                min(REFERENCE_ROWS, len(model_reference)), random_state=0
+            ).to_numpy(dtype=np.float32),
+        )
+
+    @property
+    def explainer(self):
+        # Loaded on first use: only explaining needs the CatBoost model object
+        with self._lock:
+            if self._explainer is None:
+                reference_data = pd.read_csv(self.data_path, index_col=0).drop(columns=["Price", "Id"])
+                if not set(self.predictor.features) <= set(reference_data.columns):
+                    # Target-encoded version: encodings from the lookup table exported with it
+                    reference_data = self.deriver.derive_frame(reference_data)
+                self._explainer = Explainer(load(self.model_path), self.predictor, reference_data)
+            return self._explainer
+
+
+class Prediction_Service:
+    """
+    Prediction, validation and explanation over the current `Model_State`.
+    """
+
+    def __init__(self, state, shadow=None, logger=None, drift=None, store=None):
+        self.state = state
+        # Optional `Shadow_Scorer` receiving every valid request off the response path
+        self.shadow = shadow
+        # Optional `Prediction_Logger` recording every request
+        self.logger = logger
+        # Optional `Drift_Monitor` receiving the valid raw rows
+        self.drift = drift
+        # Optional `Feature_Store` behind `predict_listings`
+        self.store = store
+
+    @classmethod
+    def load(cls, registry=None):
+        """
+        Loads the serving state: active registry version, then shared export, then joblib model.
+
+        Args:
+        - registry (Model_Registry or None): Registry to read the active version from.
+        """
+        state = None
+        if registry is not None and registry.current() is not None:
+            version = registry.current()
+            state = Model_State.from_directory(registry.path(version), version)
+        if state is None:
+            state = Model_State.from_directory(SHARED_DIR)
+        if state is None:
+            state = Model_State.from_reference()
+        return cls(state)
+
+    def swap(self, state):
+        """
+        Warms `state` up on a few reference rows of its version, then makes it current.
+
+        The rows are the ones exported with the version; older exports use the first rows of its dataset.
+        The swap itself is one attribute assignment: requests already running keep the snapshot
+        they read, new requests see the new version.
+
+        Raises:
+        - ValueError: When a predictor of `state` prices the rows as NaN or infinite; the current state
+          keeps serving.
+
+        The drift monitor is replaced by one with the new version's feature positions and training
+        histograms; `predict` only feeds it rows scored by that version.
+        """
+        X = state.reference_rows
+        if X is None:
+            records = pd.read_csv(state.data_path, index_col=0, nrows=REFERENCE_ROWS)
+            X, result = self.prepare(records, state)
+            X = X[result.valid]
+        predictors = {
+            "predictor": state.predictor,
+            "interval_predictor": state.interval_predictor,
+            "surrogate": state.surrogate,
+        }
+        for name, predictor in predictors.items():
+            if predictor is None:
+                continue
+            # `predict_batch` scales its input in place
+            prices = predictor.predict_batch(np.array(X, dtype=np.float32))
+            if not len(prices) or not np.isfinite(prices).all():
+                raise ValueError(
+                    f"Model version {state.version!r}: {name} prices its reference rows as NaN or infinite"
+                )
+        drift = self.drift
+        if drift is not None:
+            self.drift = drift.for_state(state)
+        self.state = state
+        if drift is not None:
+            drift.close()
+
+    def prepare(self, records, state=None):
+        """
+        Validates raw records and builds their model-ready feature rows.
+
+        Args:
+        - records (list[dict] or pd.DataFrame): Raw inputs holding at least `INPUT_FEATURES`; a free-text
+          `Locality` name may replace `Locality_encoded` (unknown names fail validation).
+        - state (Model_State or None): Snapshot to use, the current one by default.
+
+        Returns:
+        - tuple(ndarray, Validation_Result): Raw float32 rows (n, F) with derived columns filled,
+          and the validation result of the inputs.
+        """
+        state = state or self.state
+        if not isinstance(records, pd.DataFrame):
+            records = pd.DataFrame.from_records(records)
+        if "Locality_encoded" not in records and "Locality" in records and state.localities is not None:
+            records = records.assign(Locality_encoded=state.localities.resolve(records["Locality"]))
+        columns = {column: records[column].to_numpy() for column in INPUT_FEATURES if column in records}
+        result = state.schema.validate(columns)
+
+        features = state.predictor.features
+        X = np.full((len(records), len(features)), np.nan, dtype=np.float32)
+        for i, column in enumerate(features):
+            if column in columns:
+                # Non-numeric values become NaN: their rows already failed validation
+                X[:, i] = pd.to_numeric(records[column], errors="coerce")
+        state.deriver.derive_matrix(X, features)
+        return X, result
+
+    def predict(self, records, intervals=False, source=None, state=None):
+        """
+        Predicts prices for raw records.
+
+        Args:
+        - records (list[dict] or pd.DataFrame): Raw inputs.
+        - intervals (bool): Also return P10/P50/P90 when a quantile model is loaded.
+        - source (str or None): Caller name stored in the prediction log.
+        - state (Model_State or None): Snapshot to use, the current one by default.
+
+        Returns:
+        - dict: "prices" (list, None for invalid rows), "errors" ({row: [check, ...]}), "version" and,
+          with `intervals`, "p10", "p50" and "p90" lists.
+        """
+        start = time.perf_counter()
+        state = state or self.state
+        X, result = self.prepare(records, state)
+        prices = np.full(len(X), np.nan)
+        score_start = time.perf_counter()
+        if result.valid.any():
+            prices[result.valid] = state.predictor.predict_batch(X[result.valid])
+            shadow = self.shadow
+            if shadow is not None:
+                shadow.submit(X[result.valid], prices[result.valid], state.predictor.features)
+            drift = self.drift
+            # Rows of another version (a swap in between) have another layout
+            if drift is not None and drift.version == state.version:
+                drift.observe(X if result.valid.all() else X[result.valid])
+        response = {
+            "prices": _to_list(prices),
+            "errors": {int(i): result.row_errors(i) for i in np.flatnonzero(~result.valid)},
+            "version": state.version,
+        }
+        if intervals and state.interval_predictor is not None:
+            quantiles = np.full((len(X), 3), np.nan)
+            if result.valid.any():
+                quantiles[result.valid] = state.interval_predictor.predict_batch(X[result.valid])
+            for j, name in enumerate(("p10", "p50", "p90")):
+                response[name] = _to_list(quantiles[:, j])
+        end = time.perf_counter()
+        logger = self.logger
+        if logger is not None:
+            logger.log(
+                records,
+                response,
+                state.version,
+                intervals,
+                (end - start) * 1e3,
+                (end - score_start) * 1e3,
+                source,
+            )
+        return response
+
+    def predict_listings(self, ids, intervals=False, source=None):
+        """
+        Predicts the prices of listings of the feature store, by `Id`.
+
+        Args:
+        - ids (list[int]): Listing ids.
+        - intervals (bool): Also return P10/P50/P90 when a quantile model is loaded.
+        - source (str or None): Caller name stored in the prediction log.
+
+        Returns:
+        - dict: The `predict` response for the stored inputs, plus "ids"; unknown ids fail with "unknown_id".
+        """
+        store = self.store
+        if store is None:
+            raise RuntimeError("No feature store configured")
+        # Picks up the pipeline's latest upsert (one small manifest read)
+        store.refresh()
+        records = store.lookup(ids, INPUT_FEATURES)
+        known = np.flatnonzero(records.notna().any(axis=1).to_numpy())
+        response = self.predict(records.iloc[known].reset_index(drop=True), intervals=intervals, source=source)
+        # Back to one entry per requested id
+        for key, values in response.items():
+            if isinstance(values, list):
+                response[key] = [None] * len(records)
+                for i, value in zip(known, values):
+                    response[key][i] = value
+        errors = {int(known[i]): checks for i, checks in response["errors"].items()}
+        errors.update({int(i): ["unknown_id"] for i in np.setdiff1d(np.arange(len(records)), known)})
+        response["errors"] = dict(sorted(errors.items()))
+        response["ids"] = [int(i) for i in records.index]
+        return response
+
+    def search_localities(self, query, k=10):
+        """
+        Typeahead over the locality names, accents and Dutch/French variants folded.
+
+        Returns:
+        - list[dict]: Up to `k` matches {"locality", "code", "score"}, best first.
+        """
+        localities = self.state.localities
+        if localities is None:
+            return []
+        return [
+            {"locality": name, "code": code, "score": score}
+            for name, code, score in localities.search(query, k)
+        ]
+
+    def explain(self, records):
+        """
+        Explains the predictions of the valid raw records.
+
+        Returns:
+        - dict: "contributions" (list of {feature: value}, None for invalid rows), "expected_value"
+          and "errors", all in log-price space.
+        """
+        state = self.state
+        X, result = self.prepare(records, state)
+        contributions = [None] * len(X)
+        expected_value = None
+        if result.valid.any():
+            frame, expected_value = state.explainer.explain(X[result.valid])
+            for i, row in zip(np.flatnonzero(result.valid), frame.to_dict("records")):
+                contributions[i] = row
+        return {
+            "contributions": contributions,
+            "expected_value": expected_value,
+            "errors": {int(i): result.row_errors(i) for i in np.flatnonzero(~result.valid)},
+        }
@@ -0,0 +1,279 @@
+"""
+This module scores live requests with a candidate model in the background, next to the served model.
+
+Before a retrained `Model1` artifact is promoted in the model registry we want to know how differently it
+prices real requests. `Shadow_Scorer` receives the raw feature rows and the served prices of each request
+(or of a sampled fraction) and only appends them to a deque: the response path only takes a lock to wake
+a waiting worker, and at most one thread wakes up per `interval`. A small pool of daemon threads wakes up
+every `interval` seconds, waits for the next request to be handed over (so the batch runs in the gap
+before the following one), scores everything pending with the candidate in one vectorized batch and keeps
+the last `window` served/candidate pairs in ring buffers. When too many requests are pending, new ones
+are dropped from the shadow (and counted) rather than slowing down the primary path.
+
+The rows arrive in the served model's feature order. A candidate with another layout (other features,
+target encodings, ...) gets its own rows: the raw inputs are taken from the served rows by name and the
+candidate's deriver computes the rest, as its own `prepare` would.
+
+Key Components:
+---------------
+1. Shadow_Scorer:
+   - `from_registry(registry, version)`: Candidate loaded from a published registry version.
+   - `submit(X, prices, features)`: Non-blocking hand-off called by `Prediction_Service.predict`.
+   - `stats()`: Rolling divergence statistics over the window (mean and percentiles of the absolute
+     percentage difference, mean log ratio, share of rows differing by more than 10%).
+   - `pairs()`: The windowed predictions side by side.
+
+2. benchmark_overhead():
+   - Replays paced single-row requests through the service with and without the shadow and compares
+     the p99 latency of the primary path.
+
+Usage:
+------
+service.shadow = Shadow_Scorer.from_registry(Model_Registry(), "v0002", sample_rate=0.2)
+...
+service.shadow.stats()
+
+Run `python -m Predict.shadow` from the repository root to print the overhead benchmark.
+"""
+
+import random
+import threading
+import time
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from Predict.service import Model_State
+from preprocessing.schema import INPUT_FEATURES
+
+
+class Shadow_Scorer:
+    """
+    Background scoring of served requests with a candidate `Model_State`.
+    """
+
+    def __init__(
+        self, candidate, sample_rate=1.0, n_workers=1, interval=0.05, window=10_000, max_pending=1_000
+    ):
+        """
+        Args:
+        - candidate (Model_State): The model scored in the shadow.
+        - sample_rate (float): Fraction of requests sent to the shadow.
+        - n_workers (int): Number of background scoring threads.
+        - interval (float): Seconds between two drains of the pending requests.
+        - window (int): Number of most recent rows kept for the rolling statistics.
+        - max_pending (int): Queued requests beyond which new ones are dropped.
+        """
+        self.candidate = candidate
+        self.sample_rate = sample_rate
+        self.interval = interval
+        self.max_pending = max_pending
+        self.window = window
+        self.served = np.full(window, np.nan)
+        self.shadow = np.full(window, np.nan)
+        self.count = 0
+        self.dropped = 0
+        self._pending = deque()
+        # Workers waiting for the next request; only changed with the condition held
+        self._handoff = threading.Condition()
+        self._waiting = 0
+        self._lock = threading.Lock()
+        self._workers = [
+            threading.Thread(target=self._run, name=f"shadow-{i}", daemon=True) for i in range(n_workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    @classmethod
+    def from_registry(cls, registry, version, **kwargs):
+        """
+        Shadows the published registry `version`.
+        """
+        candidate = Model_State.from_directory(registry.path(version), version)
+        if candidate is None:
+            raise ValueError(f"Model version {version!r} is not a complete export")
+        return cls(candidate, **kwargs)
+
+    def submit(self, X, prices, features):
+        """
+        Hands a scored request over to the shadow without waiting for it.
+
+        Args:
+        - X (ndarray, shape (n, F)): Raw feature rows (not scaled); must not be modified afterwards.
+        - prices (ndarray, shape (n,)): Prices returned by the served model.
+        - features (list[str]): Column names of `X` (the served model's feature order).
+        """
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return
+        if len(self._pending) >= self.max_pending:
+            self.dropped += 1
+        else:
+            self._pending.append((X, prices, features))
+            # Unlocked read: a missed wake-up only delays the batch by one `interval`
+            if self._waiting:
+                with self._handoff:
+                    self._handoff.notify_all()
+
+    def candidate_rows(self, X, features):
+        """
+        Returns the rows of `X` (columns `features`) in the candidate's layout.
+
+        Rows already in the candidate's order are returned as is; otherwise the raw inputs are copied by
+        name and the candidate's deriver fills the derived columns.
+        """
+        target = self.candidate.predictor.features
+        if list(features) == list(target):
+            return X
+        position = {name: i for i, name in enumerate(features)}
+        missing = [name for name in INPUT_FEATURES if name in target and name not in position]
+        if missing:
+            raise ValueError(f"Served rows lack the candidate inputs {missing}")
+        rows = np.full((len(X), len(target)), np.nan, dtype=np.float32)
+        for j, name in enumerate(target):
+            if name in INPUT_FEATURES:
+                rows[:, j] = X[:, position[name]]
+        return self.candidate.deriver.derive_matrix(rows, target)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            if not self._pending:
+                continue
+            # Score right after the next response: requests are spaced, so the batch runs in the gap
+            # instead of competing with a request for the GIL
+            with self._handoff:
+                self._waiting += 1
+                self._handoff.wait(self.interval)
+                self._waiting -= 1
+            # Drain everything pending into one batch: one vectorized pass for many requests
+            items = []
+            while True:
+                try:
+                    items.append(self._pending.popleft())
+                except IndexError:
+                    break
+            if not items:
+                continue
+            try:
+                X = np.concatenate(
+                    [self.candidate_rows(X, features) for X, _, features in items]
+                ).astype(np.float32)
+                served = np.concatenate([prices for _, prices, _ in items])
+                shadow = self.candidate.predictor.predict_batch(X)
+            except Exception as error:
+                print(f"Shadow scoring failed: {error}")
+                continue
+            self._record(served, shadow)
+
+    def _record(self, served, shadow):
+        with self._lock:
+            positions = (self.count + np.arange(len(served))) % self.window
+            self.served[positions] = served
+            self.shadow[positions] = shadow
+            self.count += len(served)
+
+    def pairs(self):
+        """
+        Returns the windowed served and candidate prices side by side, oldest first.
+        """
+        with self._lock:
+            n = min(self.count, self.window)
+            order = (self.count - n + np.arange(n)) % self.window
+            return pd.DataFrame({"served": self.served[order], "shadow": self.shadow[order]})
+
+    def stats(self):
+        """
+        Rolling divergence between the served and the candidate model.
+
+        Returns:
+        - dict: Version of the candidate, rows scored and dropped, rows in the window and, once rows were
+          scored, the mean/P50/P95 absolute percentage difference, the mean `log(shadow / served)` and
+          the share of rows differing by more than 10%.
+        """
+        pairs = self.pairs()
+        result = {
+            "candidate": self.candidate.version,
+            "scored": self.count,
+            "dropped": self.dropped,
+            "window": len(pairs),
+        }
+        if len(pairs):
+            served, shadow = pairs["served"].to_numpy(), pairs["shadow"].to_numpy()
+            pct = np.abs(shadow - served) / served * 100
+            result.update(
+                {
+                    "mean_abs_pct_diff": float(np.mean(pct)),
+                    "p50_abs_pct_diff": float(np.percentile(pct, 50)),
+                    "p95_abs_pct_diff": float(np.percentile(pct, 95)),
+                    "mean_log_ratio": float(np.mean(np.log(shadow / served))),
+                    "share_over_10pct": float(np.mean(pct > 10)),
+                }
+            )
+        return result
+
+    def wait(self, timeout=10.0):
+        """
+        Blocks until the pending requests are drained (for tests and benchmarks).
+        """
+        deadline = time.monotonic() + timeout
+        while self._pending and time.monotonic() < deadline:
+            time.sleep(self.interval)
+        # The last drained batch may still be scoring
+        time.sleep(self.interval)
+
+
+def benchmark_overhead(service, candidate, n_requests=250, rate=200.0, rounds=20):
+    """
+    Compares the p99 latency of paced single-row requests with and without the shadow.
+
+    Requests arrive every `1 / rate` seconds as they would on a server; blocks with and without the
+    shadow alternate over `rounds` so both see the same machine conditions.
+
+    Args:
+    - service (Prediction_Service): The primary service.
+    - candidate (Model_State): The shadowed model.
+    - n_requests (int): Requests per block.
+    - rate (float): Requests per second.
+
+    Returns:
+    - dict: p50 and median per-block p99 latency in microseconds per configuration, the relative p99
+      overhead and the shadow statistics.
+    """
+    reference_data = pd.read_csv(candidate.data_path, index_col=0)
+    records = reference_data.sample(n_requests, random_state=0).to_dict("records")
+    shadow = Shadow_Scorer(candidate)
+    latencies = {"off": [], "on": []}
+    for _ in range(rounds):
+        for mode in ("off", "on"):
+            service.shadow = shadow if mode == "on" else None
+            block = []
+            next_start = time.perf_counter()
+            for record in records:
+                time.sleep(max(next_start - time.perf_counter(), 0))
+                start = time.perf_counter()
+                service.predict([record])
+                block.append(time.perf_counter() - start)
+                next_start = start + 1 / rate
+            latencies[mode].append(block)
+            shadow.wait()
+    service.shadow = None
+
+    # Median over the rounds of the per-block p99: robust to a noisy neighbour hitting one block
+    result = {}
+    for mode, blocks in latencies.items():
+        result[f"{mode}_p50_us"] = float(np.percentile(blocks, 50) * 1e6)
+        result[f"{mode}_p99_us"] = float(np.median(np.percentile(blocks, 99, axis=1)) * 1e6)
+    result["p99_overhead"] = result["on_p99_us"] / result["off_p99_us"] - 1
+    result.update({f"shadow_{key}": value for key, value in shadow.stats().items()})
+    return result
+
+
+if __name__ == "__main__":
+    from Predict.service import Prediction_Service
+
+    service = Prediction_Service.load()
+    report = benchmark_overhead(service, Model_State.from_reference())
+    for key, value in report.items():
+        print(f"{key}: {value}")
+    assert report["p99_overhead"] < 0.05, "The shadow slows the primary path down by 5% or more"
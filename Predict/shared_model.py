@@ -0,0 +1,327 @@
+"""
+This module exports the serving arrays to a directory that every worker process on a host memory-maps.
+
+Each Streamlit or API worker used to load `model_Hussain.joblib` and the full `ED.csv` reference frame into
+its own private memory, so RAM grew linearly with the number of workers. After `export_shared_model()`
+the serving layer only needs read-only `.npy` files (tree arrays, scaling arrays, feature statistics);
+`np.load(..., mmap_mode="r")` maps them from the page cache, so all workers share one physical copy.
+
+Key Components:
+---------------
+1. export_shared_model(model_path, data_path, directory, target_index=...):
+   - Writes the `Fast_Predictor` arrays, per-feature min/max statistics, a few reference rows (the
+     warm-up of a model swap) and the locality/subtype lookup index to `directory`. A target-encoded
+     model also needs the encoded dataset as `data_path` and its target encoder table as `target_index`
+     (both written by a target-encoded training run).
+
+2. load_shared_predictor(directory):
+   - Memory-maps a previously exported directory.
+   - `load_schema(directory)` reads the input-validation schema stored in the manifest.
+   - `load_shared_deriver(directory)` memory-maps the lookup index.
+   - `load_shared_interval_predictor(directory)` memory-maps the optional quantile predictor.
+   - `load_shared_surrogate(directory)` memory-maps the optional preview surrogate (`surrogate.py`).
+   - `load_locality_index(directory)` builds the locality search index from the manifest encoders.
+   - `load_drift_reference(directory)` reads the training histograms of the drift monitor.
+   - `load_reference_rows(directory)` reads the exported reference rows.
+
+3. measure_workers(n_workers, mode):
+   - Starts `n_workers` processes that load the predictor concurrently and reports, per worker,
+     the private memory added by loading (`Private_Clean + Private_Dirty`) and the proportional set size.
+
+Usage:
+------
+python -m Predict.shared_model export
+python -m Predict.shared_model export --model model_Hussain.joblib --data ./preprocessing/ED_target_encoded.csv \
+    --target-index ./preprocessing/target_index
+python -m Predict.shared_model measure --workers 4
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+from joblib import load
+
+from Predict.drift import reference_histograms
+from Predict.fast_predictor import Fast_Predictor
+from Predict.feature_selection import read_training_manifest
+from Predict.surrogate import SURROGATE_DIR, distill
+from preprocessing.cleaning_data import Cleaning
+from preprocessing.features import Feature_Deriver, Lookup_Table
+from preprocessing.localities import Locality_Index
+from preprocessing.schema import Feature_Schema
+from preprocessing.target_encoding import TARGET_COLUMNS
+
+SHARED_DIR = "./model/shared"
+QUANTILE_MODEL_PATH = "./model/model_Hussain_quantiles.joblib"
+# Training rows exported in the model's feature order (`reference_rows.npy`)
+REFERENCE_ROWS = 32
+
+
+def export_shared_model(
+    model_path="./model/model_Hussain.joblib",
+    data_path="./preprocessing/ED.csv",
+    directory=SHARED_DIR,
+    quantile_model_path=QUANTILE_MODEL_PATH,
+    surrogate=True,
+    target_index=None,
+):
+    """
+    Exports the predictor and the reference feature statistics as memory-mappable arrays.
+
+    Args:
+    - model_path (str): Path of the joblib model.
+    - data_path (str): Path of the training dataset (`ED.csv`, or `<name>_target_encoded.csv` for a
+      target-encoded model).
+    - directory (str): Target directory.
+    - quantile_model_path (str or None): Optional MultiQuantile model exported to `directory/quantiles`.
+    - surrogate (bool): Also distill the preview surrogate into `directory/surrogate` (see `surrogate.py`).
+    - target_index (str or None): Path (without extension) of the target encoder table of a
+      target-encoded model; required for such a model, ignored otherwise.
+
+    Returns:
+    - Fast_Predictor: The exported predictor.
+    """
+    reference_data = pd.read_csv(data_path, index_col=0).drop(columns=["Price", "Id"])
+    predictor = Fast_Predictor.from_reference(load(model_path), reference_data)
+    predictor.save(directory)
+
+    values = reference_data.to_numpy(dtype=np.float64)
+    np.save(os.path.join(directory, "feature_min.npy"), np.nanmin(values, axis=0))
+    np.save(os.path.join(directory, "feature_max.npy"), np.nanmax(values, axis=0))
+    rows = reference_data.sample(min(REFERENCE_ROWS, len(reference_data)), random_state=0)
+    np.save(os.path.join(directory, "reference_rows.npy"), rows.to_numpy(dtype=np.float32))
+    # Optional P10/P50/P90 model trained by Model1.fit_quantiles
+    if quantile_model_path and os.path.exists(quantile_model_path):
+        Fast_Predictor.from_reference(load(quantile_model_path), reference_data).save(
+            os.path.join(directory, "quantiles")
+        )
+
+    deriver = Feature_Deriver.load(os.path.dirname(data_path))
+    if deriver is None:
+        deriver = Feature_Deriver.from_reference(reference_data)
+    # Only the encoder given for this model: a table lying next to the data may be from another run
+    deriver.lookups = deriver.lookups[:2]
+    if set(TARGET_COLUMNS) & set(predictor.features):
+        if target_index is None:
+            raise ValueError("A target-encoded model needs its target encoder table (target_index)")
+        deriver.lookups.append(Lookup_Table.load(target_index))
+    deriver.save(directory)
+
+    _, _, mappings = Cleaning().preprocess()
+    manifest = {
+        "model": os.path.basename(model_path),
+        "features": predictor.features,
+        "schema": Feature_Schema.from_reference(reference_data, mappings).to_dict(),
+        # Category encodings the model was trained with ({column: {code: label}})
+        "encoders": mappings,
+        # Listings per locality, ranks the locality search
+        "locality_counts": np.bincount(
+            reference_data["Locality_encoded"].to_numpy(dtype=np.int64)
+        ).tolist(),
+        # Training histograms compared with the served inputs by the drift monitor
+        "drift_reference": reference_histograms(reference_data),
+    }
+    if surrogate:
+        # Small distilled model for the what-if previews, with its fidelity to the full model
+        model, manifest["surrogate"] = distill(predictor, deriver, reference_data)
+        model.save(os.path.join(directory, SURROGATE_DIR))
+    else:
+        shutil.rmtree(os.path.join(directory, SURROGATE_DIR), ignore_errors=True)
+    # Features the model was allowed to split on (`Model1.select_features`), all of them otherwise
+    training = read_training_manifest(model_path)
+    manifest["selected_features"] = (training or {}).get("selected_features", predictor.features)
+    with open(os.path.join(directory, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return predictor
+
+
+def load_shared_predictor(directory=SHARED_DIR):
+    """
+    Memory-maps an exported predictor, or returns None when the directory was never exported.
+    """
+    if not os.path.exists(os.path.join(directory, "manifest.json")):
+        return None
+    return Fast_Predictor.load(directory, mmap_mode="r")
+
+
+def load_shared_interval_predictor(directory=SHARED_DIR):
+    """
+    Memory-maps the exported quantile predictor, or returns None when there is none.
+    """
+    directory = os.path.join(directory, "quantiles")
+    if not os.path.exists(os.path.join(directory, "features.json")):
+        return None
+    return Fast_Predictor.load(directory, mmap_mode="r")
+
+
+def load_shared_surrogate(directory=SHARED_DIR):
+    """
+    Memory-maps the exported preview surrogate, or returns None when there is none.
+    """
+    directory = os.path.join(directory, SURROGATE_DIR)
+    if not os.path.exists(os.path.join(directory, "features.json")):
+        return None
+    return Fast_Predictor.load(directory, mmap_mode="r")
+
+
+def load_schema(directory=SHARED_DIR):
+    """
+    Returns the `Feature_Schema` stored in the exported manifest, or None when not exported.
+    """
+    path = os.path.join(directory, "manifest.json")
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return Feature_Schema.from_dict(json.load(f)["schema"])
+
+
+def load_drift_reference(directory=SHARED_DIR):
+    """
+    Returns the training histograms stored in the exported manifest, or None when not exported.
+    """
+    path = os.path.join(directory, "manifest.json")
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f).get("drift_reference")
+
+
+def load_reference_rows(directory=SHARED_DIR):
+    """
+    Returns the exported reference rows (float32, model feature order), or None for older exports.
+    """
+    path = os.path.join(directory, "reference_rows.npy")
+    if not os.path.exists(path):
+        return None
+    return np.load(path)
+
+
+def load_locality_index(directory=SHARED_DIR):
+    """
+    Builds the locality search index from the exported manifest, or returns None when not exported.
+    """
+    path = os.path.join(directory, "manifest.json")
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        manifest = json.load(f)
+    if "encoders" not in manifest:
+        return None
+    return Locality_Index.from_mappings(manifest["encoders"], manifest.get("locality_counts"))
+
+
+def load_shared_deriver(directory=SHARED_DIR):
+    """
+    Memory-maps the exported lookup index, or returns None when not exported.
+    """
+    return Feature_Deriver.load(directory)
+
+
+def _memory_status():
+    # Values of /proc/self/smaps_rollup in MB (Linux only)
+    status = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                status[parts[0].rstrip(":")] = int(parts[1]) / 1024
+    return status
+
+
+def _worker(mode, directory, model_path, data_path, ready, release, results):
+    before = _memory_status()
+    if mode == "shared":
+        predictor = Fast_Predictor.load(directory, mmap_mode="r")
+        X = np.zeros((64, len(predictor.features)), dtype=np.float32)
+        predictor.predict_batch(X)
+    else:
+        # Historical per-worker loading: private model object and reference frame
+        model = load(model_path)
+        reference_data = pd.read_csv(data_path, index_col=0).drop(columns=["Price", "Id"])
+        model.predict(reference_data.iloc[:64])
+    ready.wait()
+    after = _memory_status()
+    private = lambda s: s["Private_Clean"] + s["Private_Dirty"]
+    results.put({"private_mb": private(after) - private(before), "pss_mb": after["Pss"]})
+    release.wait()
+
+
+def measure_workers(
+    n_workers=4,
+    mode="shared",
+    directory=SHARED_DIR,
+    model_path="./model/model_Hussain.joblib",
+    data_path="./preprocessing/ED.csv",
+):
+    """
+    Loads the serving state in `n_workers` concurrent processes and reports their memory.
+
+    Args:
+    - n_workers (int): Number of worker processes.
+    - mode (str): "shared" memory-maps the exported arrays, "private" loads joblib model and `ED.csv`.
+
+    Returns:
+    - dict: Mean private MB added per worker and the summed PSS over all workers.
+    """
+    context = multiprocessing.get_context("spawn")
+    ready = context.Barrier(n_workers + 1)
+    release = context.Event()
+    results = context.Queue()
+    workers = [
+        context.Process(
+            target=_worker,
+            args=(mode, directory, model_path, data_path, ready, release, results),
+        )
+        for _ in range(n_workers)
+    ]
+    for process in workers:
+        process.start()
+    ready.wait()
+    reports = [results.get() for _ in workers]
+    release.set()
+    for process in workers:
+        process.join()
+    return {
+        "mode": mode,
+        "workers": n_workers,
+        "private_mb_per_worker": float(np.mean([r["private_mb"] for r in reports])),
+        "total_pss_mb": float(np.sum([r["pss_mb"] for r in reports])),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Shared memory-mapped serving arrays")
+    parser.add_argument("command", choices=["export", "measure"])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--model", default="./model/model_Hussain.joblib")
+    parser.add_argument("--data", default="./preprocessing/ED.csv", help="Training dataset of the model")
+    parser.add_argument("--quantiles", default=QUANTILE_MODEL_PATH)
+    parser.add_argument("--target-index", help="Target encoder table of a target-encoded model")
+    parser.add_argument("--no-surrogate", action="store_true", help="Do not distill the preview surrogate")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        export_shared_model(
+            args.model,
+            args.data,
+            quantile_model_path=args.quantiles,
+            surrogate=not args.no_surrogate,
+            target_index=args.target_index,
+        )
+        print(f"Exported shared arrays to {SHARED_DIR}")
+        with open(os.path.join(SHARED_DIR, "manifest.json")) as f:
+            fidelity = json.load(f).get("surrogate")
+        if fidelity:
+            print(
+                f"Surrogate: {fidelity['median_deviation_pct']:.2f}% median / "
+                f"{fidelity['p95_deviation_pct']:.2f}% p95 deviation, {fidelity['speedup']:.1f}x faster"
+            )
+    else:
+        for mode in ("private", "shared"):
+            for n in (1, args.workers):
+                print(measure_workers(n, mode))
@@ -0,0 +1,170 @@
+"""
+This module distills the served model into a small surrogate for interactive previews.
+
+The what-if chart rescores the submitted property over a whole grid on every widget change, with the full
+3000-tree model of `Model1`. A preview does not need that precision: the surrogate is a CatBoost model of
+100 trees trained to reproduce the full model's log-price (not the observed prices), so it learns the
+teacher's function with a thirtieth of the trees.
+
+The distillation set is the training reference rows plus perturbed copies in which one input feature is
+replaced by a value drawn from its training distribution, and the derived features are recomputed. That
+covers the "one input varies" rows the what-if chart asks for, not only the listings seen in training.
+
+The surrogate is saved as a `Fast_Predictor` in `<export>/surrogate` (same scaling arrays as the full
+model) by `export_shared_model`, with its fidelity and speedup in the manifest. The Streamlit what-if panel
+uses it when present; the price quote of the input form always comes from the full model.
+
+Key Components:
+---------------
+1. distillation_set(reference_data, deriver, n_perturbed, seed):
+   - Reference rows and one-feature perturbations, derived features recomputed.
+
+2. distill(teacher, deriver, reference_data, params):
+   - Trains the surrogate on the teacher's predictions; returns it with its report.
+
+3. fidelity_report(teacher, surrogate, X):
+   - Deviation from the teacher (absolute and relative) on held-out rows and the speedup per call.
+
+
+Usage:
+------
+surrogate, report = distill(predictor, deriver, reference_data)
+surrogate.save("./model/shared/surrogate")
+
+Run `python -m Predict.surrogate` from the repository root to distill the exported model and print the report.
+"""
+
+import time
+
+import numpy as np
+from catboost import CatBoostRegressor
+
+from Predict.fast_predictor import Fast_Predictor, Tree_Arrays
+from Predict.resources import current
+from preprocessing.schema import INPUT_FEATURES
+
+SURROGATE_DIR = "surrogate"
+
+# Few deep trees: the target is the teacher's output, not noisy prices (on ED.csv about 1.5% median
+# and 5% p95 deviation from the full model)
+SURROGATE_PARAMS = {
+    "iterations": 100,
+    "depth": 8,
+    "learning_rate": 0.3,
+    "l2_leaf_reg": 1,
+    "loss_function": "RMSE",
+    "random_seed": 42,
+    "logging_level": "Silent",
+    "allow_writing_files": False,
+}
+
+
+def distillation_set(reference_data, deriver, n_perturbed=100_000, seed=42):
+    """
+    Builds the rows the surrogate is trained on.
+
+    Args:
+    - reference_data (pd.DataFrame): Training features in model order.
+    - deriver (Feature_Deriver): Recomputes the derived features of the perturbed rows.
+    - n_perturbed (int): Number of perturbed copies.
+    - seed (int): Random seed.
+
+    Returns:
+    - ndarray[float32], shape (n, F): Raw rows in `reference_data.columns` order.
+    """
+    features = list(reference_data.columns)
+    raw = reference_data.to_numpy(dtype=np.float32)
+    rng = np.random.default_rng(seed)
+    perturbed = raw[rng.integers(0, len(raw), n_perturbed)]
+    # One input feature per copy takes the value of another training row
+    inputs = np.array([features.index(name) for name in INPUT_FEATURES if name in features])
+    columns = inputs[rng.integers(0, len(inputs), n_perturbed)]
+    perturbed[np.arange(n_perturbed), columns] = raw[rng.integers(0, len(raw), n_perturbed), columns]
+    deriver.derive_matrix(perturbed, features)
+    return np.concatenate([raw, perturbed])
+
+
+def fidelity_report(teacher, surrogate, X, batch_size=40, repeat=200):
+    """
+    Compares the surrogate with the teacher on raw rows `X` (not used for training).
+
+    Args:
+    - teacher (Fast_Predictor): The full model.
+    - surrogate (Fast_Predictor): The distilled model.
+    - X (ndarray[float32]): Held-out raw rows.
+    - batch_size (int): Rows per timed call (a what-if grid has up to 40).
+    - repeat (int): Timed calls per model.
+
+    Returns:
+    - dict: mae_eur, median/p95/max relative deviation in %, trees of both models, microseconds per
+      call of both models and the speedup.
+    """
+    full = teacher.predict_batch(X.copy())
+    fast = surrogate.predict_batch(X.copy())
+    deviation = np.abs(fast - full) / full * 100
+    report = {
+        "mae_eur": float(np.mean(np.abs(fast - full))),
+        "median_deviation_pct": float(np.median(deviation)),
+        "p95_deviation_pct": float(np.percentile(deviation, 95)),
+        "max_deviation_pct": float(deviation.max()),
+        "teacher_trees": int(teacher.trees.split_feature.shape[0]),
+        "surrogate_trees": int(surrogate.trees.split_feature.shape[0]),
+    }
+    batch = X[:batch_size]
+    for name, predictor in (("teacher", teacher), ("surrogate", surrogate)):
+        predictor.predict_batch(batch.copy())
+        start = time.perf_counter()
+        for _ in range(repeat):
+            predictor.predict_batch(batch.copy())
+        report[f"{name}_us"] = (time.perf_counter() - start) / repeat * 1e6
+    report["speedup"] = report["teacher_us"] / report["surrogate_us"]
+    return report
+
+
+def distill(teacher, deriver, reference_data, params=SURROGATE_PARAMS, n_perturbed=100_000, holdout=0.1):
+    """
+    Trains a surrogate reproducing the teacher's log-price.
+
+    Args:
+    - teacher (Fast_Predictor): The full model.
+    - deriver (Feature_Deriver): Lookup tables of the export.
+    - reference_data (pd.DataFrame): Training features in model order.
+    - params (dict): CatBoost parameters of the surrogate.
+    - n_perturbed (int): Perturbed rows added to the reference rows.
+    - holdout (float): Share of the rows kept aside for `fidelity_report`.
+
+    Returns:
+    - tuple(Fast_Predictor, dict): The surrogate and its fidelity report.
+    """
+    X = distillation_set(reference_data[teacher.features], deriver, n_perturbed)
+    order = np.random.default_rng(0).permutation(len(X))
+    n_holdout = int(len(X) * holdout)
+    X_fit, X_holdout = X[order[n_holdout:]], X[order[:n_holdout]]
+
+    # The surrogate learns on the teacher's scaled inputs, so it reuses the same scaling arrays
+    label = np.log1p(teacher.predict_batch(X_fit.copy()))
+    scaled = X_fit * teacher.scale + teacher.offset
+    model = CatBoostRegressor(**{**params, **current().catboost_params()})
+    model.fit(scaled, label)
+    surrogate = Fast_Predictor(
+        Tree_Arrays.from_catboost(model),
+        teacher.features,
+        np.array(teacher.scale, dtype=np.float32),
+        np.array(teacher.offset, dtype=np.float32),
+    )
+    return surrogate, fidelity_report(teacher, surrogate, X_holdout)
+
+
+if __name__ == "__main__":
+    import pandas as pd
+
+    from Predict.shared_model import SHARED_DIR, load_shared_deriver, load_shared_predictor
+
+    reference_data = pd.read_csv("./preprocessing/ED.csv", index_col=0).drop(columns=["Price", "Id"])
+    start = time.perf_counter()
+    surrogate, report = distill(
+        load_shared_predictor(SHARED_DIR), load_shared_deriver(SHARED_DIR), reference_data
+    )
+    print(f"Distilled in {time.perf_counter() - start:.1f} s")
+    for key, value in report.items():
+        print(f"{key}: {value:,.2f}")
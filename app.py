@@ -54,7 +54,14 @@ from preprocessing.cleaning_data import Cleaning
 from Predict.prediction import Prediction
 
 
-c = Cleaning()
+@st.cache_resource
+def load_reference():
+    """
+    Runs the preprocessing once per process instead of on every rerun.
+    """
+    return Cleaning().preprocess()
+
+
 Program = Prediction()
-reverse_mappings, reference_data, mappings = c.preprocess()
+reverse_mappings, reference_data, mappings = load_reference()
 Program.predict(reverse_mappings, reference_data, mappings)
@@ -3,14 +3,19 @@ import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
 import matplotlib.ticker as ticker
-import folium
-from folium.plugins import HeatMap
 from sklearn.preprocessing import LabelEncoder
 from catboost import CatBoostRegressor
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import mean_squared_error
-from sklearn.feature_selection import RFE
-from sklearn.linear_model import LinearRegression
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from preprocessing.features import bedrooms_per_area, Feature_Deriver
+from preprocessing.comparables import Comparables_Index
+from preprocessing.price_map import Price_Map
+from preprocessing.duplicates import drop_near_duplicates
+from preprocessing.feature_store import Feature_Store
 
 
 """
@@ -21,6 +26,9 @@ The script performs the following main tasks:
 1. **Reading Data**:
    - Reads a CSV file containing real estate data.
    - Removes duplicate rows to ensure data quality.
+   - Removes near-duplicate listings (the same property relisted with another ID or price) with
+     locality-sensitive hashing over locality, subtype, bedrooms, living area and coordinates
+     (`preprocessing/duplicates.py`).
 
 2. **Encoding Features**:
    - Encodes categorical columns such as 'Locality', 'Type', 'SubType', 'Muniplicity', and 'Region' into numeric formats for machine learning.
@@ -31,9 +39,20 @@ The script performs the following main tasks:
 
 3. **Dropping Features**:
    - Removes irrelevant or unnecessary features like 'Is_Furnished', 'Terrace_Area', 'Garden_Area', etc., to simplify the dataset.
+   - The model columns left in the saved dataset are selected automatically at training time
+     (`Model1.select_features`, see `Predict/feature_selection.py`).
 
 4. **Saving Processed Data**:
    - Saves the cleaned and encoded dataset as a CSV file.
+   - Builds the spatial comparables index from the `X`/`Y` coordinates kept aside during encoding
+     (`comparables_index.joblib`).
+   - Aggregates the observed prices per locality and per grid cell at several zoom levels for the
+     market map (`price_map.npz`; `python -m preprocessing.price_map` adds the model predictions).
+   - Emits the locality and subtype lookup index (`locality_index.npy`, `subtype_index.npy`) used by
+     serving and batch scoring to derive province, region, coast flag and province figures.
+   - Upserts the engineered rows into the feature store keyed by `Id` (`feature_store/`, see
+     `preprocessing/feature_store.py`): only new or changed listings are written, and serving looks
+     listings up in it by `Id`.
 
 Classes:
 --------
@@ -42,11 +61,11 @@ Data_cleaning:
 
     Methods:
     --------
-    __init__(link: str):
+    __init__(link: str, near_duplicates: bool = True):
         Initializes the class with the file path to the dataset.
 
     read_data() -> pd.DataFrame:
-        Reads the dataset from the specified file path and removes duplicate rows.
+        Reads the dataset from the specified file path and removes duplicate and near-duplicate rows.
 
     encoding() -> pd.DataFrame:
         Performs label encoding and feature removal on the dataset. 
@@ -70,14 +89,20 @@ Encoded = Program.save1()
 
 class Data_cleaning:
 
-    def __init__(self, link) -> None:
+    def __init__(self, link, near_duplicates=True) -> None:
         self.link = link
+        self.near_duplicates = near_duplicates
         pass
 
     def read_data(self):
         link = self.link
         Data = pd.read_csv(link, index_col=0)
         Data.drop_duplicates(inplace=True)
+        if self.near_duplicates:
+            # Relisted properties: same place, size and rooms, another ID or price
+            size = len(Data)
+            Data = drop_near_duplicates(Data)
+            print(f"Dropped {size - len(Data)} near-duplicate listings")
         self.Data = Data
         return Data
 
@@ -111,6 +136,8 @@ class Data_cleaning:
 
         # Label encoding 'Region' using pandas' factorize method
         df1["Region_encoded"] = pd.factorize(df1["Region"])[0]
+        # Keep the coordinates aside for the comparables index before they are discarded
+        self.Coordinates = df1[["Id", "X", "Y"]]
         df1.drop(
             ["Locality", "Type", "SubType", "Muniplicity", "Region"],
             axis=1,
@@ -146,15 +173,20 @@ class Data_cleaning:
 class Feature_Engineering:
     def __init__(self, DF) -> None:
         self.DF = DF
+        self._source = None
         pass
 
+    # The cleaned source dataset, read once for the coast, GDP and average features
+    def source(self):
+        if self._source is None:
+            self._source = pd.read_csv("Final_cleaned_Data.csv")
+        return self._source.copy()
+
     ## Is the property in a Locality on the coast?
     def is_locality_on_Coast(self):
         DF = self.DF
         # reading dataset that contains name of cities that are on coast
-        Data1 = pd.read_csv(
-            "Final_cleaned_Data.csv"
-        )
+        Data1 = self.source()
         coastal_municipalities = [
             "De Panne",
             "Koksijde",
@@ -215,9 +247,7 @@ class Feature_Engineering:
         # Convert GDP values to integers
         df["GDP"] = df["GDP"].astype(int)
 
-        Data1 = pd.read_csv(
-            "Final_cleaned_Data.csv"
-        )
+        Data1 = self.source()
         Data1 = Data1.rename(columns={"Muniplicity": "Province"})
         Data1 = pd.merge(Data1, df, on="Province", how="left")
 
@@ -247,9 +277,7 @@ class Feature_Engineering:
             "Avg_rent": [1205, 1013, 1013, 1000, 950, 950, 759, 759, 759, 759],
         }
         df2 = pd.DataFrame(data)
-        Data1 = pd.read_csv(
-            "Final_cleaned_Data.csv"
-        )
+        Data1 = self.source()
         Data1 = Data1.rename(columns={"Muniplicity": "Province"})
         Data1 = pd.merge(Data1, df2, on="Province", how="left")
 
@@ -294,7 +322,8 @@ class Feature_Engineering:
     def bedrooms_per_area(self):
         DF = self.Avg()
 
-        DF["Bedrooms_per_area"] = DF.Bedrooms / DF.Living_Area
+        # Shared with the serving path so both compute the same ratio
+        DF["Bedrooms_per_area"] = bedrooms_per_area(DF.Bedrooms, DF.Living_Area)
         self.DF = DF
         return self.DF
 
@@ -302,14 +331,38 @@ class Feature_Engineering:
     def Save(self):
         DF = self.bedrooms_per_area()
         DF.to_csv("ED.csv")
+        self.save_index(DF)
+        self.save_store(DF)
         return
 
+    # Incremental upsert of the new and changed listings into the feature store
+    def save_store(self, DF, directory="feature_store"):
+        stats = Feature_Store(directory).upsert(DF)
+        print(
+            f"Feature store: {stats['inserted']} new, {stats['updated']} changed, "
+            f"{stats['unchanged']} unchanged listings"
+        )
+        return stats
 
-link = (
-    "Final_cleaned_Data.csv"
-)
-Program = Data_cleaning(link)
-Encoded = Program.save1()
+    # Locality and subtype lookup index used by serving and batch scoring
+    def save_index(self, DF, directory="."):
+        Feature_Deriver.from_reference(DF).save(directory)
+        return
+
+
+if __name__ == "__main__":
+    link = (
+        "Final_cleaned_Data.csv"
+    )
+    Program = Data_cleaning(link)
+    Encoded = Program.save1()
+
+    DE = Feature_Engineering(Encoded)
+    DE.Save()
+
+    # Spatial index of comparable sales, loaded by the app at start
+    Listings = DE.DF.merge(Program.Coordinates, on="Id")
+    Comparables_Index.from_frame(Listings).save("comparables_index.joblib")
 
-DE = Feature_Engineering(Encoded)
-DE.Save()
+    # Precomputed price aggregates behind the market map
+    Price_Map.from_listings(Listings).save("price_map.npz")
@@ -0,0 +1,173 @@
+"""
+This module finds comparable sales around a property with a spatial index over the training listings.
+
+`Data_cleaning.encoding` used to drop the `X`/`Y` coordinates, so nothing could answer "which similar
+properties sold nearby?". The preprocessing pipeline now keeps them aside and builds a `Comparables_Index`:
+one KD-tree per subtype (so "same subtype" is a blocking key, not a filter after the search) over the
+listing coordinates projected to kilometers. Queries for a single property or a whole batch are grouped
+by subtype and answered with one vectorized KD-tree query per group.
+
+Key Components:
+---------------
+1. to_km(x, y):
+   - Projects longitude/latitude (`X`, `Y`) to an equirectangular kilometer grid centered on Belgium.
+
+2. Comparables_Index:
+   - `from_frame(data)`: Builds the index from listings holding Id, X, Y, Price, SubType_encoded and
+     Locality_encoded.
+   - `query(x, y, subtypes, k, radius_km)`: k nearest same-subtype listings within `radius_km`.
+   - `query_locality(localities, subtypes, k, radius_km)`: Same query from the locality centroid, for
+     inputs without coordinates (the Streamlit form).
+   - `comparables(rows, distances)`: Turns one query result row into a DataFrame for display.
+   - `save()` / `load()`: joblib persistence; the trees are pickled, so loading does not rebuild them.
+
+Usage:
+------
+index = Comparables_Index.from_frame(listings)
+index.save("comparables_index.joblib")
+rows, distances = Comparables_Index.load("comparables_index.joblib").query(x, y, subtypes, k=5, radius_km=3)
+"""
+
+import numpy as np
+import pandas as pd
+from joblib import dump, load
+from scipy.spatial import cKDTree
+
+# Kilometers per degree at the latitude of Belgium
+KM_PER_DEGREE_LAT = 110.574
+KM_PER_DEGREE_LON = 111.320 * np.cos(np.radians(50.5))
+
+
+def to_km(x, y):
+    """
+    Projects longitude (`X`) and latitude (`Y`) to kilometers.
+
+    Args:
+    - x (array-like): Longitudes in degrees.
+    - y (array-like): Latitudes in degrees.
+
+    Returns:
+    - ndarray (n, 2): Planar coordinates in kilometers.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    return np.column_stack([x * KM_PER_DEGREE_LON, y * KM_PER_DEGREE_LAT])
+
+
+class Comparables_Index:
+    """
+    Per-subtype KD-trees over the training listings.
+
+    Attributes:
+    - listings (pd.DataFrame): Id, Price, SubType_encoded, Locality_encoded, Living_Area, Bedrooms, X, Y
+      of the indexed listings, in row order.
+    - trees (dict[int, cKDTree]): One tree per subtype.
+    - members (dict[int, ndarray]): Listing rows of each tree, mapping tree positions back to `listings`.
+    - centroids (ndarray (n_localities, 2)): Mean kilometer coordinates per `Locality_encoded`.
+    """
+
+    display_columns = ["Id", "Price", "Living_Area", "Bedrooms", "SubType_encoded", "Locality_encoded"]
+
+    def __init__(self, listings, trees, members, centroids):
+        self.listings = listings
+        self.trees = trees
+        self.members = members
+        self.centroids = centroids
+
+    @classmethod
+    def from_frame(cls, data):
+        """
+        Builds the index from listings with coordinates; rows without coordinates are skipped.
+
+        Args:
+        - data (pd.DataFrame): Listings with at least Id, X, Y, Price, SubType_encoded, Locality_encoded.
+
+        Returns:
+        - Comparables_Index: The index.
+        """
+        columns = [c for c in cls.display_columns + ["X", "Y"] if c in data.columns]
+        listings = data.dropna(subset=["X", "Y"])[columns].reset_index(drop=True)
+        points = to_km(listings["X"], listings["Y"])
+        subtypes = listings["SubType_encoded"].to_numpy(dtype=np.int64)
+
+        trees, members = {}, {}
+        for subtype in np.unique(subtypes):
+            rows = np.flatnonzero(subtypes == subtype)
+            trees[int(subtype)] = cKDTree(points[rows])
+            members[int(subtype)] = rows
+
+        localities = listings["Locality_encoded"].to_numpy(dtype=np.int64)
+        counts = np.bincount(localities)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            centroids = np.column_stack(
+                [np.bincount(localities, weights=points[:, i]) / counts for i in range(2)]
+            )
+        return cls(listings, trees, members, centroids)
+
+    def save(self, path):
+        dump(self, path)
+
+    @staticmethod
+    def load(path):
+        return load(path)
+
+    def _query_points(self, points, subtypes, k, radius_km):
+        # Group the queries by subtype so each tree answers its whole group in one call
+        rows = np.full((len(points), k), -1, dtype=np.int64)
+        distances = np.full((len(points), k), np.inf)
+        subtypes = np.asarray(subtypes, dtype=np.int64)
+        valid = ~np.isnan(points).any(axis=1)
+        for subtype in np.unique(subtypes[valid]):
+            tree = self.trees.get(int(subtype))
+            if tree is None:
+                continue
+            group = np.flatnonzero(valid & (subtypes == subtype))
+            dist, pos = tree.query(points[group], k=k, distance_upper_bound=radius_km)
+            dist, pos = dist.reshape(len(group), k), pos.reshape(len(group), k)
+            found = np.isfinite(dist)
+            members = self.members[int(subtype)]
+            rows[group] = np.where(found, members[np.minimum(pos, len(members) - 1)], -1)
+            distances[group] = dist
+        return rows, distances
+
+    def query(self, x, y, subtypes, k=5, radius_km=5.0):
+        """
+        Finds the k nearest comparable listings of the same subtype within `radius_km`.
+
+        Args:
+        - x, y (array-like): Longitudes and latitudes of the query properties.
+        - subtypes (array-like): `SubType_encoded` of the query properties.
+        - k (int): Maximum number of comparables per property.
+        - radius_km (float): Search radius in kilometers.
+
+        Returns:
+        - tuple(ndarray, ndarray): Listing rows (n, k), -1 where fewer than k were found, and
+          the distances in kilometers (n, k), inf for missing entries.
+        """
+        return self._query_points(to_km(x, y), subtypes, k, radius_km)
+
+    def query_locality(self, localities, subtypes, k=5, radius_km=5.0):
+        """
+        Same as `query()` but searches around the centroid of each `Locality_encoded`.
+        """
+        localities = np.asarray(localities, dtype=np.int64)
+        known = (localities >= 0) & (localities < len(self.centroids))
+        points = np.full((len(localities), 2), np.nan)
+        points[known] = self.centroids[localities[known]]
+        return self._query_points(points, subtypes, k, radius_km)
+
+    def comparables(self, rows, distances):
+        """
+        Returns the comparables of one query as a DataFrame sorted by distance.
+
+        Args:
+        - rows (ndarray (k,)): One row of the `rows` result.
+        - distances (ndarray (k,)): The matching row of the `distances` result.
+
+        Returns:
+        - pd.DataFrame: Comparable listings with a `Distance_km` column.
+        """
+        found = rows >= 0
+        result = self.listings.iloc[rows[found]].drop(columns=["X", "Y"]).copy()
+        result["Distance_km"] = distances[found].round(2)
+        return result.reset_index(drop=True)
@@ -0,0 +1,133 @@
+"""
+This module holds the memory-compact dtypes of the engineered dataset (`ED.csv` and the feature store).
+
+Read with the pandas defaults, every column of `ED.csv` is int64 or float64 although most are binary flags,
+small counts or category codes: the 19 columns take 152 bytes a row where 40 are enough. `DTYPE_PLAN`
+gives each column the smallest type its values need:
+
+- int8 for the binary flags, `State`, the counts and the small category codes;
+- int16 for `Living_Area` and `Locality_encoded`;
+- int32 for `Id` and `Price`;
+- float32 for the continuous features (province figures, ratios, target encodings), which is also the
+  precision CatBoost and `Fast_Predictor` compute in.
+
+`read_csv_planned` applies the plan chunk by chunk while reading, so the int64 frame is never held in full.
+The plan is checked against the values rather than trusted: `pd.read_csv(dtype=np.int8)` silently wraps
+300 to 44. A column holding NaN, fractional values or values outside its planned range is widened (to
+float32 or to the next integer type) instead, so a larger scrape can never corrupt the data.
+
+Key Components:
+---------------
+1. DTYPE_PLAN:
+   - Planned dtype per column; columns not in the plan keep integers and get float32 for floats.
+
+2. planned_dtype(values, dtype):
+   - The planned dtype, or the widened one the values need.
+
+3. apply_plan(frame, plan) / read_csv_planned(path, plan, chunksize):
+   - Casts a frame to the plan / reads a CSV with the plan applied per chunk.
+
+4. frame_nbytes(frame):
+   - Bytes held by a frame, its index included.
+
+Usage:
+------
+Data = read_csv_planned("./preprocessing/ED.csv")
+"""
+
+import numpy as np
+import pandas as pd
+
+from preprocessing.schema import FLAGS
+from preprocessing.target_encoding import TARGET_COLUMNS
+
+DTYPE_PLAN = {
+    "Id": np.int32,
+    "Price": np.int32,
+    **{column: np.int8 for column in FLAGS},
+    "State": np.int8,
+    "Bedrooms": np.int8,
+    "Facades": np.int8,
+    "SubType_encoded": np.int8,
+    "Prov_encoded": np.int8,
+    "Region_encoded": np.int8,
+    "Living_Area": np.int16,
+    "Locality_encoded": np.int16,
+    "GDP": np.float32,
+    "Avg_rent": np.float32,
+    "Avg price": np.float32,
+    "Bedrooms_per_area": np.float32,
+    **{column: np.float32 for column in TARGET_COLUMNS},
+}
+
+INTEGER_TYPES = (np.int8, np.int16, np.int32, np.int64)
+
+
+def planned_dtype(values, dtype):
+    """
+    Returns the dtype a column gets: the planned one when the values fit it, a wider one otherwise.
+
+    Args:
+    - values (pd.Series): Column values.
+    - dtype (type or None): Planned dtype, None for a column outside the plan.
+
+    Returns:
+    - np.dtype: The dtype to cast to.
+    """
+    if dtype is None:
+        return np.dtype(np.float32) if values.dtype.kind == "f" else values.dtype
+    dtype = np.dtype(dtype)
+    if dtype.kind != "i":
+        return dtype
+    if values.dtype.kind == "f" and (values.isna().any() or not (values % 1 == 0).all()):
+        return np.dtype(np.float32)
+    if not len(values):
+        return dtype
+    low, high = values.min(), values.max()
+    for candidate in INTEGER_TYPES[INTEGER_TYPES.index(dtype.type) :]:
+        if np.iinfo(candidate).min <= low and high <= np.iinfo(candidate).max:
+            return np.dtype(candidate)
+    return np.dtype(np.float64)
+
+
+def apply_plan(frame, plan=DTYPE_PLAN):
+    """
+    Casts the columns of `frame` to the plan (widened where the values need it).
+
+    Returns:
+    - pd.DataFrame: The cast frame (`frame` itself when nothing changes).
+    """
+    dtypes = {column: planned_dtype(frame[column], plan.get(column)) for column in frame.columns}
+    changed = {column: dtype for column, dtype in dtypes.items() if frame[column].dtype != dtype}
+    return frame.astype(changed) if changed else frame
+
+
+def read_csv_planned(path, plan=DTYPE_PLAN, chunksize=100_000, index_col=0):
+    """
+    Reads a CSV with the plan applied to every chunk, then concatenated.
+
+    Chunks widened differently are brought to their common dtype by the concatenation. A default
+    0..n-1 index (the first column of `ED.csv`) becomes a RangeIndex, which holds no array.
+
+    Args:
+    - path (str): CSV file.
+    - plan (dict): Planned dtype per column.
+    - chunksize (int): Rows read at once, at default dtypes.
+    - index_col (int or None): Index column, as for `pd.read_csv`.
+
+    Returns:
+    - pd.DataFrame: The planned frame.
+    """
+    with pd.read_csv(path, index_col=index_col, chunksize=chunksize) as reader:
+        data = pd.concat([apply_plan(chunk, plan) for chunk in reader])
+    if data.index.equals(pd.RangeIndex(len(data))):
+        data.index = pd.RangeIndex(len(data))
+    return data
+
+
+def frame_nbytes(frame):
+    """
+    Returns the bytes held by a frame or series, its index included.
+    """
+    usage = frame.memory_usage(index=True, deep=True)
+    return int(usage.sum() if isinstance(usage, pd.Series) else usage)
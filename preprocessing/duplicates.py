@@ -0,0 +1,238 @@
+"""
+This module finds near-duplicate listings: the same property scraped twice with another ID or a new price.
+
+`drop_duplicates` only removes rows that are identical in every column, so a relisted property survives
+and is counted twice in training. Comparing every pair of listings would be quadratic. Instead every row
+is hashed into `n_tables` hash tables with locality-sensitive hashing:
+
+- exact blocking keys: locality, subtype and bedrooms must match (names folded: case, accents and
+  punctuation ignored);
+- the living area (log scale) and the coordinates (kilometers) are quantized on grids shifted by a
+  random offset per table, so two close values share a bucket in at least one table with high
+  probability, and two distant ones never do.
+
+Only rows sharing a bucket are compared, against explicit tolerances (relative living area difference,
+distance in km). A row without coordinates is never a duplicate: locality, subtype, bedrooms and area
+alone match distinct apartments of one building or street. The confirmed pairs form a graph whose
+connected components are the duplicate groups; the first row of every group is kept. Pairs chain
+transitively, so a component can span more than the tolerances: its rows that are not within them of
+the kept row are kept too, each on its own. The work is linear in the number of rows: hashing is a few
+vectorized operations per table and buckets hold a handful of rows (large buckets are compared against
+their first row only).
+
+The price and the ID are deliberately not hashed: they are exactly what changes when a property is
+relisted.
+
+Key Components:
+---------------
+1. near_duplicate_groups(data, ...):
+   - Group label per row (every row of a group is a near-duplicate of its first row).
+
+2. drop_near_duplicates(data, ...):
+   - The rows to keep, first row of every group.
+
+3. benchmark(sizes):
+   - Synthetic listings with injected relistings: run time per size and share of relistings found.
+
+Usage:
+------
+Data = drop_near_duplicates(Data)
+
+Run `python -m preprocessing.duplicates` from the repository root to print the benchmark.
+"""
+
+import time
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.sparse.csgraph import connected_components
+
+from preprocessing.comparables import to_km
+from preprocessing.localities import fold
+
+# Buckets larger than this are compared against their first row only, which keeps the work linear
+MAX_BUCKET = 32
+
+
+def _codes(values):
+    # Dense integer codes of a column, NaN as its own code; text is folded first ("Sélange" == "selange ")
+    codes, uniques = pd.factorize(pd.Series(values), use_na_sentinel=False)
+    if uniques.dtype == object:
+        folded = [fold(value) if isinstance(value, str) else value for value in uniques]
+        codes = pd.factorize(pd.Series(folded, dtype=object), use_na_sentinel=False)[0][codes]
+    return codes.astype(np.int64)
+
+
+def near_duplicate_groups(
+    data,
+    area_tolerance=0.05,
+    distance_km=0.1,
+    n_tables=4,
+    seed=0,
+    block_columns=("Locality", "SubType", "Bedrooms"),
+):
+    """
+    Labels groups of near-duplicate listings.
+
+    Two rows are near-duplicates when their blocking columns are equal, their living areas differ by
+    at most `area_tolerance` (relative) and their coordinates by at most `distance_km`; rows without
+    coordinates never match. Every row of a group is within these tolerances of the group's first row.
+
+    Args:
+    - data (pd.DataFrame): Listings with the `block_columns`, Living_Area, X (longitude) and Y (latitude).
+    - area_tolerance (float): Largest relative living area difference.
+    - distance_km (float): Largest distance between the two listings.
+    - n_tables (int): Number of hash tables; more tables find more borderline pairs.
+    - seed (int): Seed of the random grid offsets.
+    - block_columns (tuple[str]): Columns that must match exactly.
+
+    Returns:
+    - ndarray[int64]: Group label per row; rows without near-duplicate have a group of their own.
+    """
+    n = len(data)
+    if n == 0:
+        return np.zeros(0, dtype=np.int64)
+    block = np.zeros(n, dtype=np.int64)
+    for column in block_columns:
+        if column in data:
+            block = _codes(block * (int(block.max()) + 1) + _codes(data[column]))
+
+    area = data["Living_Area"].to_numpy(dtype=np.float64)
+    log_area = np.log(np.where(area > 0, area, np.nan))
+    points = to_km(data["X"], data["Y"])
+    has_point = ~np.isnan(points).any(axis=1)
+
+    # Cells twice the tolerance wide: close pairs are split by a cell border in few tables
+    area_width = 2 * np.log1p(area_tolerance)
+    point_width = 2 * distance_km
+    rng = np.random.default_rng(seed)
+    rows, cols = [], []
+    for _ in range(n_tables):
+        area_cell = np.floor(log_area / area_width + rng.random())
+        point_cell = np.floor(points / point_width + rng.random(2))
+        key = np.column_stack(
+            [
+                block,
+                np.nan_to_num(area_cell, nan=-(2**40)),
+                np.where(has_point, point_cell[:, 0], -(2**40)),
+                np.where(has_point, point_cell[:, 1], -(2**40)),
+            ]
+        ).astype(np.int64)
+        _, bucket = np.unique(key, axis=0, return_inverse=True)
+        bucket = bucket.reshape(-1)
+
+        # Rows ordered by bucket; compare each row with the following rows of its bucket
+        order = np.argsort(bucket, kind="stable")
+        sorted_bucket = bucket[order]
+        starts = np.flatnonzero(np.r_[True, sorted_bucket[1:] != sorted_bucket[:-1]])
+        sizes = np.diff(np.r_[starts, n])
+        position = np.arange(n) - np.repeat(starts, sizes)
+        size = np.repeat(sizes, sizes)
+        for offset in range(1, MAX_BUCKET):
+            pair = np.flatnonzero((position + offset < size) & (size <= MAX_BUCKET))
+            if len(pair) == 0:
+                break
+            rows.append(order[pair])
+            cols.append(order[pair + offset])
+        # Large buckets: every row against the bucket's first row
+        large = np.flatnonzero((size > MAX_BUCKET) & (position > 0))
+        rows.append(order[large - position[large]])
+        cols.append(order[large])
+
+    rows = np.concatenate(rows)
+    cols = np.concatenate(cols)
+    def within(rows, cols):
+        # Pairs within every tolerance; NaN coordinates or areas compare False
+        same_area = np.abs(log_area[rows] - log_area[cols]) <= np.log1p(area_tolerance)
+        distance = np.hypot(*(points[rows] - points[cols]).T)
+        return same_area & (distance <= distance_km) & (block[rows] == block[cols])
+
+    # Verify the candidate pairs against the tolerances
+    keep = within(rows, cols)
+    graph = sparse.coo_matrix(
+        (np.ones(int(keep.sum()), dtype=np.int8), (rows[keep], cols[keep])), shape=(n, n)
+    )
+    n_labels, labels = connected_components(graph, directed=False)
+
+    # A chain of close pairs can drift away from the kept (first) row: such rows leave the group
+    index = np.arange(n)
+    first = np.full(n_labels, n)
+    np.minimum.at(first, labels, index)
+    kept = first[labels]
+    stray = (index != kept) & ~within(index, kept)
+    labels[stray] = n_labels + np.arange(int(stray.sum()))
+    return labels.astype(np.int64)
+
+
+def drop_near_duplicates(data, **kwargs):
+    """
+    Keeps the first row of every group of near-duplicate listings.
+
+    Args:
+    - data (pd.DataFrame): Listings (see `near_duplicate_groups`).
+    - **kwargs: Tolerances passed to `near_duplicate_groups`.
+
+    Returns:
+    - pd.DataFrame: The deduplicated listings, in their original order.
+    """
+    labels = near_duplicate_groups(data, **kwargs)
+    first = ~pd.Series(labels).duplicated().to_numpy()
+    return data[first]
+
+
+def _synthetic_listings(n, duplicate_share, rng):
+    # Listings spread over Belgium with a share of relistings: new ID and price, area and position jitter
+    n_original = int(n / (1 + duplicate_share))
+    data = pd.DataFrame(
+        {
+            "Id": np.arange(n_original),
+            "Locality": rng.integers(0, 800, n_original),
+            "SubType": rng.integers(0, 20, n_original),
+            "Bedrooms": rng.integers(0, 6, n_original),
+            "Living_Area": rng.integers(30, 400, n_original).astype(float),
+            "X": rng.uniform(2.5, 6.4, n_original),
+            "Y": rng.uniform(49.5, 51.5, n_original),
+            "Price": rng.integers(100_000, 900_000, n_original).astype(float),
+        }
+    )
+    copies = data.sample(n - n_original, replace=True, random_state=int(rng.integers(1 << 31)))
+    copies = copies.assign(
+        Id=np.arange(n_original, n),
+        Living_Area=copies["Living_Area"] * rng.uniform(0.99, 1.01, len(copies)),
+        X=copies["X"] + rng.normal(0, 0.0002, len(copies)),
+        Y=copies["Y"] + rng.normal(0, 0.0002, len(copies)),
+        Price=copies["Price"] * rng.uniform(0.95, 1.05, len(copies)),
+    )
+    return pd.concat([data, copies], ignore_index=True), n_original
+
+
+def benchmark(sizes=(100_000, 300_000, 1_000_000), duplicate_share=0.1):
+    """
+    Times the detection on synthetic listings and checks how many relistings it removes.
+
+    Returns:
+    - list[dict]: Per size: rows, seconds, microseconds per row and rows kept vs originals.
+    """
+    rng = np.random.default_rng(0)
+    report = []
+    for n in sizes:
+        data, n_original = _synthetic_listings(n, duplicate_share, rng)
+        start = time.perf_counter()
+        kept = drop_near_duplicates(data)
+        seconds = time.perf_counter() - start
+        report.append(
+            {
+                "rows": n,
+                "seconds": seconds,
+                "us_per_row": seconds / n * 1e6,
+                "kept": len(kept),
+                "originals": n_original,
+            }
+        )
+    return report
+
+
+if __name__ == "__main__":
+    for line in benchmark():
+        print(line)
@@ -0,0 +1,439 @@
+"""
+This module keeps the engineered features of every listing in a local columnar store keyed by `Id`.
+
+The pipeline (`Data_cleaning.save1` -> `Feature_Engineering.Save`) rewrote `ED.csv` from scratch on each
+run, and nothing downstream could read one listing without parsing the whole file. `Feature_Store` keeps
+the rows as Parquet segments plus a sorted index of ids:
+
+- the base segments are `n_buckets` hash buckets of `Id` (`bucket-<b>-v<version>.parquet`);
+- `upsert(frame)` hashes every incoming row (`pd.util.hash_pandas_object`), compares the hashes with the
+  index and writes only the new or changed rows, as one delta segment. A daily scrape costs the size of
+  what changed, plus an in-memory update of the id index (16 bytes per listing);
+- `lookup(ids)` is a binary search in the index and a gather from the (cached) column arrays of the
+  segments holding the rows;
+- `scan()` reads every segment once and keeps the live version of each row, sorted by `Id`;
+- `compact()` folds the deltas back into the buckets, rewriting only the buckets they touched. It runs
+  automatically once the delta rows exceed `compact_ratio` of the store.
+
+Every write is a new segment plus a new index file, made visible by atomically replacing
+`manifest.json`; a reader never sees a half-written state. There is a single writer (the pipeline).
+
+Key Components:
+---------------
+1. row_hash(frame, columns):
+   - Content hash of every row, used to detect changed listings.
+
+2. Feature_Store:
+   - `upsert(frame)`, `delete(ids)`, `lookup(ids)`, `scan()`, `compact()`, `refresh()`.
+
+3. benchmark(n_rows, change_rate):
+   - Initial load, daily upsert, lookup and scan timings on synthetic listings.
+
+Usage:
+------
+store = Feature_Store("./preprocessing/feature_store")
+store.upsert(engineered_frame)          # only new or changed listings are written
+store.lookup([20316087, 20316069])      # point lookups for serving
+Data = store.scan()                     # full scan for training (`Data_Prep` accepts the directory)
+
+Run `python -m preprocessing.feature_store` from the repository root to print the benchmark.
+"""
+
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+STORE_DIR = "./preprocessing/feature_store"
+
+KEY = "Id"
+
+
+def row_hash(frame, columns):
+    """
+    Returns the uint64 content hash of every row of `frame[columns]`.
+    """
+    return pd.util.hash_pandas_object(frame[columns], index=False).to_numpy(dtype=np.uint64)
+
+
+class Feature_Store:
+    """
+    Columnar store of listing features keyed by `Id`.
+
+    Attributes:
+    - directory (str): Store directory.
+    - columns (list[str] or None): Stored columns besides `Id`, fixed by the first upsert.
+    - ids (ndarray[int64]): Sorted ids of the index.
+    - hashes (ndarray[uint64]): Row hash of every id.
+    - segment (ndarray[int32]): Segment holding the live row of every id (-1 for a deleted id).
+    - row (ndarray[int64]): Row of every id in its segment.
+    """
+
+    def __init__(self, directory=STORE_DIR, n_buckets=16, compact_ratio=0.2):
+        """
+        Args:
+        - directory (str): Store directory, created on the first upsert.
+        - n_buckets (int): Hash buckets of a new store (an existing store keeps its own).
+        - compact_ratio (float): Share of delta rows beyond which `upsert` compacts.
+        """
+        self.directory = directory
+        self.compact_ratio = compact_ratio
+        self.n_buckets = n_buckets
+        self._tables = {}
+        self._columns = {}
+        self.version = None
+        self.refresh()
+
+    # ----- State -----
+
+    def refresh(self):
+        """
+        Reloads the manifest and the index when another process committed a new version.
+
+        Returns:
+        - bool: True when the store changed.
+        """
+        path = os.path.join(self.directory, "manifest.json")
+        if not os.path.exists(path):
+            if self.version is None:
+                self._set_state({"version": 0, "columns": None, "n_buckets": self.n_buckets, "segments": []})
+            return False
+        with open(path) as f:
+            manifest = json.load(f)
+        if manifest["version"] == self.version:
+            return False
+        with np.load(os.path.join(self.directory, manifest["index"])) as index:
+            arrays = {name: index[name] for name in ("ids", "hashes", "segment", "row")}
+        self._set_state(manifest, **arrays)
+        return True
+
+    def _set_state(self, manifest, ids=None, hashes=None, segment=None, row=None):
+        self.version = manifest["version"]
+        self.columns = manifest["columns"]
+        self.n_buckets = manifest["n_buckets"]
+        self.segments = list(manifest["segments"])
+        self.ids = np.empty(0, dtype=np.int64) if ids is None else ids
+        self.hashes = np.empty(0, dtype=np.uint64) if hashes is None else hashes
+        self.segment = np.empty(0, dtype=np.int32) if segment is None else segment
+        self.row = np.empty(0, dtype=np.int64) if row is None else row
+        # Drop the cached segments that are no longer part of the store
+        self._tables = {name: table for name, table in self._tables.items() if name in self.segments}
+        self._columns = {name: arrays for name, arrays in self._columns.items() if name in self.segments}
+
+    def _commit(self, segments, ids, hashes, segment, row):
+        # New index file, then the manifest pointing at it; files of older versions are removed last
+        version = self.version + 1
+        index_name = f"index-{version:06d}.npz"
+        np.savez(os.path.join(self.directory, index_name), ids=ids, hashes=hashes, segment=segment, row=row)
+        manifest = {
+            "version": version,
+            "columns": self.columns,
+            "n_buckets": self.n_buckets,
+            "segments": segments,
+            "index": index_name,
+            "rows": int((segment >= 0).sum()),
+        }
+        tmp = os.path.join(self.directory, "manifest.json.tmp")
+        with open(tmp, "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp, os.path.join(self.directory, "manifest.json"))
+        self._set_state(manifest, ids, hashes, segment, row)
+        keep = set(segments) | {index_name, "manifest.json"}
+        for name in os.listdir(self.directory):
+            if name not in keep:
+                os.remove(os.path.join(self.directory, name))
+
+    def __len__(self):
+        return int((self.segment >= 0).sum())
+
+    def delta_rows(self):
+        """
+        Returns the number of live rows stored in delta segments.
+        """
+        deltas = [i for i, name in enumerate(self.segments) if name.startswith("delta-")]
+        return int(np.isin(self.segment, deltas).sum())
+
+    def bucket(self, ids):
+        """
+        Returns the hash bucket of every id (Fibonacci hashing spreads consecutive ids).
+        """
+        mixed = np.asarray(ids, dtype=np.int64).view(np.uint64) * np.uint64(0x9E3779B97F4A7C15)
+        return ((mixed >> np.uint64(32)) % np.uint64(self.n_buckets)).astype(np.int64)
+
+    def _table(self, index):
+        name = self.segments[index]
+        if name not in self._tables:
+            self._tables[name] = pq.read_table(os.path.join(self.directory, name), memory_map=True)
+        return self._tables[name]
+
+    def _arrays(self, index):
+        # Columns of a segment as NumPy arrays, for point lookups without an Arrow -> pandas conversion
+        name = self.segments[index]
+        if name not in self._columns:
+            table = self._table(index)
+            self._columns[name] = {column: table.column(column).to_numpy() for column in table.column_names}
+        return self._columns[name]
+
+    def _locate(self, ids):
+        # Index position of every id and whether it is live in the store
+        ids = np.asarray(ids, dtype=np.int64)
+        position = np.searchsorted(self.ids, ids)
+        inside = position < len(self.ids)
+        found = np.zeros(len(ids), dtype=bool)
+        found[inside] = self.ids[position[inside]] == ids[inside]
+        found[found] = self.segment[position[found]] >= 0
+        return position, found
+
+    # ----- Writes -----
+
+    def upsert(self, frame):
+        """
+        Writes the new and changed rows of `frame` as one delta segment.
+
+        Args:
+        - frame (pd.DataFrame): Rows holding `Id` and the stored columns (the first upsert fixes them);
+          a repeated `Id` keeps its last row.
+
+        Returns:
+        - dict: received, inserted, updated and unchanged row counts, and whether the store compacted.
+        """
+        frame = frame.drop_duplicates(subset=KEY, keep="last")
+        if self.columns is None:
+            self.columns = [column for column in frame.columns if column != KEY]
+            os.makedirs(self.directory, exist_ok=True)
+        missing = set(self.columns) - set(frame.columns)
+        if missing:
+            raise ValueError(f"Missing feature store columns: {', '.join(sorted(missing))}")
+
+        ids = frame[KEY].to_numpy(dtype=np.int64)
+        hashes = row_hash(frame, self.columns)
+        position, found = self._locate(ids)
+        changed = found.copy()
+        changed[found] = self.hashes[position[found]] != hashes[found]
+        new = ~found
+        stats = {
+            "received": len(frame),
+            "inserted": int(new.sum()),
+            "updated": int(changed.sum()),
+            "unchanged": int((found & ~changed).sum()),
+            "compacted": False,
+        }
+        write = new | changed
+        if not write.any():
+            return stats
+
+        name = f"delta-{self.version + 1:06d}.parquet"
+        delta = frame.loc[write, [KEY] + self.columns].reset_index(drop=True)
+        pq.write_table(pa.Table.from_pandas(delta, preserve_index=False), os.path.join(self.directory, name))
+        segment_id = len(self.segments)
+        rows = np.arange(write.sum())
+
+        # Changed ids are updated in place, new ids inserted at their sorted position
+        hashes_ = self.hashes.copy()
+        segment_ = self.segment.copy()
+        row_ = self.row.copy()
+        updated = position[changed]
+        hashes_[updated] = hashes[changed]
+        segment_[updated] = segment_id
+        row_[updated] = rows[changed[write]]
+        # Ids deleted earlier are still in the index: they come back in place too
+        revived, revived_mask = self._revived(ids, new)
+        hashes_[revived] = hashes[revived_mask]
+        segment_[revived] = segment_id
+        row_[revived] = rows[revived_mask[write]]
+        inserted = new & ~revived_mask
+        order = np.argsort(ids[inserted], kind="stable")
+        at = np.searchsorted(self.ids, ids[inserted][order])
+        self._commit(
+            self.segments + [name],
+            np.insert(self.ids, at, ids[inserted][order]),
+            np.insert(hashes_, at, hashes[inserted][order]),
+            np.insert(segment_, at, np.full(len(at), segment_id, dtype=np.int32)),
+            np.insert(row_, at, rows[inserted[write]][order]),
+        )
+        if self.delta_rows() > self.compact_ratio * len(self):
+            self.compact()
+            stats["compacted"] = True
+        return stats
+
+    def _revived(self, ids, new):
+        # Positions of "new" ids that are tombstones in the index
+        position = np.searchsorted(self.ids, ids)
+        inside = new & (position < len(self.ids))
+        mask = np.zeros(len(ids), dtype=bool)
+        mask[inside] = self.ids[position[inside]] == ids[inside]
+        return position[mask], mask
+
+    def delete(self, ids):
+        """
+        Removes listings from the store (their rows disappear at the next compaction).
+
+        Returns:
+        - int: Number of ids deleted.
+        """
+        position, found = self._locate(np.unique(np.asarray(ids, dtype=np.int64)))
+        if not found.any():
+            return 0
+        segment = self.segment.copy()
+        segment[position[found]] = -1
+        self._commit(self.segments, self.ids, self.hashes, segment, self.row)
+        return int(found.sum())
+
+    def compact(self):
+        """
+        Folds the delta segments into the hash buckets, rewriting only the buckets they touched.
+        """
+        deltas = [i for i, name in enumerate(self.segments) if name.startswith("delta-")]
+        live = self.segment >= 0
+        # Buckets holding a delta row or a deleted row
+        touched = np.unique(self.bucket(self.ids[np.isin(self.segment, deltas) | ~live]))
+        buckets = self.bucket(self.ids)
+
+        segments, segment_ids = [], {}
+        new_segment = np.full(len(self.ids), -1, dtype=np.int32)
+        new_row = self.row.copy()
+        # Untouched buckets keep their file
+        for i, name in enumerate(self.segments):
+            if name.startswith("bucket-") and int(name.split("-")[1]) not in touched:
+                segment_ids[i] = len(segments)
+                segments.append(name)
+        keep = live & np.isin(self.segment, list(segment_ids))
+        new_segment[keep] = [segment_ids[s] for s in self.segment[keep]]
+
+        for b in touched:
+            members = np.flatnonzero(live & (buckets == b))
+            if not len(members):
+                continue
+            name = f"bucket-{b:04d}-v{self.version + 1:06d}.parquet"
+            table = pa.concat_tables(
+                [
+                    self._table(s).take(pa.array(self.row[members[self.segment[members] == s]]))
+                    for s in np.unique(self.segment[members])
+                ],
+                promote_options="permissive",
+            )
+            # Rows in id order inside the bucket
+            table = table.take(pa.array(np.argsort(table.column(KEY).to_numpy(), kind="stable")))
+            pq.write_table(table, os.path.join(self.directory, name))
+            new_segment[np.sort(members)] = len(segments)
+            new_row[np.sort(members)] = np.arange(len(members))
+            segments.append(name)
+
+        self._commit(segments, self.ids[live], self.hashes[live], new_segment[live], new_row[live])
+
+    # ----- Reads -----
+
+    def lookup(self, ids, columns=None):
+        """
+        Returns the stored rows of `ids`, in the requested order.
+
+        Args:
+        - ids (array-like): Listing ids.
+        - columns (list[str] or None): Columns to return, all by default.
+
+        Returns:
+        - pd.DataFrame: Indexed by `Id`; unknown ids are rows of NaN.
+        """
+        ids = np.atleast_1d(np.asarray(ids, dtype=np.int64))
+        columns = list(columns or self.columns or [])
+        position, found = self._locate(ids)
+        # A repeated id is gathered once and repeated by `reindex`
+        live = np.unique(position[found])
+        parts = []
+        for s in np.unique(self.segment[live]):
+            rows = self.row[live[self.segment[live] == s]]
+            arrays = self._arrays(s)
+            parts.append(pd.DataFrame({column: arrays[column][rows] for column in [KEY] + columns}))
+        if not parts:
+            return pd.DataFrame(index=pd.Index(ids, name=KEY), columns=columns, dtype=float)
+        data = parts[0] if len(parts) == 1 else pd.concat(parts)
+        return data.set_index(KEY).reindex(ids)
+
+    def scan(self, columns=None):
+        """
+        Returns every live row, sorted by `Id`.
+
+        Args:
+        - columns (list[str] or None): Columns to return besides `Id`, all by default.
+
+        Returns:
+        - pd.DataFrame: `Id` and the columns, one row per listing.
+        """
+        columns = list(columns or self.columns or [])
+        tables = []
+        for s in range(len(self.segments)):
+            rows = self.row[self.segment == s]
+            if len(rows):
+                tables.append(self._table(s).select([KEY] + columns).take(pa.array(np.sort(rows))))
+        if not tables:
+            return pd.DataFrame(columns=[KEY] + columns)
+        data = pa.concat_tables(tables, promote_options="permissive").to_pandas()
+        return data.sort_values(KEY, kind="stable").reset_index(drop=True)
+
+
+def benchmark(n_rows=1_000_000, change_rate=0.01, directory="./feature_store_benchmark"):
+    """
+    Times the store on synthetic listings: initial load, a daily upsert, point lookups and a full scan.
+
+    The daily upsert changes `change_rate` of the listings and adds as many new ones; its time should
+    follow the number of changes, not `n_rows`.
+
+    Returns:
+    - dict: Seconds per operation and the rows written by the daily upsert.
+    """
+    import shutil
+
+    shutil.rmtree(directory, ignore_errors=True)
+    rng = np.random.default_rng(0)
+    frame = pd.DataFrame(
+        {
+            KEY: rng.permutation(np.arange(10_000_000, 10_000_000 + n_rows)),
+            "Bedrooms": rng.integers(0, 8, n_rows),
+            "Living_Area": rng.integers(20, 400, n_rows),
+            "Locality_encoded": rng.integers(0, 800, n_rows),
+            "Avg_rent": rng.choice([759.0, 950.0, 1013.0, 1205.0], n_rows),
+            "Bedrooms_per_area": rng.random(n_rows),
+        }
+    )
+    report = {}
+    store = Feature_Store(directory)
+    start = time.perf_counter()
+    store.upsert(frame)
+    store.compact()
+    report["initial_load_s"] = time.perf_counter() - start
+
+    n_changes = int(n_rows * change_rate)
+    scrape = frame.sample(n_changes, random_state=1).copy()
+    scrape["Living_Area"] += 1
+    new = frame.sample(n_changes, random_state=2).copy()
+    new[KEY] = np.arange(20_000_000, 20_000_000 + n_changes)
+    daily = pd.concat([scrape, new, frame.sample(n_changes, random_state=3)])
+    start = time.perf_counter()
+    stats = store.upsert(daily)
+    report["daily_upsert_s"] = time.perf_counter() - start
+    report["daily_rows_written"] = stats["inserted"] + stats["updated"]
+
+    ids = frame[KEY].to_numpy()
+    store.lookup(ids[:1])
+    start = time.perf_counter()
+    for i in range(1000):
+        store.lookup(ids[i : i + 1])
+    report["lookup_us"] = (time.perf_counter() - start) / 1000 * 1e6
+
+    start = time.perf_counter()
+    store.scan()
+    report["scan_s"] = time.perf_counter() - start
+    start = time.perf_counter()
+    store.compact()
+    report["compact_s"] = time.perf_counter() - start
+    shutil.rmtree(directory, ignore_errors=True)
+    return report
+
+
+if __name__ == "__main__":
+    for n in (100_000, 1_000_000):
+        print(n, {key: round(value, 4) for key, value in benchmark(n).items()})
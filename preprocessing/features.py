@@ -0,0 +1,216 @@
+"""
+This module derives the engineered model features from the raw property inputs, for training and serving alike.
+
+Training (`Feature_Engineering` in `Data_Prepration.py`) and serving (`Prediction.predict`) used to compute
+the derived columns separately and differently: training used `Bedrooms / Living_Area`, serving used
+`Living_Area / Bedrooms`, and serving zero-filled every province-level feature. Both paths now go through
+the functions below, so a served feature vector matches what the model saw during training.
+
+Key Components:
+---------------
+1. bedrooms_per_area(bedrooms, living_area):
+   - The single definition of `Bedrooms_per_area` (NaN where the living area is not positive).
+
+2. Lookup_Table:
+   - Dense array indexed by an integer code (`Locality_encoded`, `SubType_encoded`) holding the columns
+     that are a function of that code. One fancy-indexing operation fills a whole batch.
+   - `save()` / `load()` persist it as `<name>.npy` + `<name>.json`; the preprocessing pipeline emits
+     `locality_index` and `subtype_index` next to `ED.csv` at training time, and target-encoded training
+     (`target_encoding.py`) adds the optional `target_index`.
+
+3. Feature_Deriver:
+   - `derive_matrix(X, features)`: Fills the derived columns of a float32 matrix in canonical order, in place.
+   - `derive_frame(data)`: DataFrame convenience wrapper for batch files and training frames.
+
+Usage:
+------
+deriver = Feature_Deriver.load("./preprocessing")  # or Feature_Deriver.from_reference(reference_data)
+X = ...  # raw inputs in canonical order, derived columns left empty
+deriver.derive_matrix(X, features)
+"""
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+# Columns that only depend on the locality
+LOCALITY_COLUMNS = ["Prov_encoded", "Region_encoded", "Is_On_Coast", "GDP", "Avg_rent", "Avg price"]
+
+# Columns that only depend on the subtype
+SUBTYPE_COLUMNS = ["Type_encoded"]
+
+DERIVED_FEATURES = SUBTYPE_COLUMNS + LOCALITY_COLUMNS + ["Bedrooms_per_area"]
+
+
+def bedrooms_per_area(bedrooms, living_area):
+    """
+    Number of bedrooms per squared meter of living area.
+
+    Args:
+    - bedrooms (array-like): Bedroom counts.
+    - living_area (array-like): Living areas in squared meters.
+
+    Returns:
+    - ndarray: `bedrooms / living_area`, NaN where the living area is not positive.
+    """
+    bedrooms = np.asarray(bedrooms, dtype=np.float64)
+    living_area = np.asarray(living_area, dtype=np.float64)
+    out = np.full(np.broadcast(bedrooms, living_area).shape, np.nan)
+    np.divide(bedrooms, living_area, out=out, where=living_area > 0)
+    return out
+
+
+class Lookup_Table:
+    """
+    Code-indexed table of columns that are functions of one categorical feature.
+
+    Attributes:
+    - key (str): Name of the indexing feature.
+    - columns (list[str]): Names of the looked-up columns.
+    - table (ndarray[float64], shape (n_codes, len(columns))): NaN rows for codes never seen.
+    """
+
+    def __init__(self, key, columns, table):
+        self.key = key
+        self.columns = list(columns)
+        self.table = table
+
+    @classmethod
+    def from_frame(cls, data, key, columns):
+        """
+        Builds the table from a frame where every code maps to a single value per column.
+
+        Args:
+        - data (pd.DataFrame): Frame holding `key` and `columns`.
+        - key (str): Indexing column.
+        - columns (list[str]): Looked-up columns.
+
+        Returns:
+        - Lookup_Table: The table.
+        """
+        codes = data[key].to_numpy(dtype=np.int64)
+        table = np.full((codes.max() + 1, len(columns)), np.nan)
+        table[codes] = data[columns].to_numpy(dtype=np.float64)
+        return cls(key, columns, table)
+
+    def save(self, path):
+        """
+        Writes the table to `<path>.npy` and its key/columns to `<path>.json`.
+        """
+        np.save(f"{path}.npy", self.table)
+        with open(f"{path}.json", "w") as f:
+            json.dump({"key": self.key, "columns": self.columns}, f)
+
+    @classmethod
+    def load(cls, path, mmap_mode="r"):
+        """
+        Loads a table written by `save()`, memory-mapped by default.
+        """
+        with open(f"{path}.json") as f:
+            header = json.load(f)
+        return cls(header["key"], header["columns"], np.load(f"{path}.npy", mmap_mode=mmap_mode))
+
+    def take(self, codes):
+        """
+        Looks up the rows of `codes`; unknown codes yield NaN.
+
+        Args:
+        - codes (array-like): Integer codes.
+
+        Returns:
+        - ndarray (n, len(columns)): The looked-up values.
+        """
+        codes = np.asarray(codes).astype(np.int64)
+        known = (codes >= 0) & (codes < len(self.table))
+        out = np.full((len(codes), len(self.columns)), np.nan)
+        out[known] = self.table[codes[known]]
+        return out
+
+
+class Feature_Deriver:
+    """
+    Derives `DERIVED_FEATURES` from the raw inputs with lookup tables and vectorized arithmetic.
+    """
+
+    # File names of the lookup tables, in `self.lookups` order; the last one is optional
+    index_names = ("locality_index", "subtype_index", "target_index")
+
+    def __init__(self, lookups):
+        self.lookups = lookups
+
+    @classmethod
+    def from_reference(cls, reference_data):
+        """
+        Builds the locality and subtype tables from the engineered training data.
+        """
+        return cls(
+            [
+                Lookup_Table.from_frame(reference_data, "Locality_encoded", LOCALITY_COLUMNS),
+                Lookup_Table.from_frame(reference_data, "SubType_encoded", SUBTYPE_COLUMNS),
+            ]
+        )
+
+    def save(self, directory):
+        """
+        Writes every lookup table to `directory` (and removes a stale optional one).
+        """
+        for name, lookup in zip(self.index_names, self.lookups):
+            lookup.save(os.path.join(directory, name))
+        for name in self.index_names[len(self.lookups) :]:
+            for extension in (".npy", ".json"):
+                path = os.path.join(directory, name + extension)
+                if os.path.exists(path):
+                    os.remove(path)
+
+    @classmethod
+    def load(cls, directory, mmap_mode="r"):
+        """
+        Loads the tables written by `save()`, or returns None when the required ones are missing.
+        """
+        paths = [os.path.join(directory, name) for name in cls.index_names]
+        if not all(os.path.exists(f"{path}.npy") for path in paths[:2]):
+            return None
+        return cls([Lookup_Table.load(path, mmap_mode) for path in paths if os.path.exists(f"{path}.npy")])
+
+    def derive_matrix(self, X, features):
+        """
+        Fills the derived columns of `X` in place.
+
+        Args:
+        - X (ndarray, shape (n, F)): Raw inputs in `features` order; derived columns are overwritten.
+        - features (list[str]): Column names of `X`.
+
+        Returns:
+        - ndarray: `X`, for chaining.
+        """
+        position = {name: i for i, name in enumerate(features)}
+        for lookup in self.lookups:
+            values = lookup.take(X[:, position[lookup.key]])
+            for j, column in enumerate(lookup.columns):
+                if column in position:
+                    X[:, position[column]] = values[:, j]
+        if "Bedrooms_per_area" in position:
+            X[:, position["Bedrooms_per_area"]] = bedrooms_per_area(
+                X[:, position["Bedrooms"]], X[:, position["Living_Area"]]
+            )
+        return X
+
+    def derive_frame(self, data):
+        """
+        Returns a copy of `data` with the derived columns added or replaced.
+
+        Args:
+        - data (pd.DataFrame): Frame holding at least the raw input columns.
+
+        Returns:
+        - pd.DataFrame: The completed frame.
+        """
+        data = data.copy()
+        for lookup in self.lookups:
+            values = lookup.take(data[lookup.key].to_numpy())
+            for j, column in enumerate(lookup.columns):
+                data[column] = values[:, j]
+        data["Bedrooms_per_area"] = bedrooms_per_area(data["Bedrooms"], data["Living_Area"])
+        return data
@@ -0,0 +1,292 @@
+"""
+This module searches the ~800 localities of the training data by name: typeahead in the UI and the API, and
+free-text resolution of locality names in batch uploads.
+
+The Streamlit selectbox filtered the sorted locality list character by character, so `Selange` never found
+`Sélange`, `Anvers` never found `Antwerpen` and every uploaded row needed its locality code. The
+`Locality_Index` is built once from the locality mappings:
+
+- every name and alias is folded (accents removed, lower case, hyphens and apostrophes as spaces);
+- a prefix trie over the folded full names and over every word start holds, at each node, the ranked
+  localities below it, so a prefix query is one walk of `len(query)` dictionary lookups;
+- a trigram index (trigram -> locality ids) scores fuzzy matches for typos with one `np.bincount`.
+
+Dutch/French/English names of the same place (`ALIASES`) point to the spelling used in the data. The
+training data holds no postal codes, so they cannot be searched yet; `extra_aliases` accepts them
+(`{"1000": "Brussel"}`) once a postal table is available.
+
+Key Components:
+---------------
+1. fold(text):
+   - Accent folding and normalization shared by the index and the queries.
+
+2. Locality_Index:
+   - `from_mappings(mappings, counts)`: Builds the index from `mappings["Locality_encoded"]`.
+   - `search(query, k)`: Ranked matches: exact name, prefix of the name, prefix of a word, then trigrams.
+   - `resolve(names)`: Vectorized exact resolution of many names, trigram fallback for unique misses.
+
+Usage:
+------
+index = Locality_Index.from_mappings(mappings, counts)
+index.search("selan")              # [("Sélange", 801, 2.0)]
+index.resolve(["Anvers", "gent"])  # array([26, 41])
+"""
+
+import re
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+# Names of the same place in Dutch, French and English; the first one found in the data is the target
+ALIASES = [
+    ["Brussel", "Bruxelles", "Brussels"],
+    ["Antwerpen", "Anvers", "Antwerp"],
+    ["Gent", "Gand", "Ghent"],
+    ["Brugge", "Bruges"],
+    ["Leuven", "Louvain"],
+    ["Mechelen", "Malines"],
+    ["Kortrijk", "Courtrai"],
+    ["Ieper", "Ypres"],
+    ["Oostende", "Ostende", "Ostend"],
+    ["Aalst", "Alost"],
+    ["Geraardsbergen", "Grammont"],
+    ["Ronse", "Renaix"],
+    ["Oudenaarde", "Audenarde"],
+    ["Dendermonde", "Termonde"],
+    ["Sint-Niklaas", "Saint-Nicolas"],
+    ["Tienen", "Tirlemont"],
+    ["Lier", "Lierre"],
+    ["Halle", "Hal"],
+    ["Vilvoorde", "Vilvorde"],
+    ["Tongeren", "Tongres"],
+    ["Sint-Truiden", "Saint-Trond"],
+    ["Veurne", "Furnes"],
+    ["Diksmuide", "Dixmude"],
+    ["Menen", "Menin"],
+    ["Wervik", "Wervicq"],
+    ["Liège", "Luik", "Liege"],
+    ["Namur", "Namen"],
+    ["Mons", "Bergen"],
+    ["Tournai", "Doornik"],
+    ["Wavre", "Waver"],
+    ["Nivelles", "Nijvel"],
+    ["Enghien", "Edingen"],
+    ["Ath", "Aat"],
+    ["Mouscron", "Moeskroen"],
+    ["Comines", "Komen"],
+    ["Huy", "Hoei"],
+    ["Waremme", "Borgworm"],
+    ["Arlon", "Aarlen"],
+    ["Bastogne", "Bastenaken"],
+    ["Soignies", "Zinnik"],
+    ["Braine-l'Alleud", "Eigenbrakel"],
+    ["Braine-le-Château", "Kasteelbrakel"],
+    ["La Hulpe", "Terhulpen"],
+    ["Rhode-Saint-Genèse", "Sint-Genesius-Rode"],
+    ["Vorst", "Forest"],
+    ["Elsene", "Ixelles"],
+    ["Ukkel", "Uccle"],
+    ["Schaarbeek", "Schaerbeek"],
+    ["Oudergem", "Auderghem"],
+    ["Watermaal-Bosvoorde", "Watermael-Boitsfort"],
+    ["Sint-Gillis", "Saint-Gilles"],
+    ["Sint-Joost-ten-Node", "Saint-Josse-ten-Noode"],
+    ["Sint-Jans-Molenbeek", "Molenbeek-Saint-Jean"],
+    ["Sint-Agatha-Berchem", "Berchem-Sainte-Agathe"],
+    ["Sint-Pieters-Woluwe", "Woluwe-Saint-Pierre"],
+    ["Sint-Lambrechts-Woluwe", "Woluwe-Saint-Lambert"],
+]
+
+# Matches kept at each trie node
+NODE_SIZE = 20
+
+# Lowest trigram similarity shown as a typeahead suggestion
+MIN_SEARCH_SIMILARITY = 0.3
+
+
+def fold(text):
+    """
+    Folds a locality name for matching: no accents, lower case, single spaces between words.
+
+    Args:
+    - text (str): Raw name, e.g. "Fontaine-l'Evêque".
+
+    Returns:
+    - str: Folded name, e.g. "fontaine l eveque".
+    """
+    text = unicodedata.normalize("NFKD", str(text))
+    text = "".join(char for char in text if not unicodedata.combining(char)).lower()
+    return " ".join(re.split(r"[^a-z0-9]+", text)).strip()
+
+
+def _trigrams(key):
+    padded = f"  {key} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+class Locality_Index:
+    """
+    Prefix trie and trigram index over the locality names and their aliases.
+
+    Attributes:
+    - names (list[str]): Display name per locality id.
+    - codes (ndarray[int64]): `Locality_encoded` per locality id.
+    - rank (ndarray[int64]): Popularity rank per locality id (0 = most listings).
+    - exact (dict[str, int]): Folded name or alias -> locality id.
+    - trie (dict): Nested nodes `{char: node}`; the "" entry of a node holds its ranked locality ids.
+    - trigrams (dict[str, ndarray]): Trigram -> ids of the keys containing it.
+    - key_ids (ndarray[int64]): Locality id of every indexed key (names and aliases).
+    - key_sizes (ndarray[int64]): Number of trigrams of every indexed key.
+    """
+
+    def __init__(self, names, codes, keys, key_ids, rank):
+        self.names = list(names)
+        self.codes = np.asarray(codes, dtype=np.int64)
+        self.key_ids = np.asarray(key_ids, dtype=np.int64)
+        self.rank = np.asarray(rank)
+        self.exact = dict(zip(keys, self.key_ids.tolist()))
+
+        # Candidates of a prefix: whole keys starting with it first, then keys with a word starting with it
+        starts = []
+        for key_id, key in enumerate(keys):
+            starts.append((key, 0, key_id))
+            for match in re.finditer(r" (?=\S)", key):
+                starts.append((key[match.end() :], 1, key_id))
+        self.trie = {}
+        for suffix, word_start, key_id in sorted(
+            starts, key=lambda s: (s[1], self.rank[self.key_ids[s[2]]], len(keys[s[2]]))
+        ):
+            locality = self.key_ids[key_id]
+            node = self.trie
+            for char in suffix:
+                node = node.setdefault(char, {})
+                matches = node.setdefault("", [])
+                if len(matches) < NODE_SIZE and locality not in matches:
+                    matches.append(int(locality))
+
+        grams = [_trigrams(key) for key in keys]
+        self.key_sizes = np.array([len(g) for g in grams], dtype=np.int64)
+        postings = {}
+        for key_id, key_grams in enumerate(grams):
+            for gram in key_grams:
+                postings.setdefault(gram, []).append(key_id)
+        self.trigrams = {gram: np.array(ids, dtype=np.int64) for gram, ids in postings.items()}
+
+    @classmethod
+    def from_mappings(cls, mappings, counts=None, extra_aliases=None):
+        """
+        Builds the index from the locality mappings of `Cleaning().preprocess()`.
+
+        Args:
+        - mappings (dict): Category mappings; `mappings["Locality_encoded"]` is {code: name}.
+        - counts (array-like or None): Listings per `Locality_encoded`; popular localities rank first.
+        - extra_aliases (dict[str, str] or None): Additional alias -> locality name pairs.
+
+        Returns:
+        - Locality_Index: The index.
+        """
+        labels = {int(code): name for code, name in mappings["Locality_encoded"].items()}
+        codes = sorted(labels)
+        names = [labels[code] for code in codes]
+        if counts is None:
+            popularity = np.zeros(len(codes))
+        else:
+            counts = np.asarray(counts)
+            popularity = np.array([counts[code] if code < len(counts) else 0 for code in codes])
+        # Rank 0 is the most popular locality; ties keep the shorter name first
+        order = np.lexsort(([len(name) for name in names], -popularity))
+        rank = np.empty(len(codes), dtype=np.int64)
+        rank[order] = np.arange(len(codes))
+
+        keys, key_ids = [], []
+        by_key = {}
+        for locality, name in enumerate(names):
+            key = fold(name)
+            if key not in by_key:
+                by_key[key] = locality
+                keys.append(key)
+                key_ids.append(locality)
+        aliases = [(alias, group) for group in ALIASES for alias in group]
+        aliases += [(alias, [name]) for alias, name in (extra_aliases or {}).items()]
+        for alias, group in aliases:
+            targets = [by_key[fold(name)] for name in group if fold(name) in by_key]
+            if targets and fold(alias) not in by_key:
+                by_key[fold(alias)] = targets[0]
+                keys.append(fold(alias))
+                key_ids.append(targets[0])
+        return cls(names, codes, keys, key_ids, rank)
+
+    def _fuzzy(self, key, k, min_similarity=0.0):
+        # Jaccard similarity of the trigram sets, counted with one bincount over the posting lists
+        query = _trigrams(key)
+        grams = [self.trigrams[g] for g in query if g in self.trigrams]
+        if not grams:
+            return []
+        shared = np.bincount(np.concatenate(grams), minlength=len(self.key_ids))
+        similarity = shared / (self.key_sizes + len(query) - shared)
+        # Best key per locality
+        best = np.zeros(len(self.names))
+        np.maximum.at(best, self.key_ids, similarity)
+        top = np.argsort(-best, kind="stable")[:k]
+        return [(int(i), float(best[i])) for i in top if best[i] > min_similarity]
+
+    def search(self, query, k=10):
+        """
+        Returns the best matching localities for a (partial) name.
+
+        Args:
+        - query (str): Text typed by the user, any case and accents.
+        - k (int): Maximum number of matches.
+
+        Returns:
+        - list[tuple(str, int, float)]: (name, `Locality_encoded`, score) from best to worst; the score
+          is 3 for an exact name or alias, 2 for a prefix match and the trigram similarity (0 - 1) otherwise.
+        """
+        key = fold(query)
+        if not key:
+            return []
+        results = {}
+        if key in self.exact:
+            results[self.exact[key]] = 3.0
+        node = self.trie
+        for char in key:
+            node = node.get(char)
+            if node is None:
+                break
+        else:
+            for locality in node[""]:
+                results.setdefault(locality, 2.0)
+        if len(results) < k:
+            # Typo tolerance: fill up with close trigram matches
+            for locality, similarity in self._fuzzy(key, k, MIN_SEARCH_SIMILARITY):
+                results.setdefault(locality, similarity)
+        ranked = sorted(results.items(), key=lambda item: (-item[1], self.rank[item[0]]))[:k]
+        return [(self.names[i], int(self.codes[i]), score) for i, score in ranked]
+
+    def resolve(self, names, min_similarity=0.5):
+        """
+        Resolves free-text locality names to `Locality_encoded` codes.
+
+        Every distinct name is folded and looked up once; only the distinct names without an exact
+        (name or alias) match go through the trigram index.
+
+        Args:
+        - names (array-like of str): Locality names, e.g. a column of an uploaded file.
+        - min_similarity (float): Lowest trigram similarity accepted for a fuzzy match.
+
+        Returns:
+        - ndarray[int64]: Codes, -1 where no locality matched.
+        """
+        names = pd.Series(names, dtype="object")
+        unique = names.dropna().unique()
+        resolved = {}
+        for name in unique:
+            key = fold(name)
+            locality = self.exact.get(key)
+            if locality is None and key:
+                matches = self._fuzzy(key, 1)
+                if matches and matches[0][1] >= min_similarity:
+                    locality = matches[0][0]
+            resolved[name] = -1 if locality is None else int(self.codes[locality])
+        return names.map(resolved).fillna(-1).to_numpy(dtype=np.int64)
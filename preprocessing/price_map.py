@@ -0,0 +1,187 @@
+"""
+This module precomputes the aggregated prices behind the market map.
+
+Plotting the ~10k listings one by one (the folium `HeatMap` that `Data_Prepration.py` used to import) is
+slow to render and redone on every rerun. `Price_Map` aggregates the listings once, at preprocessing
+time, per locality and per square grid cell at several zoom levels, and stores the result as a handful
+of compact arrays in one `.npz` file. The app only loads those arrays and hands them to the map.
+
+Each aggregate holds the number of listings, the median and mean observed price and, when model
+predictions are given, the mean predicted price. Medians are computed for all cells at once by sorting
+the listings by (cell, price) and picking the middle rows of every group.
+
+Key Components:
+---------------
+1. aggregate(groups, price, predicted):
+   - Count, median, mean and predicted mean per group id, vectorized with `np.bincount`.
+
+2. Price_Map:
+   - `from_listings(listings, predicted, cell_km)`: Builds the locality table and one grid per cell size
+     (20, 10, 5 and 2 km by default: zoom levels 0 - 3).
+   - `cells(level)` / `localities()`: DataFrames with longitude/latitude centers for the map.
+   - `save()` / `load()`: One compressed `.npz` file.
+
+Usage:
+------
+price_map = Price_Map.from_listings(listings, predicted)
+price_map.save("price_map.npz")
+Price_Map.load("price_map.npz").cells(level=2)
+
+Run `python -m preprocessing.price_map` from the repository root to rebuild `price_map.npz` from the
+comparables index listings with the model's predictions.
+"""
+
+import numpy as np
+import pandas as pd
+
+from preprocessing.comparables import KM_PER_DEGREE_LAT, KM_PER_DEGREE_LON, to_km
+
+# Grid cell sizes in kilometers, from the country view (level 0) to the city view
+CELL_KM = (20.0, 10.0, 5.0, 2.0)
+
+FIELDS = ("count", "median_price", "mean_price", "predicted_price")
+
+
+def aggregate(groups, price, predicted=None):
+    """
+    Aggregates listing prices per group.
+
+    Args:
+    - groups (ndarray[int64]): Dense group id (0 .. n_groups - 1) of every listing.
+    - price (ndarray): Observed prices.
+    - predicted (ndarray or None): Predicted prices of the same listings.
+
+    Returns:
+    - dict[str, ndarray]: `FIELDS` arrays indexed by group id; "predicted_price" is NaN without predictions.
+    """
+    n_groups = int(groups.max()) + 1 if len(groups) else 0
+    count = np.bincount(groups, minlength=n_groups)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.bincount(groups, weights=price, minlength=n_groups) / count
+        if predicted is None:
+            predicted_mean = np.full(n_groups, np.nan)
+        else:
+            predicted_mean = np.bincount(groups, weights=predicted, minlength=n_groups) / count
+
+    # Median of every group at once: sort by (group, price), average the two middle rows of each group
+    order = np.lexsort((price, groups))
+    starts = np.cumsum(count) - count
+    sorted_price = price[order]
+    low = np.minimum(starts + (count - 1) // 2, len(price) - 1)
+    high = np.minimum(starts + count // 2, len(price) - 1)
+    median = np.where(count > 0, (sorted_price[low] + sorted_price[high]) / 2, np.nan)
+    return {
+        "count": count.astype(np.int32),
+        "median_price": median.astype(np.float32),
+        "mean_price": mean.astype(np.float32),
+        "predicted_price": predicted_mean.astype(np.float32),
+    }
+
+
+class Price_Map:
+    """
+    Precomputed price aggregates per locality and per grid cell.
+
+    Attributes:
+    - arrays (dict[str, ndarray]): "locality_*" arrays indexed by `Locality_encoded`, and per zoom level z
+      "z{z}_lon", "z{z}_lat" (cell centers) plus the `FIELDS` arrays of the non-empty cells.
+    - cell_km (tuple[float]): Cell size of every zoom level.
+    """
+
+    def __init__(self, arrays, cell_km=CELL_KM):
+        self.arrays = arrays
+        self.cell_km = tuple(float(size) for size in cell_km)
+
+    @classmethod
+    def from_listings(cls, listings, predicted=None, cell_km=CELL_KM):
+        """
+        Aggregates listings with coordinates.
+
+        Args:
+        - listings (pd.DataFrame): Listings with X (longitude), Y (latitude), Price and Locality_encoded.
+        - predicted (array-like or None): Model predictions of the same rows.
+        - cell_km (tuple[float]): Cell size of every zoom level.
+
+        Returns:
+        - Price_Map: The aggregates.
+        """
+        known = listings[["X", "Y", "Price"]].notna().all(axis=1).to_numpy()
+        listings = listings[known]
+        price = listings["Price"].to_numpy(dtype=np.float64)
+        if predicted is not None:
+            predicted = np.asarray(predicted, dtype=np.float64)[known]
+
+        arrays = {}
+        localities = listings["Locality_encoded"].to_numpy(dtype=np.int64)
+        for field, values in aggregate(localities, price, predicted).items():
+            arrays[f"locality_{field}"] = values
+        with np.errstate(invalid="ignore", divide="ignore"):
+            count = np.bincount(localities)
+            for axis in ("X", "Y"):
+                mean = np.bincount(localities, weights=listings[axis].to_numpy(), minlength=len(count))
+                arrays["locality_lon" if axis == "X" else "locality_lat"] = (mean / count).astype(np.float32)
+
+        points = to_km(listings["X"], listings["Y"])
+        for level, size in enumerate(cell_km):
+            cells = np.floor(points / size).astype(np.int64)
+            # Dense ids of the non-empty cells only
+            keys, groups = np.unique(cells, axis=0, return_inverse=True)
+            groups = groups.reshape(-1)
+            for field, values in aggregate(groups, price, predicted).items():
+                arrays[f"z{level}_{field}"] = values
+            arrays[f"z{level}_lon"] = ((keys[:, 0] + 0.5) * size / KM_PER_DEGREE_LON).astype(np.float32)
+            arrays[f"z{level}_lat"] = ((keys[:, 1] + 0.5) * size / KM_PER_DEGREE_LAT).astype(np.float32)
+        return cls(arrays, cell_km)
+
+    def save(self, path):
+        np.savez_compressed(path, cell_km=np.array(self.cell_km), **self.arrays)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            arrays = {name: data[name] for name in data.files if name != "cell_km"}
+            return cls(arrays, data["cell_km"])
+
+    @property
+    def levels(self):
+        return len(self.cell_km)
+
+    def cells(self, level):
+        """
+        Returns the non-empty grid cells of a zoom level.
+
+        Returns:
+        - pd.DataFrame: lon, lat (cell center) and the `FIELDS` columns.
+        """
+        columns = ("lon", "lat") + FIELDS
+        return pd.DataFrame({column: self.arrays[f"z{level}_{column}"] for column in columns})
+
+    def localities(self):
+        """
+        Returns one row per locality with listings, indexed by `Locality_encoded`.
+
+        Returns:
+        - pd.DataFrame: lon, lat (mean listing position) and the `FIELDS` columns.
+        """
+        columns = ("lon", "lat") + FIELDS
+        frame = pd.DataFrame({column: self.arrays[f"locality_{column}"] for column in columns})
+        frame.index.name = "Locality_encoded"
+        return frame[frame["count"] > 0]
+
+
+if __name__ == "__main__":
+    from joblib import load
+
+    from Predict.fast_predictor import Fast_Predictor
+    from preprocessing.comparables import Comparables_Index
+
+    # Listings with coordinates kept by the preprocessing pipeline, completed with their features
+    listings = Comparables_Index.load("./preprocessing/comparables_index.joblib").listings
+    reference = pd.read_csv("./preprocessing/ED.csv", index_col=0)
+    features = listings[["Id", "X", "Y"]].merge(reference, on="Id")
+    reference_data = reference.drop(columns=["Price", "Id"])
+    predictor = Fast_Predictor.from_reference(load("./model/model_Hussain.joblib"), reference_data)
+    predicted = predictor.predict_batch(features[predictor.features].to_numpy(dtype=np.float32))
+
+    Price_Map.from_listings(features, predicted).save("./preprocessing/price_map.npz")
+    print("Saved ./preprocessing/price_map.npz")
@@ -0,0 +1,214 @@
+"""
+This module validates whole batches of property features before they reach the model.
+
+The Streamlit form enforces constraints through widget arguments (`min_value=1` for `Living_Area`, ...),
+but programmatic and batch inputs bypass the widgets. A zero `Living_Area` then silently turns into
+inf/NaN in `Bedrooms_per_area`. `Feature_Schema` is built from the training data and the categorical
+mappings, is stored in the training feature manifest, and checks every column of a batch with NumPy:
+non-numeric values, NaNs, infinities, ranges, integer-ness and categorical domains. It never raises on a bad row; it returns one
+boolean error mask per check so callers can drop, report or fix the offending rows.
+
+Key Components:
+---------------
+1. Feature_Schema:
+   - `from_reference(reference_data, mappings)`: Derives one rule per feature from the training data.
+   - `to_dict()` / `from_dict()`: Round-trip through the JSON manifest.
+   - `validate(data)`: Column-wise vectorized validation returning a `Validation_Result`.
+
+2. Validation_Result:
+   - `mask` (n_rows, n_checks) boolean error matrix with `checks` labels such as "Living_Area:range".
+   - `valid` per-row mask, `summary()` counts per check and `row_errors(i)` for display.
+
+Usage:
+------
+schema = Feature_Schema.from_reference(reference_data, mappings)
+result = schema.validate(batch)
+clean = batch[result.valid]
+"""
+
+import numpy as np
+import pandas as pd
+
+# Features a caller has to supply; every other model feature is derived from them
+INPUT_FEATURES = [
+    "Bedrooms",
+    "Living_Area",
+    "Is_Equiped_Kitchen",
+    "Terrace",
+    "Garden",
+    "State",
+    "Facades",
+    "Locality_encoded",
+    "SubType_encoded",
+]
+
+# Hard bounds of the unbounded count and area features (a zero living area is never valid, a house has
+# at most four facades). `Facades` 0 is the dataset's "unknown" (a third of `ED.csv`), so the schema
+# accepts it even though the input form asks for at least one
+LOWER_BOUNDS = {"Living_Area": 1, "Bedrooms": 0, "Facades": 0}
+UPPER_BOUNDS = {"Living_Area": 5000, "Bedrooms": 60, "Facades": 4}
+
+# Binary flag columns
+FLAGS = ["Is_Equiped_Kitchen", "Terrace", "Garden", "Type_encoded", "Is_On_Coast"]
+
+
+class Validation_Result:
+    """
+    Per-row outcome of `Feature_Schema.validate()`.
+    """
+
+    def __init__(self, checks, mask):
+        self.checks = checks
+        self.mask = mask
+        self.valid = ~mask.any(axis=1)
+
+    def summary(self):
+        """
+        Returns the number of failing rows per check, omitting checks that never fail.
+        """
+        counts = self.mask.sum(axis=0)
+        return {check: int(n) for check, n in zip(self.checks, counts) if n}
+
+    def row_errors(self, i):
+        """
+        Returns the failing check labels of row `i`.
+        """
+        return [self.checks[j] for j in np.flatnonzero(self.mask[i])]
+
+
+class Feature_Schema:
+    """
+    Column rules derived from the training feature manifest.
+
+    Each rule is a dict with:
+    - lower / upper (float or None): Inclusive range.
+    - integer (bool): Values must be whole numbers.
+    - domain (list[int] or None): Allowed category codes.
+    - nullable (bool): NaN is accepted.
+    - required (bool): The column must be present in the batch.
+    """
+
+    def __init__(self, rules):
+        self.rules = rules
+        # Boolean lookup tables make domain checks a single fancy-indexing operation
+        self._domain_tables = {}
+        for column, rule in rules.items():
+            if rule["domain"] is not None:
+                table = np.zeros(max(rule["domain"]) + 1, dtype=bool)
+                table[rule["domain"]] = True
+                self._domain_tables[column] = table
+
+    @classmethod
+    def from_reference(cls, reference_data, mappings):
+        """
+        Builds the rules from the training features and the categorical mappings.
+
+        Args:
+        - reference_data (pd.DataFrame): Training features (without 'Price' and 'Id').
+        - mappings (dict): Categorical mappings {column: {code: label}}.
+
+        Returns:
+        - Feature_Schema: The schema.
+        """
+        rules = {}
+        for column in reference_data.columns:
+            values = reference_data[column].to_numpy(dtype=np.float64)
+            finite = values[~np.isnan(values)]
+            integer = bool(np.all(finite == np.floor(finite)))
+            rule = {
+                "lower": None,
+                "upper": None,
+                "integer": integer,
+                "domain": None,
+                "nullable": bool(np.isnan(values).any()),
+                "required": column in INPUT_FEATURES,
+            }
+            if column in mappings:
+                rule["domain"] = sorted(int(code) for code in mappings[column])
+            elif column in FLAGS:
+                rule["domain"] = [0, 1]
+            elif column in LOWER_BOUNDS:
+                rule["lower"], rule["upper"] = LOWER_BOUNDS[column], UPPER_BOUNDS[column]
+            elif integer:
+                rule["lower"], rule["upper"] = float(finite.min()), float(finite.max())
+            rules[column] = rule
+        return cls(rules)
+
+    def to_dict(self):
+        return self.rules
+
+    @classmethod
+    def from_dict(cls, rules):
+        # Hard bounds are the code's: manifests exported before a change of them get the current ones
+        rules = {column: dict(rule) for column, rule in rules.items()}
+        for column in LOWER_BOUNDS.keys() & rules.keys():
+            if rules[column]["domain"] is None:
+                rules[column]["lower"], rules[column]["upper"] = LOWER_BOUNDS[column], UPPER_BOUNDS[column]
+        return cls(rules)
+
+    def validate(self, data):
+        """
+        Validates a batch column by column.
+
+        Args:
+        - data (pd.DataFrame or dict[str, array-like]): The batch; optional columns may be missing.
+
+        Returns:
+        - Validation_Result: Error masks, one column per (feature, check) pair.
+        """
+        if isinstance(data, pd.DataFrame):
+            n_rows = len(data)
+        else:
+            n_rows = len(next(iter(data.values()))) if data else 0
+
+        checks, masks = [], []
+        for column, rule in self.rules.items():
+            if column not in data:
+                if rule["required"]:
+                    checks.append(f"{column}:missing")
+                    masks.append(np.ones(n_rows, dtype=bool))
+                continue
+
+            # Values that are not numbers become NaN and are reported per row, never raised
+            raw = np.asarray(data[column])
+            if raw.dtype.kind in "biuf":
+                values = raw.astype(np.float64)
+                not_numeric = np.zeros(n_rows, dtype=bool)
+            else:
+                values = pd.to_numeric(pd.Series(raw), errors="coerce").to_numpy(dtype=np.float64)
+                not_numeric = np.isnan(values) & pd.notna(raw)
+            nan = np.isnan(values)
+            checks.append(f"{column}:numeric")
+            masks.append(not_numeric)
+            if not rule["nullable"]:
+                checks.append(f"{column}:nan")
+                masks.append(nan)
+            infinite = np.isinf(values)
+            checks.append(f"{column}:finite")
+            masks.append(infinite)
+
+            # NaN compares False everywhere below, so it is only reported by the nan check
+            if rule["lower"] is not None or rule["upper"] is not None:
+                out_of_range = np.zeros(n_rows, dtype=bool)
+                if rule["lower"] is not None:
+                    out_of_range |= values < rule["lower"]
+                if rule["upper"] is not None:
+                    out_of_range |= values > rule["upper"]
+                checks.append(f"{column}:range")
+                masks.append(out_of_range)
+
+            if rule["integer"]:
+                not_integer = ~nan & ~infinite & (values != np.floor(values))
+                checks.append(f"{column}:integer")
+                masks.append(not_integer)
+
+            table = self._domain_tables.get(column)
+            if table is not None:
+                in_table = ~nan & (values >= 0) & (values < len(table))
+                in_domain = np.zeros(n_rows, dtype=bool)
+                in_domain[in_table] = table[values[in_table].astype(np.int64)]
+                checks.append(f"{column}:domain")
+                masks.append(~nan & ~in_domain)
+
+        mask = np.column_stack(masks) if masks else np.zeros((n_rows, 0), dtype=bool)
+        return Validation_Result(checks, mask)
@@ -0,0 +1,149 @@
+"""
+This module target-encodes the locality and the province: smoothed mean log-price and price per m².
+
+`Data_Prep` still lists `sqdm_price` and `Locality_mean_Price` in a comment: plain per-locality means were
+tried and dropped, most likely because a mean computed over all rows leaks each row's own price into its
+feature and the model overfits it. Here:
+
+- training rows get out-of-fold encodings: the rows are split into `n_folds` folds and each row is
+  encoded with the statistics of the other folds only;
+- every mean is smoothed towards the prior of its fold, `(sum + m * prior) / (count + m)`, so a locality
+  with three listings stays close to the national level;
+- all folds are computed at once: one `np.bincount` over `fold * n_codes + code` gives the per-fold sums
+  and counts, the out-of-fold statistics are the totals minus the row's own fold. There is no loop over
+  rows or codes.
+
+Serving (and the test rows) use the encodings fitted on all training rows, stored as one `Lookup_Table`
+keyed by `Locality_encoded` (`target_index.npy` next to `ED.csv`; the province columns are stored per
+locality too): `Feature_Deriver` fills the four columns with one array index. A locality without
+training listings gets the prior, and its province's encoding.
+
+The stage is opt-in: `Model1(link, target_encoding=True)`.
+
+Key Components:
+---------------
+1. TARGET_COLUMNS:
+   - The encoded columns: `Locality_te_log_price`, `Locality_te_price_m2`, `Prov_te_log_price`,
+     `Prov_te_price_m2`.
+
+2. out_of_fold(data, n_folds, smoothing):
+   - Out-of-fold encodings of training rows.
+
+3. target_table(data, smoothing):
+   - Full-data encodings as the serving `Lookup_Table`.
+
+Usage:
+------
+train[TARGET_COLUMNS] = out_of_fold(train)
+table = target_table(train)
+test[TARGET_COLUMNS] = table.take(test["Locality_encoded"])
+"""
+
+import numpy as np
+import pandas as pd
+
+from preprocessing.features import Lookup_Table
+
+# Encoded categorical column -> prefix of its encoded columns
+ENCODED = {"Locality_encoded": "Locality_te", "Prov_encoded": "Prov_te"}
+
+STATISTICS = ("log_price", "price_m2")
+
+TARGET_COLUMNS = [f"{prefix}_{statistic}" for prefix in ENCODED.values() for statistic in STATISTICS]
+
+# Listings at which a code weighs as much as the prior
+SMOOTHING = 20.0
+
+
+def _targets(data):
+    # The encoded statistics per row, NaN where they cannot be computed
+    price = data["Price"].to_numpy(dtype=np.float64)
+    area = data["Living_Area"].to_numpy(dtype=np.float64)
+    price_m2 = np.full(len(price), np.nan)
+    np.divide(price, area, out=price_m2, where=area > 0)
+    return {"log_price": np.log1p(price), "price_m2": price_m2}
+
+
+def smoothed_means(codes, target, n_codes, smoothing=SMOOTHING, prior=None):
+    """
+    Smoothed mean of `target` per code, NaN targets ignored.
+
+    Returns:
+    - ndarray (n_codes,): `(sum + smoothing * prior) / (count + smoothing)`.
+    """
+    known = ~np.isnan(target)
+    total = np.bincount(codes[known], weights=target[known], minlength=n_codes)
+    count = np.bincount(codes[known], minlength=n_codes)
+    prior = target[known].mean() if prior is None else prior
+    return (total + smoothing * prior) / (count + smoothing)
+
+
+def out_of_fold(data, n_folds=5, smoothing=SMOOTHING, seed=42):
+    """
+    Encodes training rows with the statistics of the other folds.
+
+    Args:
+    - data (pd.DataFrame): Training rows with Price, Living_Area and the `ENCODED` columns.
+    - n_folds (int): Number of folds.
+    - smoothing (float): Weight of the prior, in listings.
+    - seed (int): Seed of the fold assignment.
+
+    Returns:
+    - pd.DataFrame: `TARGET_COLUMNS`, aligned with `data`.
+    """
+    n = len(data)
+    folds = np.random.default_rng(seed).permutation(n) % n_folds
+    encoded = {}
+    for column, prefix in ENCODED.items():
+        codes = data[column].to_numpy(dtype=np.int64)
+        n_codes = int(codes.max()) + 1
+        # Per-fold sums and counts of every code in one bincount: row (fold, code)
+        cell = folds * n_codes + codes
+        for statistic, target in _targets(data).items():
+            known = ~np.isnan(target)
+            fold_sum = np.bincount(
+                cell[known], weights=target[known], minlength=n_folds * n_codes
+            ).reshape(n_folds, n_codes)
+            fold_count = np.bincount(cell[known], minlength=n_folds * n_codes).reshape(n_folds, n_codes)
+            # Statistics of the other folds
+            other_sum = fold_sum.sum(axis=0) - fold_sum
+            other_count = fold_count.sum(axis=0) - fold_count
+            prior = other_sum.sum(axis=1) / other_count.sum(axis=1)
+            means = (other_sum + smoothing * prior[:, None]) / (other_count + smoothing)
+            encoded[f"{prefix}_{statistic}"] = means[folds, codes]
+    return pd.DataFrame(encoded, index=data.index)[TARGET_COLUMNS]
+
+
+def target_table(data, smoothing=SMOOTHING, provinces=None):
+    """
+    Fits the encodings on all rows of `data` as a lookup table keyed by `Locality_encoded`.
+
+    Args:
+    - data (pd.DataFrame): Training rows with Price, Living_Area and the `ENCODED` columns.
+    - smoothing (float): Weight of the prior, in listings.
+    - provinces (ndarray[int64] or None): Province code per locality code (-1 when unknown), so localities
+      without training listings get the prior and their province's encoding; taken from `data` by default.
+
+    Returns:
+    - Lookup_Table: `TARGET_COLUMNS` per locality code (NaN for localities of unknown province).
+    """
+    if provinces is None:
+        localities = data["Locality_encoded"].to_numpy(dtype=np.int64)
+        provinces = np.full(int(localities.max()) + 1, -1, dtype=np.int64)
+        provinces[localities] = data["Prov_encoded"].to_numpy(dtype=np.int64)
+    provinces = np.asarray(provinces, dtype=np.int64)
+    known = provinces >= 0
+
+    # Code of every known locality in each encoded column
+    rows = {"Locality_encoded": np.flatnonzero(known), "Prov_encoded": provinces[known]}
+
+    table = np.full((len(provinces), len(TARGET_COLUMNS)), np.nan)
+    targets = _targets(data)
+    for column, prefix in ENCODED.items():
+        codes = data[column].to_numpy(dtype=np.int64)
+        # Codes without training rows get the prior
+        n_codes = max(int(codes.max()), int(rows[column].max())) + 1
+        for statistic in STATISTICS:
+            means = smoothed_means(codes, targets[statistic], n_codes, smoothing)
+            table[known, TARGET_COLUMNS.index(f"{prefix}_{statistic}")] = means[rows[column]]
+    return Lookup_Table("Locality_encoded", TARGET_COLUMNS, table)